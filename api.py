@@ -0,0 +1,575 @@
+# api.py
+"""Local HTTP API for the PDF operations, for other services to call.
+
+Each endpoint takes a ``multipart/form-data`` POST, runs the same function
+the tab runs, and answers with the resulting file:
+
+    POST /overlay   file (PDF), image; pages, x, y, width, height, background
+    POST /merge     file (PDF, repeated, in order); order, bookmarks
+    POST /split     file (PDF); every (pages per file) or ranges (repeated,
+                    one output file each), default one file per page -> ZIP
+    POST /compress  file (PDF); quality, max_dim or target_mb; clean_structure,
+                    strip_metadata
+    POST /convert   file (image, repeated); orientation, fit, margin_mm
+    GET  /health    queue and pool status as JSON
+
+PDF endpoints also take ``fast_web_view``. Page selections use the tabs'
+syntax (utils.page_selection), placements are in points from the bottom-left
+corner of the page as displayed.
+
+Uploads are streamed from the socket straight into temp files (as spooled
+uploads, see utils.uploads), so a request body is never held in memory, and
+results are written back in chunks. Operations run as jobs on the
+process-wide worker pool shared with the app (utils.worker_pool), so its
+worker count, per-operation limits and queued-bytes cap apply here too; each
+client address gets its own turn in the queue. Errors come back as JSON
+``{"error": ...}`` with a 4xx/5xx status.
+
+    python api.py                                   # http://127.0.0.1:8502
+    PDF_TOOLS_API_PORT=9000 python api.py
+
+Settings:
+
+- ``PDF_TOOLS_API_HOST`` / ``PDF_TOOLS_API_PORT``: where to listen
+  (default 127.0.0.1:8502; the API has no authentication)
+- ``PDF_TOOLS_API_MAX_REQUESTS``: requests handled at once, uploads
+  included; more are refused with 503 (default: twice the pool's workers)
+- ``PDF_TOOLS_API_MAX_UPLOAD_MB``: largest request body (default 1024)
+"""
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import ExitStack
+from email.message import Message
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+from utils.jobs import Job
+from utils.metrics import track_operation
+from utils.page_selection import PageSelectionError, compile_pages
+from utils.uploads import SpooledUpload
+from utils.worker_pool import QueueFull, get_worker_pool
+
+DEFAULT_PORT = 8502
+DEFAULT_MAX_UPLOAD_MB = 1024
+_CHUNK = 1024 * 1024
+# Part headers and plain form fields are small; anything bigger is a broken client.
+_MAX_HEADER_BYTES = 16 * 1024
+_MAX_FIELD_BYTES = 64 * 1024
+
+MERGE_ORDERS = {"upload": "As uploaded", "name": "Sort by filename (A-Z)", "name_desc": "Sort by filename (Z-A)"}
+FIT_MODES = {"fit": "Fit to page (maintain aspect ratio)", "fill": "Fill page (may crop)",
+             "stretch": "Stretch to fill"}
+
+
+class ApiError(Exception):
+    """A request that can't be served; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class _BodyReader:
+    """Reads at most ``length`` bytes of a request body from the socket."""
+
+    def __init__(self, rfile, length):
+        self._rfile = rfile
+        self.remaining = length
+
+    def read(self, size):
+        data = self._rfile.read(min(size, self.remaining)) if self.remaining else b""
+        self.remaining -= len(data)
+        return data
+
+
+def _read_until(body, buffer, delimiter, write, limit=None):
+    """Pass data to ``write`` up to ``delimiter``; returns the buffered bytes after it."""
+    keep = len(delimiter) - 1
+    written = 0
+    while True:
+        found = buffer.find(delimiter)
+        if found >= 0:
+            write(buffer[:found])
+            return buffer[found + len(delimiter):]
+        # The tail might be the start of a delimiter split across reads.
+        if len(buffer) > keep:
+            write(buffer[:-keep])
+            written += len(buffer) - keep
+            buffer = buffer[-keep:]
+        if limit is not None and written > limit:
+            raise ApiError(413, "form field or part header too large")
+        chunk = body.read(_CHUNK)
+        if not chunk:
+            raise ApiError(400, "request body ended inside a multipart part")
+        buffer += chunk
+
+
+def _header_param(value, param):
+    message = Message()
+    message["content-type"] = value
+    return message.get_param(param)
+
+
+def parse_multipart(body, boundary):
+    """Stream a multipart/form-data body; returns ({field: [str]}, {field: [SpooledUpload]}).
+
+    File parts are written to temp files as they arrive; memory use stays at
+    about one read chunk whatever the size of the upload.
+    """
+    fields, files = {}, {}
+    delimiter = b"\r\n--" + boundary
+    try:
+        # A CRLF in front lets the first delimiter match like the others.
+        buffer = _read_until(body, b"\r\n", delimiter, lambda data: None)
+        while True:
+            while len(buffer) < 2:
+                chunk = body.read(_CHUNK)
+                if not chunk:
+                    raise ApiError(400, "request body ended inside a multipart delimiter")
+                buffer += chunk
+            if buffer.startswith(b"--"):
+                return fields, files
+            headers = io.BytesIO()
+            buffer = _read_until(body, buffer, b"\r\n\r\n", headers.write, _MAX_HEADER_BYTES)
+            disposition = Message()
+            for line in headers.getvalue().decode("utf-8", "replace").split("\r\n"):
+                name, _, value = line.partition(":")
+                if name.strip().lower() == "content-disposition":
+                    disposition["content-disposition"] = value.strip()
+            name = disposition.get_param("name", header="content-disposition")
+            if not name:
+                raise ApiError(400, "multipart part without a field name")
+            filename = disposition.get_filename()
+            if filename is None:
+                value = io.BytesIO()
+                buffer = _read_until(body, buffer, delimiter, value.write, _MAX_FIELD_BYTES)
+                fields.setdefault(name, []).append(value.getvalue().decode("utf-8"))
+                continue
+            digest = hashlib.sha256()
+            fd, path = tempfile.mkstemp(prefix="pdf_tools_api_", suffix=os.path.splitext(filename)[1])
+            with os.fdopen(fd, "wb") as out:
+                def write(data):
+                    digest.update(data)
+                    out.write(data)
+                try:
+                    buffer = _read_until(body, buffer, delimiter, write)
+                except BaseException:
+                    out.close()
+                    os.unlink(path)
+                    raise
+            upload = SpooledUpload.adopt(path, os.path.basename(filename), digest.hexdigest())
+            files.setdefault(name, []).append(upload)
+    except BaseException:
+        _release(files)
+        raise
+
+
+def _release(files):
+    """Delete the uploads' temp files now rather than when they're collected."""
+    for uploads in files.values():
+        for upload in uploads:
+            try:
+                os.unlink(upload.path)
+            except FileNotFoundError:
+                pass
+
+
+class _Request:
+    """A parsed request's form fields and files, with typed accessors."""
+
+    def __init__(self, fields, files):
+        self.fields = fields
+        self.files = files
+
+    def text(self, name, default=None):
+        values = self.fields.get(name)
+        return values[-1].strip() if values else default
+
+    def texts(self, name):
+        return self.fields.get(name, [])
+
+    def number(self, name, default=None, kind=float, minimum=None):
+        value = self.text(name)
+        if value is None or value == "":
+            if default is None:
+                raise ApiError(400, f"'{name}' is required")
+            return default
+        try:
+            number = kind(value)
+        except ValueError:
+            raise ApiError(400, f"'{name}' must be a number, not '{value}'") from None
+        if minimum is not None and number < minimum:
+            raise ApiError(400, f"'{name}' must be at least {minimum}")
+        return number
+
+    def flag(self, name, default=False):
+        value = self.text(name)
+        if value is None or value == "":
+            return default
+        if value.lower() in ("1", "true", "yes", "on"):
+            return True
+        if value.lower() in ("0", "false", "no", "off"):
+            return False
+        raise ApiError(400, f"'{name}' must be true or false, not '{value}'")
+
+    def choice(self, name, choices, default):
+        value = self.text(name, default)
+        if value not in choices:
+            raise ApiError(400, f"'{name}' must be one of {', '.join(choices)}")
+        return choices[value]
+
+    def upload(self, name):
+        uploads = self.uploads(name)
+        if len(uploads) != 1:
+            raise ApiError(400, f"expected one '{name}' file, got {len(uploads)}")
+        return uploads[0]
+
+    def uploads(self, name, at_least=1):
+        uploads = self.files.get(name, [])
+        if len(uploads) < at_least:
+            raise ApiError(400, f"expected at least {at_least} '{name}' file(s), got {len(uploads)}")
+        return uploads
+
+
+def _input_error(error):
+    """Whether a job failed on its input (a broken PDF or image) rather than on a bug."""
+    from PIL import UnidentifiedImageError
+    from PyPDF2.errors import PyPdfError
+
+    errors = (ValueError, UnidentifiedImageError, PyPdfError)
+    if importlib.util.find_spec("pikepdf") is not None:
+        import pikepdf
+
+        errors += (pikepdf.PdfError,)
+    return isinstance(error, errors)
+
+
+def _page_count(upload):
+    from PyPDF2 import PdfReader
+    from PyPDF2.errors import PdfReadError
+
+    try:
+        with upload.open() as pdf_file:
+            return len(PdfReader(pdf_file).pages)
+    except (PdfReadError, ValueError) as error:
+        raise ApiError(422, f"{upload.name} is not a readable PDF: {error}") from None
+
+
+def _pages(request, name, num_pages, strict=False):
+    try:
+        return compile_pages(request.text(name, "all"), num_pages, strict)
+    except PageSelectionError as error:
+        raise ApiError(400, f"'{name}': {error}") from None
+
+
+# Each operation validates the request, then returns (operation name, input
+# bytes, fn) where fn runs on a worker and returns (output, file name, headers):
+# the output is a BytesIO or the path of a temp file to send and delete.
+
+def _overlay(request):
+    from tabs.pdf_overlay import process_pdf
+
+    pdf_upload, image_upload = request.upload("file"), request.upload("image")
+    num_pages = _page_count(pdf_upload)
+    pages = _pages(request, "pages", num_pages)
+    background = request.flag("background")
+    placement = (None, None, 0, 0) if background else (
+        request.number("width", minimum=1), request.number("height", minimum=1),
+        request.number("x", 0.0), request.number("y", 0.0),
+    )
+    linearize = request.flag("fast_web_view")
+
+    def overlay():
+        with track_operation("overlay", bytes_in=pdf_upload.size) as op, \
+                pdf_upload.open() as pdf_file, image_upload.open() as image_file:
+            output = process_pdf(pdf_file, image_file, pages, num_pages, background, *placement, linearize)
+            op.bytes_out = output.getbuffer().nbytes
+        return output, f"{pdf_upload.name.rsplit('.', 1)[0]}_with_image.pdf", {}
+
+    return "overlay", pdf_upload.size + image_upload.size, overlay
+
+
+def _merge(request):
+    from tabs.pdf_merger import merge_pdfs
+
+    uploads = request.uploads("file", at_least=2)
+    merge_order = request.choice("order", MERGE_ORDERS, "upload")
+    add_bookmarks = request.flag("bookmarks", True)
+    linearize = request.flag("fast_web_view")
+    bytes_in = sum(upload.size for upload in uploads)
+
+    def merge():
+        with track_operation("merge", bytes_in=bytes_in) as op, ExitStack() as stack:
+            pdf_files = [stack.enter_context(upload.open()) for upload in uploads]
+            output = merge_pdfs(pdf_files, merge_order, add_bookmarks, linearize)
+            op.bytes_out = output.getbuffer().nbytes
+        return output, "merged.pdf", {}
+
+    return "merge", bytes_in, merge
+
+
+def _split(request):
+    from PyPDF2 import PdfReader
+
+    from tabs.split_pdf_tab import custom_groups, every_n_groups, every_page_groups, split_pdf
+
+    upload = request.upload("file")
+    total_pages = _page_count(upload)
+    if request.texts("ranges"):
+        try:
+            file_groups = custom_groups(request.texts("ranges"), total_pages)
+        except PageSelectionError as error:
+            raise ApiError(400, f"'ranges': {error}") from None
+    elif request.text("every"):
+        file_groups = every_n_groups(total_pages, request.number("every", kind=int, minimum=1))
+    else:
+        file_groups = every_page_groups(total_pages)
+    if not file_groups:
+        raise ApiError(400, "no page groups to split into")
+    base_name = upload.name.rsplit(".", 1)[0]
+    linearize = request.flag("fast_web_view")
+
+    def split():
+        with track_operation("split", bytes_in=upload.size) as op, upload.open() as pdf_file:
+            output = split_pdf(PdfReader(pdf_file), file_groups, base_name, linearize)
+            op.bytes_out = output.getbuffer().nbytes
+        return output, f"{base_name}_split.zip", {"X-PDF-Tools-Files": str(len(file_groups))}
+
+    return "split", upload.size, split
+
+
+def _compress(request):
+    from tabs.compress_pdf_tab import (
+        PIKEPDF_AVAILABLE, QUALITY_PRESETS, _compress_pdf, _compress_pdf_to_target, _remove_if_exists,
+    )
+    from utils.image_cache import get_image_cache
+
+    if not PIKEPDF_AVAILABLE:
+        raise ApiError(501, "compression needs pikepdf, which isn't installed")
+    upload = request.upload("file")
+    preset = QUALITY_PRESETS["Recommended"]
+    target_mb = request.text("target_mb")
+    if target_mb:
+        target_size = int(request.number("target_mb", minimum=0.01) * 1024 * 1024)
+    else:
+        quality = request.number("quality", preset["quality"], int, minimum=1)
+        max_dim = request.number("max_dim", preset["max_dim"], int, minimum=16)
+    clean_structure = request.flag("clean_structure", True)
+    strip_metadata = clean_structure and request.flag("strip_metadata")
+    linearize = request.flag("fast_web_view")
+
+    def compress():
+        fd, output_path = tempfile.mkstemp(suffix="_compressed.pdf")
+        os.close(fd)
+        options = {"linearize": linearize, "clean_structure": clean_structure,
+                   "strip_metadata": strip_metadata, "cache": get_image_cache()}
+        try:
+            with track_operation("compress", bytes_in=upload.size) as op:
+                if target_mb:
+                    stats = _compress_pdf_to_target(upload.path, output_path, target_size, **options)
+                else:
+                    stats = _compress_pdf(upload.path, output_path, quality, max_dim, **options)
+                op.bytes_out = os.path.getsize(output_path)
+        except BaseException:
+            _remove_if_exists(output_path)
+            raise
+        return output_path, f"{upload.name.rsplit('.', 1)[0]}_compressed.pdf", {
+            "X-PDF-Tools-Stats": json.dumps(stats),
+        }
+
+    return "compress", upload.size, compress
+
+
+def _convert(request):
+    from reportlab.lib.pagesizes import A4
+
+    from tabs.image_to_pdf import create_combined_pdf
+
+    uploads = request.uploads("file")
+    page_size = {"portrait": A4, "landscape": (A4[1], A4[0])}.get(request.text("orientation", "portrait"))
+    if page_size is None:
+        raise ApiError(400, "'orientation' must be portrait or landscape")
+    fit_mode = request.choice("fit", FIT_MODES, "fit")
+    margin_points = request.number("margin_mm", 10.0, minimum=0) * 2.83465  # mm to points
+    available_width = page_size[0] - 2 * margin_points
+    available_height = page_size[1] - 2 * margin_points
+    if available_width <= 0 or available_height <= 0:
+        raise ApiError(400, "'margin_mm' leaves no room on the page")
+    bytes_in = sum(upload.size for upload in uploads)
+
+    def convert():
+        with track_operation("convert", bytes_in=bytes_in) as op, ExitStack() as stack:
+            image_files = [stack.enter_context(upload.open()) for upload in uploads]
+            output = create_combined_pdf(image_files, page_size, fit_mode,
+                                         available_width, available_height, margin_points)
+            op.bytes_out = output.getbuffer().nbytes
+        return output, "converted_images.pdf", {}
+
+    return "convert", bytes_in, convert
+
+
+OPERATIONS = {
+    "/overlay": _overlay,
+    "/merge": _merge,
+    "/split": _split,
+    "/compress": _compress,
+    "/convert": _convert,
+}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "PDFTools/1"
+    _body_reader = None
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/health":
+            self._send_error(ApiError(404, f"no such endpoint: GET {self.path}"))
+            return
+        pool = get_worker_pool()
+        self._send_json(200, {"status": "ok", "workers": pool.workers, "running": pool.running(),
+                              "queued": pool.queue_depth(), "admitted_bytes": pool.admitted_bytes()})
+
+    def do_POST(self):
+        operation = OPERATIONS.get(self.path.split("?", 1)[0])
+        if operation is None:
+            self._send_error(ApiError(404, f"no such endpoint: POST {self.path}"))
+            return
+        if not self.server.request_slots.acquire(blocking=False):
+            self._send_error(ApiError(503, "too many requests in progress"), {"Retry-After": "1"})
+            return
+        files = {}
+        try:
+            try:
+                fields, files = parse_multipart(self._body(), self._boundary())
+                name, bytes_in, fn = operation(_Request(fields, files))
+                output, file_name, headers = self._run(name, bytes_in, fn)
+            except ApiError as error:
+                self._send_error(error)
+                return
+            self._send_output(output, file_name, headers)
+        finally:
+            _release(files)
+            self.server.request_slots.release()
+
+    def _boundary(self):
+        content_type = self.headers.get("Content-Type", "")
+        boundary = _header_param(content_type, "boundary")
+        if not content_type.lower().startswith("multipart/form-data") or not boundary:
+            raise ApiError(415, "send the request as multipart/form-data")
+        return boundary.encode("latin-1")
+
+    def _body(self):
+        length = self.headers.get("Content-Length")
+        if length is None or not length.isdigit():
+            raise ApiError(411, "a Content-Length header is required")
+        if int(length) > self.server.max_upload_bytes:
+            raise ApiError(413, f"request body over the {self.server.max_upload_bytes // (1024 * 1024)} MB limit")
+        self._body_reader = _BodyReader(self.rfile, int(length))
+        return self._body_reader
+
+    def _discard_body(self):
+        """Read and drop the rest of the request body, if it is within the upload limit.
+
+        A client still sending its body when the reply arrives gets a broken
+        pipe instead of the reply. A body over the limit (or of unknown
+        length) isn't read; that client just sees the connection close.
+        """
+        body = self._body_reader
+        if body is None:
+            length = self.headers.get("Content-Length", "")
+            if not length.isdigit() or int(length) > self.server.max_upload_bytes:
+                return
+            body = _BodyReader(self.rfile, int(length))
+        while body.read(_CHUNK):
+            pass
+
+    def _run(self, name, bytes_in, fn):
+        """Run ``fn`` as a job on the shared worker pool and wait for it."""
+        job = Job(name, fn, bytes_in=bytes_in)
+        try:
+            get_worker_pool().submit(job, f"api:{self.client_address[0]}")
+        except QueueFull as error:
+            raise ApiError(503, str(error)) from None
+        job.wait()
+        if job.status != "done":
+            if isinstance(job.error, ApiError):
+                raise job.error
+            raise ApiError(422 if _input_error(job.error) else 500, f"{name} failed: {job.error}")
+        return job.result
+
+    def _send_output(self, output, file_name, headers):
+        is_path = isinstance(output, str)
+        try:
+            source = open(output, "rb") if is_path else output
+            with source:
+                source.seek(0, os.SEEK_END)
+                length = source.tell()
+                source.seek(0)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/zip" if file_name.endswith(".zip")
+                                 else "application/pdf")
+                self.send_header("Content-Length", str(length))
+                self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(file_name)}")
+                for header, value in headers.items():
+                    self.send_header(header, value)
+                self.end_headers()
+                shutil.copyfileobj(source, self.wfile, _CHUNK)
+        finally:
+            if is_path:
+                os.unlink(output)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, error, headers=None):
+        self._discard_body()
+        # A body over the limit is still unread; don't try to reuse the connection.
+        self.close_connection = True
+        self._send_json(error.status, {"error": str(error)}, headers)
+
+    def log_message(self, *_args):
+        pass
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, max_requests=None, max_upload_bytes=None):
+        super().__init__(address, ApiHandler)
+        if max_requests is None:
+            max_requests = int(os.environ.get("PDF_TOOLS_API_MAX_REQUESTS", 2 * get_worker_pool().workers))
+        if max_upload_bytes is None:
+            max_upload_bytes = int(float(os.environ.get("PDF_TOOLS_API_MAX_UPLOAD_MB", DEFAULT_MAX_UPLOAD_MB))
+                                   * 1024 * 1024)
+        self.request_slots = threading.BoundedSemaphore(max_requests)
+        self.max_upload_bytes = max_upload_bytes
+
+
+def main():
+    host = os.environ.get("PDF_TOOLS_API_HOST", "127.0.0.1")
+    port = int(os.environ.get("PDF_TOOLS_API_PORT", DEFAULT_PORT))
+    server = ApiServer((host, port))
+    print(f"PDF Tools API on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,49 @@
 # app.py
 import streamlit as st
 from tabs import pdf_overlay, image_to_pdf, pdf_merger,split_pdf_tab,compress_pdf_tab
+from utils.instrumentation import render_with_profiling
+from utils.metrics import start_metrics_server
+from utils.session_memory import begin_session_run, end_session_run, render_session_memory_debug
 
 st.set_page_config(page_title="PDF Tools", page_icon="📄", layout="wide")
 st.title("📄 PDF Tools Suite")
 
+# No-op unless PDF_TOOLS_METRICS_PORT is set; only the first run starts it.
+start_metrics_server()
+run_started = begin_session_run()
+
+if st.sidebar.checkbox(
+    "🔬 Record performance details",
+    key="performance_details",
+    help="Times each processing stage (wall and CPU time) and shows the breakdown under each tab.",
+):
+    st.sidebar.checkbox(
+        "Include peak memory (slower)",
+        key="performance_details_memory",
+        help="Traces allocations with tracemalloc; processing runs several times slower while on.",
+    )
+
+# Filled in at the end of the run, once this run's artifacts are accounted for.
+session_memory_view = st.sidebar.expander("🧠 Session memory")
+
 # Create tabs for different features
 tab1, tab2, tab3, tab4, tab5 = st.tabs(["📝 PDF Image Overlay", "🖼️ Image to PDF Converter", "🔗 PDF Merger", "✂️ Split PDF", "🗜️ Compress PDF"])
 
 # Load each tab from separate modules
 with tab1:
-    pdf_overlay.render()
+    render_with_profiling("overlay", pdf_overlay.render)
 
 with tab2:
-    image_to_pdf.render()
+    render_with_profiling("image_to_pdf", image_to_pdf.render)
 
 with tab3:
-    pdf_merger.render()
+    render_with_profiling("merger", pdf_merger.render)
 
 with tab4:
-    split_pdf_tab.render()
+    render_with_profiling("split", split_pdf_tab.render)
 
 with tab5:
-    compress_pdf_tab.render()
+    render_with_profiling("compress", compress_pdf_tab.render)
 
 # Footer
 st.markdown("---")
@@ -35,4 +56,9 @@ st.markdown("""
     🔗 PDF Merger: Combine multiple PDFs with optional bookmarks for easy navigation
     ✂️ Split PDF: Divide PDFs into smaller files based on page ranges
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+# Release what this session no longer uses once over its memory budget, and idle sessions' artifacts.
+end_session_run(run_started)
+with session_memory_view:
+    render_session_memory_debug()
@@ -0,0 +1,208 @@
+# benchmarks/api_check.py
+"""End-to-end check of the local HTTP API (api.py), in process.
+
+Starts the API server on a free port in a background thread and calls every
+endpoint with files from the benchmark corpus over a real socket, checking
+the outputs (page counts, ZIP members, sizes) and the error statuses for bad
+requests. Request bodies are streamed from disk, and the multipart parser's
+peak memory is measured on a large upload to show it doesn't buffer the
+body. Prints per-call times and exits non-zero on the first failure.
+
+    python benchmarks/api_check.py
+    python benchmarks/api_check.py --scale 1
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+import zipfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from corpus import build_corpus  # noqa: E402
+
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "pdf_tools_bench_corpus")
+
+
+class Client:
+    """Minimal multipart client; file parts are streamed from disk, not read into memory."""
+
+    def __init__(self, port):
+        self.port = port
+
+    def post(self, path, fields=(), files=(), headers=None):
+        """POST ``fields`` [(name, value)] and ``files`` [(name, path)]; returns (status, headers, body)."""
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in fields:
+            parts.append((f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                          f"{value}\r\n").encode())
+        for name, file_path in files:
+            parts.append((f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                          f'filename="{os.path.basename(file_path)}"\r\n'
+                          "Content-Type: application/octet-stream\r\n\r\n").encode())
+            parts.append(file_path)
+            parts.append(b"\r\n")
+        parts.append(f"--{boundary}--\r\n".encode())
+        length = sum(os.path.getsize(part) if isinstance(part, str) else len(part) for part in parts)
+
+        def body():
+            for part in parts:
+                if isinstance(part, str):
+                    with open(part, "rb") as f:
+                        yield from iter(lambda: f.read(1024 * 1024), b"")
+                else:
+                    yield part
+
+        request_headers = {"Content-Type": f"multipart/form-data; boundary={boundary}",
+                           "Content-Length": str(length)}
+        request_headers.update(headers or {})
+        return self._request("POST", path, body(), request_headers)
+
+    def get(self, path):
+        return self._request("GET", path, None, {})
+
+    def _request(self, method, path, body, headers):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=600)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            connection.close()
+
+
+def _pdf_pages(data):
+    from PyPDF2 import PdfReader
+
+    return len(PdfReader(io.BytesIO(data)).pages)
+
+
+def _expect(condition, message):
+    if not condition:
+        print(f"FAIL: {message}")
+        sys.exit(1)
+
+
+def check_endpoints(client, paths):
+    letterhead, scans, text = paths["letterhead.pdf"], paths["scans.pdf"], paths["text_many_pages.pdf"]
+    photos = [path for name, path in sorted(paths.items()) if name.startswith("photo_")][:3]
+    pages = {path: _pdf_pages(open(path, "rb").read()) for path in (letterhead, scans, text)}
+
+    def call(label, path, fields=(), files=(), status=200):
+        start = time.perf_counter()
+        result = client.post(path, fields, files)
+        elapsed = time.perf_counter() - start
+        _expect(result[0] == status, f"{label}: status {result[0]}, expected {status}: {result[2][:200]!r}")
+        print(f"{label:<40}{result[0]:>6}{elapsed * 1000:>10.0f} ms{len(result[2]) / 1024:>10.0f} KB")
+        return result
+
+    _, _, body = call("overlay, odd pages", "/overlay",
+                      [("pages", "odd"), ("x", 40), ("y", 700), ("width", 120), ("height", 50)],
+                      [("file", letterhead), ("image", paths["stamp.png"])])
+    _expect(_pdf_pages(body) == pages[letterhead], "overlay: page count changed")
+
+    _, _, body = call("overlay, background", "/overlay", [("background", "true"), ("fast_web_view", "1")],
+                      [("file", letterhead), ("image", paths["stamp.png"])])
+    _expect(_pdf_pages(body) == pages[letterhead], "overlay background: page count changed")
+
+    _, _, body = call("merge, by name with bookmarks", "/merge", [("order", "name")],
+                      [("file", text), ("file", letterhead)])
+    _expect(_pdf_pages(body) == pages[text] + pages[letterhead], "merge: wrong page count")
+
+    _, headers, body = call("split, custom ranges", "/split", [("ranges", "1-2"), ("ranges", "odd")],
+                            [("file", letterhead)])
+    names = zipfile.ZipFile(io.BytesIO(body)).namelist()
+    _expect(len(names) == 2 and headers.get("X-PDF-Tools-Files") == "2", f"split: got {names}")
+
+    _, _, body = call("split, every 4 pages", "/split", [("every", 4)], [("file", text)])
+    _expect(len(zipfile.ZipFile(io.BytesIO(body)).namelist()) == -(-pages[text] // 4), "split every: count")
+
+    _, headers, body = call("compress, recommended", "/compress", [], [("file", scans)])
+    stats = json.loads(headers["X-PDF-Tools-Stats"])
+    _expect(_pdf_pages(body) == pages[scans] and len(body) < os.path.getsize(scans),
+            f"compress: {len(body)} bytes from {os.path.getsize(scans)}, {stats}")
+
+    _, _, body = call("compress, target size", "/compress",
+                      [("target_mb", round(os.path.getsize(scans) / 3 / 1024 / 1024, 2))], [("file", scans)])
+    _expect(_pdf_pages(body) == pages[scans], "compress to target: page count changed")
+
+    _, _, body = call("convert, landscape", "/convert", [("orientation", "landscape"), ("fit", "fill")],
+                      [("file", path) for path in photos])
+    _expect(_pdf_pages(body) == len(photos), "convert: wrong page count")
+
+    call("bad page selection", "/overlay", [("pages", "3-1"), ("x", 0), ("y", 0), ("width", 9), ("height", 9)],
+         [("file", letterhead), ("image", paths["stamp.png"])], status=400)
+    call("split range past the end", "/split", [("ranges", f"1-{pages[letterhead] + 1}")],
+         [("file", letterhead)], status=400)
+    call("merge with one file", "/merge", [], [("file", letterhead)], status=400)
+    call("not a PDF", "/split", [], [("file", paths["stamp.png"])], status=422)
+    call("unknown endpoint", "/rotate", [], [("file", letterhead)], status=404)
+
+    status, _, _ = client.post("/merge", headers={"Content-Type": "application/pdf"})
+    _expect(status == 415, f"non-multipart body: status {status}")
+    status, _, body = client.get("/health")
+    _expect(status == 200 and json.loads(body)["status"] == "ok", "health")
+
+
+def check_streaming(size_mb):
+    """Parse a ``size_mb`` upload and report the parser's peak Python memory."""
+    import api
+
+    boundary = b"check-boundary"
+    head = (b"--" + boundary + b'\r\nContent-Disposition: form-data; name="file"; filename="big.bin"\r\n\r\n')
+    tail = b"\r\n--" + boundary + b"--\r\n"
+    chunk = bytes(range(256)) * 4096  # 1 MB, no CR/LF runs that look like a delimiter
+    with tempfile.TemporaryFile() as body_file:
+        body_file.write(head)
+        for _ in range(size_mb):
+            body_file.write(chunk)
+        body_file.write(tail)
+        length = body_file.tell()
+        body_file.seek(0)
+        tracemalloc.start()
+        start = time.perf_counter()
+        _, files = api.parse_multipart(api._BodyReader(body_file, length), boundary)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    upload = files["file"][0]
+    _expect(upload.size == size_mb * len(chunk), f"streamed upload is {upload.size} bytes")
+    api._release(files)
+    print(f"parsed a {size_mb} MB upload in {elapsed * 1000:.0f} ms, peak memory {peak / 1024 / 1024:.1f} MB")
+    _expect(peak < 8 * 1024 * 1024, "the multipart parser buffered the upload")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--scale", type=float, default=0.25, help="corpus size multiplier")
+    parser.add_argument("--stream-mb", type=int, default=256, help="size of the streamed-upload check")
+    args = parser.parse_args()
+
+    paths = build_corpus(args.corpus_dir, args.scale)
+    import api
+
+    server = api.ApiServer(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        print(f"{'call':<40}{'status':>6}{'time':>13}{'output':>13}")
+        check_endpoints(Client(server.server_address[1]), paths)
+    finally:
+        server.shutdown()
+        server.server_close()
+    check_streaming(args.stream_mb)
+    print("all API checks passed")
+
+
+if __name__ == "__main__":
+    main()
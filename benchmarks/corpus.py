@@ -0,0 +1,165 @@
+# benchmarks/corpus.py
+"""Deterministic synthetic PDFs and images for the benchmark suite.
+
+Every generator is seeded, so the same arguments always produce
+byte-identical files and benchmark runs stay comparable across versions.
+Files are written into a corpus directory and reused if already present.
+"""
+import io
+import os
+import random
+
+from PIL import Image, ImageDraw
+
+# Letter, A4, Legal and landscape A4, in points: a "mixed page sizes" document
+# cycles through these.
+PAGE_SIZES = [(612, 792), (595.27, 841.89), (612, 1008), (841.89, 595.27)]
+
+
+def _noise_image(rng, width, height, blocks=48):
+    """A photo-like RGB image: coarse random blocks, smoothly upscaled.
+
+    Pure per-pixel noise would be incompressible and unrepresentative of scans.
+    """
+    small = Image.frombytes(
+        "RGB", (blocks, blocks), bytes(rng.getrandbits(8) for _ in range(blocks * blocks * 3))
+    )
+    return small.resize((width, height), Image.BILINEAR)
+
+
+def _jpeg_bytes(image, quality=92):
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def text_pdf(path, pages, seed=0):
+    """Many pages of text and vector graphics, cycling through PAGE_SIZES."""
+    from reportlab.pdfgen import canvas
+
+    rng = random.Random(seed)
+    can = canvas.Canvas(path, pagesize=PAGE_SIZES[0], invariant=1)
+    for i in range(pages):
+        width, height = PAGE_SIZES[i % len(PAGE_SIZES)]
+        can.setPageSize((width, height))
+        can.setFont("Helvetica", 10)
+        for line in range(40):
+            words = " ".join(f"w{rng.randrange(10000)}" for _ in range(10))
+            can.drawString(50, height - 60 - line * 14, words)
+        can.rect(40, 40, width - 80, 60)
+        can.drawString(50, 20, f"Page {i + 1}")
+        can.showPage()
+    can.save()
+
+
+def scan_pdf(path, pages, width=2480, height=3508, seed=0):
+    """Scanned-document style PDF: one full-page DCT image per page."""
+    import pikepdf
+
+    rng = random.Random(seed)
+    pdf = pikepdf.new()
+    for i in range(pages):
+        data = _jpeg_bytes(_noise_image(rng, width, height))
+        page_width, page_height = PAGE_SIZES[i % 2]
+        pdf.add_blank_page(page_size=(page_width, page_height))
+        image = pikepdf.Stream(pdf, data)
+        image.Type = pikepdf.Name.XObject
+        image.Subtype = pikepdf.Name.Image
+        image.Width, image.Height = width, height
+        image.ColorSpace = pikepdf.Name.DeviceRGB
+        image.BitsPerComponent = 8
+        image.Filter = pikepdf.Name.DCTDecode
+        page = pdf.pages[i]
+        page.Resources = pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image))
+        page.Contents = pikepdf.Stream(
+            pdf, f"q {page_width} 0 0 {page_height} 0 0 cm /Im0 Do Q".encode()
+        )
+    pdf.save(path, deterministic_id=True)
+
+
+def shared_resources_pdf(path, pages, seed=0):
+    """Letterhead-style document: the same logo on every page.
+
+    Each page embeds its own identical copy of the logo and stores its text
+    unfiltered, as some producers do -- exactly what the structural pass and
+    the image cache are meant to catch.
+    """
+    import pikepdf
+
+    rng = random.Random(seed)
+    logo = _jpeg_bytes(_noise_image(rng, 600, 200, blocks=12))
+    width, height = PAGE_SIZES[1]
+    pdf = pikepdf.new()
+    font = pdf.make_indirect(pikepdf.Dictionary(
+        Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type1, BaseFont=pikepdf.Name("/Times-Roman"),
+    ))
+    for i in range(pages):
+        pdf.add_blank_page(page_size=(width, height))
+        image = pikepdf.Stream(pdf, logo)
+        image.Type = pikepdf.Name.XObject
+        image.Subtype = pikepdf.Name.Image
+        image.Width, image.Height = 600, 200
+        image.ColorSpace = pikepdf.Name.DeviceRGB
+        image.BitsPerComponent = 8
+        image.Filter = pikepdf.Name.DCTDecode
+        lines = "".join(
+            f"BT /F1 11 Tf 50 {height - 160 - line * 15:.0f} Td (Clause {i}.{line} "
+            f"{'x' * rng.randrange(20, 60)}) Tj ET\n"
+            for line in range(30)
+        )
+        page = pdf.pages[i]
+        page.Resources = pikepdf.Dictionary(
+            XObject=pikepdf.Dictionary(Logo=image), Font=pikepdf.Dictionary(F1=font),
+        )
+        page.Contents = pikepdf.Stream(
+            pdf, f"q 300 0 0 100 50 {height - 120:.0f} cm /Logo Do Q\n{lines}".encode()
+        )
+    pdf.save(path, compress_streams=False, deterministic_id=True)
+
+
+def stamp_png(path, width=400, height=150, seed=0):
+    """Signature-like PNG with transparency."""
+    rng = random.Random(seed)
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    points = [(x, height // 2 + rng.randrange(-height // 3, height // 3)) for x in range(10, width - 10, 12)]
+    draw.line(points, fill=(20, 30, 140, 255), width=4)
+    image.save(path)
+
+
+def photo_jpeg(path, width, height, seed=0):
+    """Large camera-style photo for the image-to-PDF converter."""
+    _noise_image(random.Random(seed), width, height).save(path, format="JPEG", quality=90)
+
+
+# name -> (generator, kwargs) at scale 1. Page counts are multiplied by the
+# scale passed to build_corpus().
+CORPUS = {
+    "text_many_pages.pdf": (text_pdf, {"pages": 400}),
+    "scans.pdf": (scan_pdf, {"pages": 12}),
+    "letterhead.pdf": (shared_resources_pdf, {"pages": 60}),
+    "stamp.png": (stamp_png, {}),
+    "photo_1.jpg": (photo_jpeg, {"width": 6000, "height": 4000, "seed": 1}),
+    "photo_2.jpg": (photo_jpeg, {"width": 4000, "height": 6000, "seed": 2}),
+    "photo_3.jpg": (photo_jpeg, {"width": 3000, "height": 3000, "seed": 3}),
+}
+
+
+def build_corpus(directory, scale=1.0):
+    """Generate every CORPUS file into ``directory`` (skipping existing ones).
+
+    Returns a dict of name -> path.
+    """
+    directory = os.path.join(directory, f"scale_{scale:g}")
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name, (generator, kwargs) in CORPUS.items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            scaled = {
+                key: max(1, int(value * scale)) if key == "pages" else value
+                for key, value in kwargs.items()
+            }
+            generator(path, **scaled)
+        paths[name] = path
+    return paths
@@ -0,0 +1,134 @@
+# benchmarks/linearization_check.py
+"""Check of the "Fast web view" outputs (utils.pdf_output).
+
+Writes every linearized output the app produces — overlay with each engine,
+merge, split and compress — from the benchmark corpus, and checks that qpdf
+accepts each file's linearization and that the first-page range in its
+hint dictionary (``/E``) is small: a viewer must be able to show page 1
+after fetching at most MAX_FIRST_PAGE_SHARE of the file, or twice an average
+page, whichever is larger. Prints the range and write time per output and
+exits non-zero on the first failure.
+
+    python benchmarks/linearization_check.py
+    python benchmarks/linearization_check.py --scale 1
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from corpus import build_corpus  # noqa: E402
+
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "pdf_tools_bench_corpus")
+MAX_FIRST_PAGE_SHARE = 0.25
+
+
+def _outputs(paths):
+    """(label, linearized PDF bytes) for each tab's writer."""
+    from PyPDF2 import PdfReader
+    from tabs.compress_pdf_tab import _compress_pdf
+    from tabs.pdf_merger import merge_pdfs
+    from tabs.pdf_overlay import OVERLAY_BACKENDS, make_stamp
+    from tabs.split_pdf_tab import split_pdf
+
+    text, letterhead, scans = paths["text_many_pages.pdf"], paths["letterhead.pdf"], paths["scans.pdf"]
+    with open(paths["stamp.png"], "rb") as f:
+        stamp = f.read()
+
+    num_pages = len(PdfReader(text).pages)
+
+    def overlay(engine):
+        stamps = [make_stamp(io.BytesIO(stamp), list(range(num_pages)), False, 150, 60, 400, 80)]
+        with open(text, "rb") as pdf_file:
+            return OVERLAY_BACKENDS[engine](pdf_file, stamps, num_pages, linearize=True).getvalue()
+
+    for engine in OVERLAY_BACKENDS:
+        yield f"overlay ({engine})", lambda engine=engine: overlay(engine)
+
+    def merge():
+        files = []
+        for path in (text, letterhead):
+            with open(path, "rb") as f:
+                files.append(io.BytesIO(f.read()))
+            files[-1].name = os.path.basename(path)
+        return merge_pdfs(files, "Upload order", True, linearize=True).getvalue()
+
+    yield "merge", merge
+
+    def split():
+        half = num_pages // 2
+        groups = [("first_half", list(range(half))), ("second_half", list(range(half, num_pages)))]
+        with zipfile.ZipFile(split_pdf(PdfReader(text), groups, "text", linearize=True)) as zf:
+            return zf.read(zf.namelist()[0])
+
+    yield "split (first half)", split
+
+    def compress():
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, "out.pdf")
+            _compress_pdf(scans, output_path, quality=60, max_dim=1600, linearize=True)
+            with open(output_path, "rb") as f:
+                return f.read()
+
+    yield "compress", compress
+
+
+def _check(data):
+    """The problem with a linearized output, or None."""
+    import pikepdf
+    from utils.pdf_output import first_page_byte_range
+
+    byte_range = first_page_byte_range(data[:4096])
+    if byte_range is None:
+        return "not linearized"
+    first_page_end, file_length = byte_range
+    if file_length != len(data):
+        return f"/L is {file_length}, file is {len(data)} bytes"
+    with pikepdf.open(io.BytesIO(data)) as pdf:
+        problems = io.StringIO()
+        stderr = sys.stderr
+        try:
+            linearization_ok = pdf.check_linearization(stream=problems)
+        finally:
+            sys.stderr = stderr  # pikepdf leaves ``stream`` installed as sys.stderr
+        if not linearization_ok:
+            return f"qpdf rejects the linearization: {problems.getvalue().strip()[:200]}"
+        average_page = file_length / len(pdf.pages)
+    allowed = max(MAX_FIRST_PAGE_SHARE * file_length, 2 * average_page)
+    if first_page_end > allowed:
+        return f"page 1 needs {first_page_end} of {file_length} bytes (allowed {allowed:.0f})"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--scale", type=float, default=0.25, help="corpus size multiplier")
+    args = parser.parse_args()
+
+    from utils.pdf_output import first_page_byte_range
+
+    paths = build_corpus(args.corpus_dir, args.scale)
+    print(f"{'output':<32}{'file KB':>10}{'page 1 KB':>11}{'share':>8}{'write s':>9}")
+    for label, write in _outputs(paths):
+        start = time.perf_counter()
+        data = write()
+        elapsed = time.perf_counter() - start
+        problem = _check(data)
+        first_page_end = (first_page_byte_range(data[:4096]) or (0, 0))[0]
+        print(f"{label:<32}{len(data) / 1024:>10.0f}{first_page_end / 1024:>11.0f}"
+              f"{first_page_end / len(data):>8.1%}{elapsed:>9.2f}")
+        if problem:
+            print(f"FAIL: {label}: {problem}")
+            sys.exit(1)
+    print("all linearization checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# benchmarks/overlay_equivalence.py
+"""Output-equivalence check for the overlay tab's stamping engines.
+
+Stamps every document of the benchmark corpus with each engine in
+tabs.pdf_overlay.OVERLAY_BACKENDS, in overlay and background mode, with a
+set of several stamps, with text stamps (page and Bates numbers) and as an
+incremental update, plus a copy whose first pages are rotated, cropped or
+have an offset MediaBox.
+Renders the stamped pages (and the last page) with PyMuPDF and compares
+them pixel by pixel with the PyPDF2 + ReportLab output. Prints the time
+each engine took and exits non-zero if any page differs by more than the
+tolerance.
+
+    python benchmarks/overlay_equivalence.py
+    python benchmarks/overlay_equivalence.py --scale 0.25 --dpi 72
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from corpus import build_corpus  # noqa: E402
+
+REFERENCE = "PyPDF2 + ReportLab"
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "pdf_tools_bench_corpus")
+
+# Pixels whose channels differ by more than CHANNEL_TOLERANCE count as different;
+# a page fails when more than PAGE_TOLERANCE of them do (anti-aliasing noise).
+CHANNEL_TOLERANCE = 8
+PAGE_TOLERANCE = 0.001
+
+MODES = ("overlay", "background", "stamp set", "text")
+
+
+def _rotated_and_cropped(path):
+    """The document with page 1 rotated 90°, page 2 cropped off-origin, page 3's
+    MediaBox moved off-origin and pages 4-6 both cropped and rotated 270°, 180°
+    and 90°."""
+    import pikepdf
+
+    output = io.BytesIO()
+    with pikepdf.open(path) as pdf:
+        pdf.pages[0].Rotate = 90
+        x0, y0, x1, y1 = (float(value) for value in pdf.pages[1].MediaBox)
+        pdf.pages[1].CropBox = [x0 + 20, y0 + 30, x1 - 10, y1 - 40]
+        pdf.pages[2].MediaBox = [x0 + 10, y0 + 20, x1 + 10, y1 + 20]
+        for page, rotation in zip(pdf.pages[3:6], (270, 180, 90)):
+            page.Rotate = rotation
+            page.CropBox = [x0 + 50, y0 + 60, x1 - 90, y1 - 140]
+        pdf.save(output)
+    return output.getvalue()
+
+
+def _render(data, page_numbers, dpi):
+    import fitz
+
+    with fitz.open(stream=data, filetype="pdf") as document:
+        return {i: document[i].get_pixmap(dpi=dpi).samples for i in page_numbers}
+
+
+def _differing_fraction(a, b):
+    if len(a) != len(b):
+        return 1.0
+    return sum(abs(x - y) > CHANNEL_TOLERANCE for x, y in zip(a, b)) / len(a)
+
+
+def _stamps(mode, stamp, pages):
+    """The stamps applied in ``mode``: one stamp, a set mixing layers, sizes and
+    pages, or an image with text stamps."""
+    from tabs.pdf_overlay import make_stamp, make_text_stamp
+
+    if mode == "text":
+        return [
+            make_stamp(io.BytesIO(stamp), pages, False, 150, 60, 400, 80),
+            make_text_stamp("Page {page} of {pages}", pages, 400, 30, 150, 24, font_size=11,
+                            fill="#ffeecc", border="#884400"),
+            make_text_stamp("{bates} ({date})", pages[::2], 40, 30, 200, 20, font_size=9, color="#1040a0",
+                            align="left", bates_prefix="ACME-", bates_start=7, date="2024-01-31"),
+        ]
+    if mode != "stamp set":
+        return [make_stamp(io.BytesIO(stamp), pages, mode == "background", 150, 60, 400, 80)]
+    return [
+        make_stamp(io.BytesIO(stamp), pages[:1], True),
+        make_stamp(io.BytesIO(stamp), pages, False, 150, 60, 400, 80),
+        make_stamp(io.BytesIO(stamp), pages[1::2], False, 60, 24, 40, 700),
+    ]
+
+
+def _stamp(engine, data, stamp, pages, num_pages, mode):
+    from tabs.pdf_overlay import OVERLAY_BACKENDS, stamp_pdf_incremental
+
+    stamps = _stamps(mode, stamp, pages)
+    start = time.perf_counter()
+    if engine == "incremental":
+        output = stamp_pdf_incremental(io.BytesIO(data), stamps)
+    else:
+        output = OVERLAY_BACKENDS[engine](io.BytesIO(data), stamps, num_pages)
+    return output.getvalue(), time.perf_counter() - start
+
+
+def main():
+    from PyPDF2 import PdfReader
+    from tabs.pdf_overlay import OVERLAY_BACKENDS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--scale", type=float, default=0.25, help="corpus size multiplier")
+    parser.add_argument("--dpi", type=int, default=50, help="render resolution for the comparison")
+    args = parser.parse_args()
+
+    paths = build_corpus(args.corpus_dir, args.scale)
+    with open(paths["stamp.png"], "rb") as f:
+        stamp = f.read()
+    documents = {}
+    for name in ("text_many_pages.pdf", "scans.pdf", "letterhead.pdf"):
+        with open(paths[name], "rb") as f:
+            documents[name] = f.read()
+    documents["rotated_cropped.pdf"] = _rotated_and_cropped(paths["letterhead.pdf"])
+
+    engines = [name for name in OVERLAY_BACKENDS if name != REFERENCE] + ["incremental"]
+    print(f"{'document':<36}{'engine':<20}{'ref s':>8}{'engine s':>10}{'worst page':>12}")
+    failures = 0
+    for name, data in documents.items():
+        num_pages = len(PdfReader(io.BytesIO(data)).pages)
+        for mode in MODES:
+            label = f"{name} ({mode})"
+            pages = list(range(num_pages))
+            compared = sorted(set(pages[:6]) | {num_pages - 1})
+            reference, reference_s = _stamp(REFERENCE, data, stamp, pages, num_pages, mode)
+            expected = _render(reference, compared, args.dpi)
+            for engine in engines:
+                output, engine_s = _stamp(engine, data, stamp, pages, num_pages, mode)
+                actual = _render(output, compared, args.dpi)
+                worst = max(_differing_fraction(expected[i], actual[i]) for i in compared)
+                failed = worst > PAGE_TOLERANCE
+                failures += failed
+                print(f"{label:<36}{engine:<20}{reference_s:>8.3f}{engine_s:>10.3f}{worst:>11.3%}"
+                      + ("  FAIL" if failed else ""))
+
+    if failures:
+        print(f"\n{failures} comparison(s) differ from the {REFERENCE} output.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/overlay_interaction.py
+"""Script execution time per overlay-editor interaction.
+
+Drives the app with Streamlit's AppTest, with every tab's uploader already
+holding files from the benchmark corpus and two stamps in the overlay's
+stamp set, and times the script runs caused by resizing the stamp (a size
+slider, then the settings form's Apply button) and by clicking a position
+preset:
+
+- full rerun: the whole app script, every tab's render(), as a Streamlit
+  rerun executes it;
+- fragment rerun: only the overlay's stamp designer fragment
+  (pdf_overlay._render_stamp_designer), as a partial rerun executes it.
+
+    python benchmarks/overlay_interaction.py
+    python benchmarks/overlay_interaction.py --scale 1 --interactions 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import textwrap
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from corpus import build_corpus  # noqa: E402
+
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "pdf_tools_bench_corpus")
+
+# Runs inside AppTest: serves corpus files to the uploaders, then runs the
+# whole app or just the overlay editor.
+HARNESS = textwrap.dedent('''
+    import io, os, runpy, sys
+    sys.path.insert(0, {repo!r})
+    import streamlit as st
+
+    CORPUS = {corpus!r}
+    FILES = {{
+        "pdf": "letterhead.pdf", "image": "stamp.png", "split_pdf_uploader": "text_many_pages.pdf",
+        "compress_pdf_uploader": "scans.pdf",
+    }}
+    MULTIPLE = {{"pdf": ["letterhead.pdf", "scans.pdf"], "image": ["photo_3.jpg"]}}
+
+    def corpus_file(name):
+        with open(os.path.join(CORPUS, name), "rb") as f:
+            upload = io.BytesIO(f.read())
+        upload.name, upload.size, upload.file_id = name, len(upload.getvalue()), name
+        return upload
+
+    def file_uploader(label, type=None, accept_multiple_files=False, key=None, **kwargs):
+        if accept_multiple_files:
+            return [corpus_file(name) for name in MULTIPLE["pdf" if "pdf" in type else "image"]]
+        return corpus_file(FILES[key])
+
+    st.file_uploader = file_uploader
+
+    from PIL import Image
+    from tabs import pdf_overlay
+    from utils.uploads import spool_upload
+
+    if "overlay_stamps" not in st.session_state:
+        stamp = {{"upload": spool_upload(corpus_file("stamp.png"), "bench_stamp"), "background": False,
+                 "page_selection": "All pages", "page_range": None}}
+        st.session_state["overlay_stamps"] = [
+            dict(stamp, placement=(40, 700, 120, 50)), dict(stamp, placement=(400, 40, 150, 60)),
+        ]
+
+    if {scope!r} == "full":
+        runpy.run_path(os.path.join({repo!r}, "app.py"))
+    else:
+        pdf_upload = spool_upload(corpus_file("letterhead.pdf"), "pdf")
+        image_upload = spool_upload(corpus_file("stamp.png"), "image")
+        img = Image.open(image_upload.open())
+        pdf_overlay._render_stamp_designer(pdf_upload, lambda width, height: img,
+                                           pdf_overlay._document_geometry(pdf_upload), pdf_overlay._stamp_set(),
+                                           stamp_id=image_upload.sha256[:16], stamp_fields={{"upload": image_upload}})
+''')
+
+
+def _time_interactions(script_path, interactions):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(script_path, default_timeout=120).run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    timings = {"resize (apply form)": [], "preset button": []}
+    for i in range(interactions):
+        app.slider(key="width").set_value(150 + 10 * (i % 2))
+        next(button for button in app.button if button.label == "✔️ Apply").click()
+        start = time.perf_counter()
+        app.run()
+        timings["resize (apply form)"].append(time.perf_counter() - start)
+        preset = [button for button in app.button if (button.key or "").startswith("preset_")][i % 6]
+        preset.click()
+        start = time.perf_counter()
+        app.run()
+        timings["preset button"].append(time.perf_counter() - start)
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--scale", type=float, default=0.25, help="corpus size multiplier")
+    parser.add_argument("--interactions", type=int, default=10, help="interactions of each kind to time")
+    args = parser.parse_args()
+
+    paths = build_corpus(args.corpus_dir, args.scale)
+    corpus = os.path.dirname(paths["stamp.png"])
+    os.environ.setdefault("PDF_TOOLS_RESULT_CACHE_DIR", tempfile.mkdtemp(prefix="pdf_tools_bench_cache_"))
+
+    print(f"{'interaction':<22}{'rerun':<16}{'median ms':>10}{'p90 ms':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scope in ("full", "fragment"):
+            script_path = os.path.join(tmp, f"{scope}.py")
+            with open(script_path, "w") as f:
+                f.write(HARNESS.format(repo=REPO_ROOT, corpus=corpus, scope=scope))
+            for interaction, samples in _time_interactions(script_path, args.interactions).items():
+                samples = sorted(samples)
+                p90 = samples[min(len(samples) - 1, int(len(samples) * 0.9))]
+                print(f"{interaction:<22}{scope + ' rerun':<16}{statistics.median(samples) * 1000:>10.1f}"
+                      f"{p90 * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
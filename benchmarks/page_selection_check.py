@@ -0,0 +1,150 @@
+# benchmarks/page_selection_check.py
+"""Property check and timing for utils.page_selection.
+
+Generates random page selections (pages, closed and open ranges, keywords,
+malformed terms) for documents of up to 100k pages and checks the compiled
+PageSelection against a plain set-based reference implementation:
+membership of every page, iteration order, length, rank and intervals, and
+that both reject the same inputs. Prints compile and lookup times and exits
+non-zero on the first mismatch.
+
+    python benchmarks/page_selection_check.py
+    python benchmarks/page_selection_check.py --cases 2000 --pages 100000 --seed 7
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from utils.page_selection import PageSelectionError, compile_pages  # noqa: E402
+
+
+def reference_pages(text, num_pages, strict=False):
+    """The selection as a set of 0-based indices, the slow obvious way (None if invalid)."""
+    def number(token):
+        if token == "last":
+            return num_pages
+        if token == "first":
+            return 1
+        if not token.isdigit():
+            raise ValueError(token)
+        return int(token)
+
+    pages = set()
+    for term in text.lower().split(","):
+        term = term.strip()
+        if not term:
+            continue
+        if term in ("all", "odd", "even"):
+            pages.update(i for i in range(num_pages)
+                         if term == "all" or (i % 2 == 0) == (term == "odd"))
+            continue
+        try:
+            if "-" in term:
+                first, last = (part.strip() for part in term.split("-", 1))
+                if not first and not last or last == "first":
+                    return None
+                start = number(first) if first else 1
+                end = number(last) if last else num_pages
+                open_ended = last in ("", "last")
+            else:
+                start = end = number(term)
+                open_ended = False
+        except ValueError:
+            return None
+        if start < 1 or end < 1 or (strict and max(start, end) > num_pages):
+            return None
+        if start > end and not open_ended:
+            return None
+        pages.update(i for i in range(start - 1, end) if i < num_pages)
+    return pages
+
+
+def random_term(rng, num_pages):
+    page = lambda: str(rng.randint(1, num_pages + 5))  # noqa: E731 - sometimes past the end
+    kind = rng.random()
+    if kind < 0.3:
+        return page()
+    if kind < 0.6:
+        a, b = sorted((int(page()), int(page())))
+        return f"{a}-{b}" if rng.random() < 0.9 else f"{b} - {a}"
+    if kind < 0.7:
+        return f"{page()}-"
+    if kind < 0.8:
+        return f"-{page()}"
+    if kind < 0.85:
+        return f"{page()}-last"
+    if kind < 0.95:
+        return rng.choice(["first", "last", "odd", "even", "all", "ODD", " last "])
+    return rng.choice(["0", "x", "-", "1--2", "3-first", "2-1", "1.5", ""])
+
+
+def check(text, num_pages, strict, rng):
+    expected = reference_pages(text, num_pages, strict)
+    try:
+        selection = compile_pages(text, num_pages, strict)
+    except PageSelectionError:
+        if expected is not None:
+            return f"rejected, expected {len(expected)} page(s)"
+        return None
+    if expected is None:
+        return "accepted, expected an error"
+
+    ordered = sorted(expected)
+    if list(selection) != ordered:
+        return "iteration differs"
+    if len(selection) != len(expected):
+        return f"len {len(selection)} != {len(expected)}"
+    for i in range(-2, num_pages + 2):
+        if (i in selection) != (i in expected):
+            return f"membership of page {i} differs"
+    for i in rng.sample(range(num_pages + 1), min(50, num_pages + 1)):
+        if selection.rank(i) != sum(1 for page in ordered if page < i):
+            return f"rank({i}) differs"
+    if [i for start, stop in selection.intervals() for i in range(start, stop)] != ordered:
+        return "intervals differ"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=300)
+    parser.add_argument("--pages", type=int, default=100_000, help="largest document size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes = [1, 2, 7, 8, 9, 63, 1000, args.pages]
+    for case in range(args.cases):
+        num_pages = sizes[case % len(sizes)]
+        text = ", ".join(random_term(rng, num_pages) for _ in range(rng.randint(1, 6)))
+        strict = rng.random() < 0.3
+        error = check(text, num_pages, strict, rng)
+        if error:
+            print(f"FAIL: {text!r} on {num_pages} page(s){' (strict)' if strict else ''}: {error}")
+            sys.exit(1)
+    print(f"{args.cases} random selections match the reference implementation")
+
+    num_pages = args.pages
+    text = "1-3,7,10-20000,odd,40000-,-5"
+    start = time.perf_counter()
+    selection = compile_pages(text, num_pages)
+    compile_s = time.perf_counter() - start
+    start = time.perf_counter()
+    sum(i in selection for i in range(num_pages))
+    lookup_s = time.perf_counter() - start
+    # A sorted list, as the tabs used to hold, sampled every 100th page.
+    listed = sorted(reference_pages(text, num_pages))
+    start = time.perf_counter()
+    sum(i in listed for i in range(0, num_pages, 100))
+    list_s = (time.perf_counter() - start) * 100
+    print(f"{num_pages} pages, {text!r}: compile {compile_s * 1000:.2f} ms, "
+          f"{num_pages} lookups {lookup_s * 1000:.1f} ms (list lookups, extrapolated: {list_s:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# benchmarks/run_benchmarks.py
+"""Offline benchmark suite for every tab's core operation.
+
+Each operation runs in a fresh interpreter against the synthetic corpus from
+benchmarks/corpus.py, and reports wall time, peak RSS and output size.
+Results can be saved as a JSON baseline and later compared against it; the
+script exits non-zero when any metric regresses past its threshold.
+
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --scale 0.25 --only compress merge
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_ROOT)
+
+from corpus import build_corpus  # noqa: E402
+
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "pdf_tools_bench_corpus")
+
+# Allowed relative growth before a metric counts as a regression.
+DEFAULT_THRESHOLDS = {"wall_s": 0.20, "peak_rss_mb": 0.15, "output_bytes": 0.02}
+
+
+class _NamedBytesIO(io.BytesIO):
+    """Stand-in for Streamlit's UploadedFile: a BytesIO with a ``name``."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(path)
+        self.size = len(self.getvalue())
+
+
+def _size(output):
+    return len(output.getvalue()) if hasattr(output, "getvalue") else len(output)
+
+
+def _overlay_all_pages(paths, backend):
+    from PyPDF2 import PdfReader
+    from tabs.pdf_overlay import OVERLAY_BACKENDS, make_stamp
+
+    pdf_file = _NamedBytesIO(paths["text_many_pages.pdf"])
+    image_file = _NamedBytesIO(paths["stamp.png"])
+    num_pages = len(PdfReader(pdf_file).pages)
+    pdf_file.seek(0)
+    stamp = make_stamp(image_file, range(num_pages), False, 150, 60, 400, 80)
+    output = OVERLAY_BACKENDS[backend](pdf_file, [stamp], num_pages)
+    return _size(output)
+
+
+def op_overlay(paths):
+    return _overlay_all_pages(paths, "PyPDF2 + ReportLab")
+
+
+def op_overlay_pymupdf(paths):
+    return _overlay_all_pages(paths, "PyMuPDF")
+
+
+def _overlay_first_page(paths, incremental):
+    from PyPDF2 import PdfReader
+    from tabs.pdf_overlay import process_pdf, process_pdf_incremental
+
+    pdf_file = _NamedBytesIO(paths["text_many_pages.pdf"])
+    image_file = _NamedBytesIO(paths["stamp.png"])
+    if incremental:
+        output = process_pdf_incremental(pdf_file, image_file, [0], False, 150, 60, 400, 80)
+    else:
+        num_pages = len(PdfReader(pdf_file).pages)
+        pdf_file.seek(0)
+        output = process_pdf(pdf_file, image_file, [0], num_pages, False, 150, 60, 400, 80)
+    return _size(output)
+
+
+def op_overlay_first_page(paths):
+    """Stamp only page 1 of the long document, rewriting the whole file."""
+    return _overlay_first_page(paths, incremental=False)
+
+
+def op_overlay_incremental(paths):
+    """Stamp only page 1 of the long document as an incremental update."""
+    return _overlay_first_page(paths, incremental=True)
+
+
+def _page_numbers(paths, engine):
+    from PyPDF2 import PdfReader
+    from tabs.pdf_overlay import OVERLAY_BACKENDS, make_text_stamp, stamp_pdf_incremental
+
+    pdf_file = _NamedBytesIO(paths["text_many_pages.pdf"])
+    num_pages = len(PdfReader(pdf_file).pages)
+    pdf_file.seek(0)
+    stamps = [
+        make_text_stamp("Page {page} of {pages}", range(num_pages), 430, 20, 140, 24, border="#000000"),
+        make_text_stamp("{bates}", range(num_pages), 40, 20, 140, 24, align="left", bates_prefix="BENCH-"),
+    ]
+    if engine == "incremental":
+        output = stamp_pdf_incremental(pdf_file, stamps)
+    else:
+        output = OVERLAY_BACKENDS[engine](pdf_file, stamps, num_pages)
+    return _size(output)
+
+
+def op_page_numbers(paths):
+    """Page and Bates numbers on every page of the long document."""
+    return _page_numbers(paths, "PyPDF2 + ReportLab")
+
+
+def op_page_numbers_pymupdf(paths):
+    return _page_numbers(paths, "PyMuPDF")
+
+
+def op_page_numbers_incremental(paths):
+    return _page_numbers(paths, "incremental")
+
+
+def op_merge(paths):
+    from tabs.pdf_merger import merge_pdfs
+
+    files = [_NamedBytesIO(paths[name]) for name in ("text_many_pages.pdf", "scans.pdf", "letterhead.pdf")]
+    return _size(merge_pdfs(files, "As uploaded", True))
+
+
+def op_split(paths):
+    from PyPDF2 import PdfReader
+    from tabs.split_pdf_tab import split_pdf
+
+    reader = PdfReader(_NamedBytesIO(paths["text_many_pages.pdf"]))
+    total = len(reader.pages)
+    groups = [(f"pages_{start + 1}", list(range(start, min(start + 5, total)))) for start in range(0, total, 5)]
+    return _size(split_pdf(reader, groups, "bench"))
+
+
+def op_compress(paths):
+    from tabs.compress_pdf_tab import _compress_pdf
+
+    total = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("scans.pdf", "letterhead.pdf"):
+            output_path = os.path.join(tmp, name)
+            _compress_pdf(paths[name], output_path, quality=60, max_dim=1800, clean_structure=True)
+            total += os.path.getsize(output_path)
+    return total
+
+
+def op_convert(paths):
+    from reportlab.lib.pagesizes import A4
+    from tabs.image_to_pdf import create_combined_pdf
+
+    images = [_NamedBytesIO(paths[name]) for name in ("photo_1.jpg", "photo_2.jpg", "photo_3.jpg")]
+    margin = 10 * 2.83465
+    output = create_combined_pdf(images, A4, "Fit to page (maintain aspect ratio)",
+                                 A4[0] - 2 * margin, A4[1] - 2 * margin, margin)
+    return _size(output)
+
+
+OPERATIONS = {
+    "overlay": op_overlay,
+    "overlay_pymupdf": op_overlay_pymupdf,
+    "overlay_first_page": op_overlay_first_page,
+    "overlay_incremental": op_overlay_incremental,
+    "page_numbers": op_page_numbers,
+    "page_numbers_pymupdf": op_page_numbers_pymupdf,
+    "page_numbers_incremental": op_page_numbers_incremental,
+    "merge": op_merge,
+    "split": op_split,
+    "compress": op_compress,
+    "convert": op_convert,
+}
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process.
+
+    ru_maxrss survives exec() on Linux, so a child spawned by a large parent
+    would report the parent's peak; VmHWM belongs to the new address space.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_child(name, corpus_dir, scale):
+    """Run one operation in this (fresh) process and print its metrics as JSON."""
+    paths = build_corpus(corpus_dir, scale)
+    start = time.perf_counter()
+    output_bytes = OPERATIONS[name](paths)
+    wall = time.perf_counter() - start
+    print(json.dumps({
+        "wall_s": wall,
+        "peak_rss_mb": _peak_rss_mb(),
+        "output_bytes": output_bytes,
+    }))
+
+
+def _measure(name, corpus_dir, scale, repeat):
+    """Median metrics over ``repeat`` fresh-process runs of one operation."""
+    samples = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, __file__, "--child", name, "--corpus-dir", corpus_dir, "--scale", str(scale)],
+            cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        )
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def _compare(results, baseline, thresholds):
+    """Return a list of human-readable regressions against ``baseline``."""
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for key, limit in thresholds.items():
+            if base[key] and metrics[key] > base[key] * (1 + limit):
+                regressions.append(
+                    f"{name}.{key}: {metrics[key]:.4g} vs baseline {base[key]:.4g} "
+                    f"(+{(metrics[key] / base[key] - 1) * 100:.0f}%, limit +{limit * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--only", nargs="+", choices=sorted(OPERATIONS), help="operations to run")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for corpus page counts")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per operation (median is kept)")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH", help="baseline JSON to check for regressions")
+    parser.add_argument("--time-threshold", type=float, default=DEFAULT_THRESHOLDS["wall_s"])
+    parser.add_argument("--rss-threshold", type=float, default=DEFAULT_THRESHOLDS["peak_rss_mb"])
+    parser.add_argument("--size-threshold", type=float, default=DEFAULT_THRESHOLDS["output_bytes"])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _run_child(args.child, args.corpus_dir, args.scale)
+        return 0
+
+    build_corpus(args.corpus_dir, args.scale)
+
+    results = {}
+    print(f"{'operation':<26}{'wall s':>10}{'peak RSS MB':>14}{'output bytes':>16}")
+    for name in args.only or OPERATIONS:
+        metrics = _measure(name, args.corpus_dir, args.scale, args.repeat)
+        results[name] = metrics
+        print(f"{name:<26}{metrics['wall_s']:>10.3f}{metrics['peak_rss_mb']:>14.1f}{metrics['output_bytes']:>16,}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"scale": args.scale, "python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != args.scale:
+            print(f"FAIL: baseline was recorded at scale {baseline.get('scale')}, not {args.scale}")
+            return 1
+        thresholds = {
+            "wall_s": args.time_threshold,
+            "peak_rss_mb": args.rss_threshold,
+            "output_bytes": args.size_threshold,
+        }
+        regressions = _compare(results, baseline, thresholds)
+        for regression in regressions:
+            print(f"FAIL: {regression}")
+        if regressions:
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
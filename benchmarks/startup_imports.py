@@ -0,0 +1,102 @@
+# benchmarks/startup_imports.py
+"""Startup import benchmark for the tab modules.
+
+Runs ``python -X importtime`` in fresh interpreters, imports streamlit and
+then every tab module (what app.py does before the first byte is served),
+and prints where the time went. Exits non-zero if the tab modules take
+longer than the budget to import, or if any heavy dependency that should
+only load on first use is imported at startup.
+
+    python benchmarks/startup_imports.py
+    python benchmarks/startup_imports.py --budget-ms 80 --runs 7
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TAB_MODULES = [
+    "tabs.pdf_overlay",
+    "tabs.image_to_pdf",
+    "tabs.pdf_merger",
+    "tabs.split_pdf_tab",
+    "tabs.compress_pdf_tab",
+]
+
+# Must not be imported until a tab's operation actually needs them.
+LAZY_MODULES = [
+    "PyPDF2",
+    "reportlab",
+    "fitz",
+    "pikepdf",
+    "pandas",
+    "streamlit_drawable_canvas",
+]
+
+DEFAULT_BUDGET_MS = 100
+
+_SCRIPT = (
+    "import streamlit, sys\n"
+    + "".join(f"import {name}\n" for name in TAB_MODULES)
+    + f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))\n"
+)
+
+
+def _run_once():
+    """Return (per-module cumulative us, eagerly loaded lazy modules) for one run."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _SCRIPT],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum_us, name = line[len("import time:"):].split("|")
+        try:
+            cumulative[name.strip()] = int(cum_us)
+        except ValueError:
+            continue  # header line
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return cumulative, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="max median import time of all tab modules, after streamlit")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    runs = [_run_once() for _ in range(args.runs)]
+
+    print(f"{'module':<28}{'median ms':>10}")
+    totals = []
+    for name in ["streamlit"] + TAB_MODULES:
+        times = [cumulative.get(name, 0) / 1000 for cumulative, _ in runs]
+        print(f"{name:<28}{statistics.median(times):>10.1f}")
+    for cumulative, _ in runs:
+        totals.append(sum(cumulative.get(name, 0) for name in TAB_MODULES) / 1000)
+    total_ms = statistics.median(totals)
+    print(f"{'tab modules total':<28}{total_ms:>10.1f}  (budget {args.budget_ms:.0f} ms)")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"tab modules took {total_ms:.1f} ms to import (budget {args.budget_ms:.0f} ms)")
+    eager = sorted({name for _, loaded in runs for name in loaded})
+    if eager:
+        failures.append("imported at startup instead of on first use: " + ", ".join(eager))
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,17 +23,28 @@ Requires: pikepdf, Pillow
     pip install pikepdf Pillow
 """
 
+import importlib.util
 import io
 import os
+import tempfile
+from collections import OrderedDict
 
+import PIL
 import streamlit as st
 from PIL import Image
 
-try:
-    import pikepdf
-    from pikepdf import Name
-except ImportError:
-    pikepdf = None
+from utils.pdf_output import fast_web_view_checkbox, pdf_save_options, show_fast_web_view_check
+from utils.image_cache import get_image_cache, image_cache_key, image_source_hash
+from utils.instrumentation import span
+from utils.jobs import report_progress, render_job, submit_job
+from utils.metrics import track_operation
+from utils.result_cache import result_cache_key
+from utils.session_memory import session_memory
+from utils.uploads import spool_upload
+
+# pikepdf (and utils.pdf_structure, which needs it) is imported inside the
+# functions that use it, so loading this tab doesn't pay for it up front.
+PIKEPDF_AVAILABLE = importlib.util.find_spec("pikepdf") is not None
 
 
 QUALITY_PRESETS = {
@@ -43,13 +54,45 @@ QUALITY_PRESETS = {
 }
 
 
-def _compress_pdf(input_bytes: bytes, quality: int, max_dim: int) -> tuple[bytes, dict]:
-    """Recompress embedded images in a PDF. Returns (output_bytes, stats)."""
-    pdf = pikepdf.open(io.BytesIO(input_bytes))
+def _decode_image(xobj, max_dim: int) -> Image.Image:
+    """Decode an image XObject, using JPEG draft mode when it will be downsampled.
 
-    images_processed = 0
-    images_skipped = 0
+    For plain DCTDecode images larger than ``max_dim``, libjpeg can decode
+    directly at 1/2, 1/4 or 1/8 scale, which is far cheaper in time and memory
+    than a full decode followed by a resize. Anything else goes through
+    pikepdf's generic decoder.
+    """
+    import pikepdf
+    from pikepdf import Name
+
+    width, height = int(xobj.Width), int(xobj.Height)
+    if (
+        max(width, height) > max_dim
+        and xobj.get("/Filter") == Name("/DCTDecode")
+        and "/Decode" not in xobj
+        and xobj.get("/ColorSpace") in (Name("/DeviceRGB"), Name("/DeviceGray"))
+    ):
+        pil_image = Image.open(io.BytesIO(xobj.read_raw_bytes()))
+        scale = max_dim / max(width, height)
+        # draft() only picks a scale whose result is still >= the requested size,
+        # so the final resize below is always a (small) downscale.
+        pil_image.draft(pil_image.mode, (max(1, int(width * scale)), max(1, int(height * scale))))
+        pil_image.load()
+        return pil_image
+
+    return pikepdf.PdfImage(xobj).as_pil_image()
+
+
+def _iter_image_xobjects(pdf):
+    """Yield each recompressible image XObject in the document once.
+
+    Images shared between pages (letterheads, logos) are only yielded the first
+    time they are seen, and tiny images (icons, bullets) are skipped since they
+    are not worth recompressing.
+    """
+    from pikepdf import Name
 
+    seen = set()
     for page in pdf.pages:
         if "/Resources" not in page or "/XObject" not in page.Resources:
             continue
@@ -59,70 +102,327 @@ def _compress_pdf(input_bytes: bytes, quality: int, max_dim: int) -> tuple[bytes
             xobj = xobjects[name]
             if xobj.get("/Subtype") != Name("/Image"):
                 continue
+            if xobj.is_indirect:
+                if xobj.objgen in seen:
+                    continue
+                seen.add(xobj.objgen)
 
-            # Skip tiny images (icons, bullets) - not worth recompressing
             try:
                 if int(xobj.Width) < 50 or int(xobj.Height) < 50:
                     continue
             except Exception:
                 pass
 
-            try:
-                pdf_image = pikepdf.PdfImage(xobj)
-                pil_image = pdf_image.as_pil_image()
-            except Exception:
+            yield xobj
+
+
+def _prepare_image(pil_image: Image.Image, max_dim: int) -> Image.Image:
+    """Downsample to ``max_dim`` on the longest side and drop alpha/palette modes."""
+    w, h = pil_image.size
+    if max(w, h) > max_dim:
+        scale = max_dim / max(w, h)
+        pil_image = pil_image.resize(
+            (max(1, int(w * scale)), max(1, int(h * scale))), Image.LANCZOS
+        )
+
+    if pil_image.mode in ("RGBA", "P", "LA"):
+        pil_image = pil_image.convert("RGB")
+    return pil_image
+
+
+def _encode_jpeg(pil_image: Image.Image, quality: int) -> bytes:
+    buf = io.BytesIO()
+    pil_image.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+# Part of every image cache key: output changes if the encoder does.
+JPEG_ENCODER = f"pillow-{PIL.__version__}-jpeg-optimize"
+
+
+def _recompress(source_hash, quality: int, max_dim: int, decode, cache=None, pipeline="draft"):
+    """Encode an image at (quality, max_dim), reusing a cached result if any.
+
+    ``decode`` is only called on a cache miss. ``pipeline`` names how
+    ``decode`` produces its pixels ("draft": decoded for ``max_dim``;
+    "from-<dim>": decoded at <dim>, then resized), since the same settings
+    give different pixels through each and must not share cache entries.
+    Returns (new_bytes, size, from_cache).
+    """
+    key = None
+    if cache is not None:
+        key = image_cache_key(source_hash, quality, max_dim, f"{JPEG_ENCODER}-{pipeline}")
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0], cached[1], True
+
+    with span("decode"):
+        pil_image = _prepare_image(decode(), max_dim)
+    with span("encode"):
+        new_bytes = _encode_jpeg(pil_image, quality)
+    if cache is not None:
+        cache.put(key, new_bytes, pil_image.size)
+    return new_bytes, pil_image.size, False
+
+
+def _replace_image(xobj, new_bytes: bytes, size: tuple[int, int]) -> None:
+    """Swap an image XObject's stream for a baseline RGB JPEG of ``size``."""
+    from pikepdf import Name
+
+    xobj.write(new_bytes, filter=Name("/DCTDecode"))
+    xobj.ColorSpace = Name("/DeviceRGB")
+    xobj.BitsPerComponent = 8
+    xobj.Width, xobj.Height = size
+    if "/SMask" in xobj:
+        del xobj["/SMask"]
+    if "/Decode" in xobj:
+        del xobj["/Decode"]
+
+
+def _open_pdf(input_path: str):
+    """Open a PDF from disk, memory-mapping it instead of reading it into RAM."""
+    import pikepdf
+
+    return pikepdf.open(input_path, access_mode=pikepdf.AccessMode.mmap)
+
+
+def _open_and_optimize(input_path: str, clean_structure: bool, strip_metadata: bool):
+    """Open the PDF and, with ``clean_structure``, run the structural pass on it.
+
+    Returns (pdf, structure savings, whether the pass failed). A PDF the
+    pass chokes on is reopened untouched, since the pass edits in place.
+    """
+    from utils.pdf_structure import optimize_structure
+
+    with span("open"):
+        pdf = _open_pdf(input_path)
+    if not clean_structure:
+        return pdf, {}, False
+    with span("structure"):
+        try:
+            return pdf, optimize_structure(pdf, strip_metadata), False
+        except Exception:
+            pdf.close()
+    with span("open"):
+        return _open_pdf(input_path), {}, True
+
+
+def _save_pdf(pdf, output_path: str, linearize: bool = False) -> int:
+    """Write ``pdf`` straight to ``output_path`` and return the file size."""
+    pdf.save(output_path, **pdf_save_options(linearize))
+    return os.path.getsize(output_path)
+
+
+def _compress_pdf(
+    input_path: str,
+    output_path: str,
+    quality: int,
+    max_dim: int,
+    linearize: bool = False,
+    clean_structure: bool = False,
+    strip_metadata: bool = False,
+    cache=None,
+) -> dict:
+    """Recompress embedded images in the PDF at ``input_path``.
+
+    With ``clean_structure``, the lossless structural pass from
+    utils.pdf_structure runs first; if it fails, the images are compressed
+    without it. Pass an ImageCache as ``cache`` to reuse encodes across
+    documents. The result is written to ``output_path``; returns a stats
+    dict.
+    """
+    pdf, structure, structure_failed = _open_and_optimize(input_path, clean_structure, strip_metadata)
+
+    images_processed = 0
+    images_skipped = 0
+    images_from_cache = 0
+
+    xobjects = list(_iter_image_xobjects(pdf))
+    for idx, xobj in enumerate(xobjects):
+        report_progress(idx, len(xobjects), "image")
+        try:
+            raw_bytes = xobj.read_raw_bytes()
+            source_hash = image_source_hash(xobj, raw_bytes) if cache is not None else None
+            new_bytes, size, from_cache = _recompress(
+                source_hash, quality, max_dim, lambda: _decode_image(xobj, max_dim), cache
+            )
+            images_from_cache += from_cache
+
+            # Only replace if it's actually smaller than the original stream
+            if len(new_bytes) < len(raw_bytes):
+                _replace_image(xobj, new_bytes, size)
+                images_processed += 1
+            else:
                 images_skipped += 1
+        except Exception:
+            images_skipped += 1
+
+    with span("save"):
+        _save_pdf(pdf, output_path, linearize)
+    pdf.close()
+
+    stats = {
+        "images_processed": images_processed,
+        "images_skipped": images_skipped,
+        "images_from_cache": images_from_cache,
+        "structure": structure,
+        "structure_failed": structure_failed,
+    }
+    return stats
+
+
+# Decoded images the target-size search keeps between quality steps.
+DECODED_IMAGES_BUDGET = 64 * 1024 * 1024
+
+# Quality / max-dimension steps tried by the target-size search, gentlest first.
+TARGET_SIZE_STEPS = [
+    (80, 2500),
+    (70, 2200),
+    (60, 1800),
+    (50, 1500),
+    (40, 1200),
+    (30, 1000),
+    (25, 800),
+    (20, 600),
+]
+
+
+def _detached_copy(pdf, xobj):
+    """An unreferenced copy of an image XObject, to decode the original from once it's replaced.
+
+    It holds the compressed stream only; not being referenced, it isn't saved.
+    """
+    import pikepdf
+
+    copy = pikepdf.Stream(pdf, b"")
+    for key, value in xobj.stream_dict.items():
+        if key not in ("/Length", "/Filter", "/DecodeParms"):
+            copy[key] = value
+    copy.write(xobj.read_raw_bytes(), filter=xobj.get("/Filter"), decode_parms=xobj.get("/DecodeParms"))
+    return copy
+
+
+def _image_bytes(pil_image: Image.Image) -> int:
+    return pil_image.width * pil_image.height * len(pil_image.getbands())
+
+
+def _compress_pdf_to_target(
+    input_path: str,
+    output_path: str,
+    target_size: int,
+    linearize: bool = False,
+    clean_structure: bool = False,
+    strip_metadata: bool = False,
+    cache=None,
+) -> dict:
+    """Recompress images until the PDF fits in ``target_size`` bytes.
+
+    Images are visited largest stream first and stepped down through
+    ``TARGET_SIZE_STEPS`` one level at a time, so big scans give up quality
+    before small logos do. Images are decoded at the first step's dimension
+    and kept for the later trial encodes within ``DECODED_IMAGES_BUDGET``
+    (least recently used go first, and are decoded again if needed); an
+    image that fails to decode or encode is counted as skipped once and
+    left as it is. The output size is
+    projected from the per-image byte savings, and the document is only
+    saved to ``output_path`` to confirm once the projection fits. Returns a
+    stats dict; ``stats["target_met"]`` is False if even the last step was
+    not enough. Trial encodes go through ``cache`` when one is given, so a
+    cached step never needs the image decoded at all.
+    """
+    pdf, structure, structure_failed = _open_and_optimize(input_path, clean_structure, strip_metadata)
+
+    candidates = []
+    for xobj in _iter_image_xobjects(pdf):
+        raw_bytes = xobj.read_raw_bytes()
+        source_hash = image_source_hash(xobj, raw_bytes) if cache is not None else None
+        # xobj, current bytes, step, hash of the original stream, copy of the original once replaced
+        candidates.append([xobj, len(raw_bytes), None, source_hash, None])
+    candidates.sort(key=lambda c: c[1], reverse=True)
+
+    # Decoded images reused by later steps, least recently used first, within a
+    # byte budget; an image that doesn't fit is decoded again when needed.
+    decoded = OrderedDict()
+    decoded_bytes = 0
+    failed = set()  # candidates that couldn't be decoded or encoded; left as they are
+    pipeline = f"from-{TARGET_SIZE_STEPS[0][1]}"
+    images_skipped = 0
+    images_from_cache = 0
+    projected = os.path.getsize(input_path) - sum(structure.values())
+    output_size = None
+
+    for step, (quality, max_dim) in enumerate(TARGET_SIZE_STEPS):
+        for idx, candidate in enumerate(candidates):
+            if projected <= target_size:
+                break
+            report_progress(step, len(TARGET_SIZE_STEPS), "quality step")
+            xobj, current_len, _, source_hash, original = candidate
+            if idx in failed:
                 continue
 
-            try:
-                w, h = pil_image.size
-                if max(w, h) > max_dim:
-                    scale = max_dim / max(w, h)
-                    pil_image = pil_image.resize(
-                        (max(1, int(w * scale)), max(1, int(h * scale))), Image.LANCZOS
-                    )
+            def decode():
+                nonlocal decoded_bytes
+                if idx in decoded:
+                    decoded.move_to_end(idx)
+                    return decoded[idx]
+                source = xobj if original is None else original
+                image = _prepare_image(_decode_image(source, TARGET_SIZE_STEPS[0][1]), TARGET_SIZE_STEPS[0][1])
+                size = _image_bytes(image)
+                while decoded and decoded_bytes + size > DECODED_IMAGES_BUDGET:
+                    decoded_bytes -= _image_bytes(decoded.popitem(last=False)[1])
+                if size <= DECODED_IMAGES_BUDGET:
+                    decoded[idx] = image
+                    decoded_bytes += size
+                return image
 
-                if pil_image.mode in ("RGBA", "P", "LA"):
-                    pil_image = pil_image.convert("RGB")
-
-                buf = io.BytesIO()
-                pil_image.save(buf, format="JPEG", quality=quality, optimize=True)
-                buf.seek(0)
-                new_bytes = buf.read()
-
-                # Only replace if it's actually smaller than the original stream
-                if len(new_bytes) < len(xobj.read_bytes()):
-                    xobj.write(new_bytes, filter=Name("/DCTDecode"))
-                    xobj.ColorSpace = Name("/DeviceRGB")
-                    xobj.BitsPerComponent = 8
-                    xobj.Width = pil_image.width
-                    xobj.Height = pil_image.height
-                    if "/SMask" in xobj:
-                        del xobj["/SMask"]
-                    if "/Decode" in xobj:
-                        del xobj["/Decode"]
-                    images_processed += 1
-                else:
-                    images_skipped += 1
+            try:
+                new_bytes, size, from_cache = _recompress(source_hash, quality, max_dim, decode, cache, pipeline)
             except Exception:
+                failed.add(idx)
                 images_skipped += 1
+                if idx in decoded:
+                    decoded_bytes -= _image_bytes(decoded.pop(idx))
                 continue
-
-    out_buf = io.BytesIO()
-    pdf.save(
-        out_buf,
-        compress_streams=True,
-        object_stream_mode=pikepdf.ObjectStreamMode.generate,
-        linearize=False,
-    )
+            images_from_cache += from_cache
+
+            if len(new_bytes) < current_len:
+                if original is None:
+                    candidate[4] = _detached_copy(pdf, xobj)
+                _replace_image(xobj, new_bytes, size)
+                projected -= current_len - len(new_bytes)
+                candidate[1] = len(new_bytes)
+                candidate[2] = step
+
+        if projected <= target_size:
+            # The projection ignores container overhead, so confirm with a real save.
+            with span("save"):
+                output_size = _save_pdf(pdf, output_path, linearize)
+            if output_size <= target_size:
+                break
+            projected = output_size
+            output_size = None
+
+    if output_size is None:
+        with span("save"):
+            output_size = _save_pdf(pdf, output_path, linearize)
     pdf.close()
-    out_buf.seek(0)
 
+    replaced = [c for c in candidates if c[2] is not None]
     stats = {
-        "images_processed": images_processed,
+        "images_processed": len(replaced),
         "images_skipped": images_skipped,
+        "images_from_cache": images_from_cache,
+        "target_met": output_size <= target_size,
+        "final_quality": min((TARGET_SIZE_STEPS[c[2]][0] for c in replaced), default=None),
+        "structure": structure,
+        "structure_failed": structure_failed,
     }
-    return out_buf.read(), stats
+    return stats
+
+
+def _remove_if_exists(path: str) -> None:
+    if os.path.exists(path):
+        os.unlink(path)
 
 
 def _format_size(num_bytes: int) -> str:
@@ -140,7 +440,7 @@ def render():
         "Best for PDFs made of scanned pages or high-resolution photos."
     )
 
-    if pikepdf is None:
+    if not PIKEPDF_AVAILABLE:
         st.error(
             "The `pikepdf` package is required for this tab. "
             "Add `pikepdf` to requirements.txt and reinstall dependencies."
@@ -153,55 +453,192 @@ def render():
         st.info("Upload a PDF to get started.")
         return
 
-    input_bytes = uploaded_pdf.getvalue()
-    original_size = len(input_bytes)
-    st.success(f"Loaded **{uploaded_pdf.name}** — {_format_size(original_size)}")
+    upload = spool_upload(uploaded_pdf, "compress_pdf_uploader")
+    original_size = upload.size
+    st.success(f"Loaded **{upload.name}** — {_format_size(original_size)}")
 
-    preset_name = st.radio(
-        "Compression level",
-        list(QUALITY_PRESETS.keys()),
-        index=1,
+    mode = st.radio(
+        "Compression mode",
+        ["Quality preset", "Target file size"],
         horizontal=True,
+        key="compress_mode",
     )
 
-    with st.expander("Advanced settings"):
-        preset = QUALITY_PRESETS[preset_name]
-        quality = st.slider("JPEG quality", min_value=10, max_value=95, value=preset["quality"])
-        max_dim = st.slider(
-            "Max image dimension (px)",
-            min_value=500,
-            max_value=4000,
-            value=preset["max_dim"],
-            step=100,
-            help="Images larger than this on their longest side will be downsampled.",
+    if mode == "Quality preset":
+        preset_name = st.radio(
+            "Compression level",
+            list(QUALITY_PRESETS.keys()),
+            index=1,
+            horizontal=True,
         )
 
-    if st.button("Compress PDF", type="primary"):
-        with st.spinner("Compressing... this can take a moment for large files."):
-            try:
-                output_bytes, stats = _compress_pdf(input_bytes, quality=quality, max_dim=max_dim)
-            except Exception as e:
-                st.error(f"Compression failed: {e}")
-                return
-
-        new_size = len(output_bytes)
-        saved_pct = max(0, (1 - new_size / original_size) * 100) if original_size else 0
-
-        col1, col2, col3 = st.columns(3)
-        col1.metric("Original size", _format_size(original_size))
-        col2.metric("Compressed size", _format_size(new_size), delta=f"-{saved_pct:.0f}%")
-        col3.metric("Images optimized", stats["images_processed"])
-
-        if new_size >= original_size:
-            st.warning(
-                "Compressed file isn't smaller — this PDF likely has little "
-                "recompressible image data (e.g. mostly text/vector content)."
+        with st.expander("Advanced settings"):
+            preset = QUALITY_PRESETS[preset_name]
+            quality = st.slider("JPEG quality", min_value=10, max_value=95, value=preset["quality"])
+            max_dim = st.slider(
+                "Max image dimension (px)",
+                min_value=500,
+                max_value=4000,
+                value=preset["max_dim"],
+                step=100,
+                help="Images larger than this on their longest side will be downsampled.",
             )
+    else:
+        target_mb = st.number_input(
+            "Make it under (MB)",
+            min_value=0.1,
+            value=max(0.1, round(original_size / (1024 * 1024) / 2, 1)),
+            step=0.5,
+            help="Images are recompressed step by step, largest first, until the file fits.",
+        )
+        target_size = int(target_mb * 1024 * 1024)
+
+    clean_structure = st.checkbox(
+        "🧹 Optimize structure (duplicate fonts and ICC profiles, thumbnails)",
+        value=True,
+        key="compress_clean_structure",
+        help="Lossless clean-up that also helps text and vector PDFs with few images.",
+    )
+    strip_metadata = st.checkbox(
+        "Remove XMP metadata",
+        value=False,
+        key="compress_strip_metadata",
+        disabled=not clean_structure,
+        help="Drops the document-level XMP packet. Leave off for PDF/A archives.",
+    )
+    fast_web_view = fast_web_view_checkbox(key="compress_fast_web_view")
+
+    if st.button("Compress PDF", type="primary"):
+        settings = {
+            "mode": mode,
+            "target_size": target_size if mode == "Target file size" else None,
+            "clean_structure": clean_structure,
+            "fast_web_view": fast_web_view,
+            "base_name": upload.name.rsplit(".", 1)[0],
+            "original_size": original_size,
+        }
+        cache_key = result_cache_key("compress", [upload.sha256], {
+            "mode": mode,
+            "quality": quality if mode == "Quality preset" else None,
+            "max_dim": max_dim if mode == "Quality preset" else None,
+            "target_size": settings["target_size"],
+            "clean_structure": clean_structure,
+            "strip_metadata": clean_structure and strip_metadata,
+            "fast_web_view": fast_web_view,
+            "encoder": JPEG_ENCODER,
+        })
+        fd, output_path = tempfile.mkstemp(suffix="_compressed.pdf")
+        os.close(fd)
+        # Work file-to-file so a large PDF is never held in memory several
+        # times over: pikepdf memory-maps the spooled upload and the result is
+        # written straight to a second temp file. The job holds on to the
+        # upload, which deletes its file once nothing needs it.
+        with span("spool_upload"):
+            upload.ensure_path()
+
+        def compress():
+            input_path = upload.path
+            with track_operation("compress", bytes_in=original_size) as op, span("compress"):
+                if mode == "Quality preset":
+                    stats = _compress_pdf(
+                        input_path, output_path, quality=quality, max_dim=max_dim,
+                        linearize=fast_web_view, clean_structure=clean_structure,
+                        strip_metadata=strip_metadata, cache=get_image_cache(),
+                    )
+                else:
+                    stats = _compress_pdf_to_target(
+                        input_path, output_path, target_size, linearize=fast_web_view,
+                        clean_structure=clean_structure, strip_metadata=strip_metadata,
+                        cache=get_image_cache(),
+                    )
+                op.bytes_out = os.path.getsize(output_path)
+            return {"stats": stats, "output_path": output_path, "new_size": op.bytes_out}
+
+        # The output file lives as long as the job's result is shown; on a
+        # cache hit the stored copy is written to the same path.
+        submit_job(
+            "compress", "compress", compress, bytes_in=original_size,
+            cleanup=lambda: _remove_if_exists(output_path),
+            cache_key=cache_key, cache_files={"output_path": output_path}, meta=settings,
+        )
+
+    job = render_job(
+        "compress",
+        label="Compressing — this can take a moment for large files",
+        error_message="Compression failed",
+    )
+    if job is not None:
+        _show_compress_result(dict(job.meta, **job.result))
+
+
+def _prepare_download(output_path):
+    with open(output_path, "rb") as output_file:
+        data = output_file.read()
+    session_memory().put("compress_download", (output_path, data), len(data), "download")
+
+
+def _show_compress_result(result):
+    stats = result["stats"]
+    original_size = result["original_size"]
+    new_size = result["new_size"]
+    target_size = result["target_size"]
+    saved_pct = max(0, (1 - new_size / original_size) * 100) if original_size else 0
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Original size", _format_size(original_size))
+    col2.metric("Compressed size", _format_size(new_size), delta=f"-{saved_pct:.0f}%")
+    col3.metric("Images optimized", stats["images_processed"])
+
+    cache_metrics = get_image_cache().metrics()
+    st.caption(
+        f"♻️ {stats['images_from_cache']} image(s) reused from the shared cache · "
+        f"server hit rate {cache_metrics['hit_rate']:.0%} "
+        f"({cache_metrics['hits']}/{cache_metrics['hits'] + cache_metrics['misses']} lookups, "
+        f"{_format_size(cache_metrics['bytes'])} cached)"
+    )
 
-        base_name = uploaded_pdf.name.rsplit(".", 1)[0]
-        st.download_button(
-            label="⬇️ Download compressed PDF",
-            data=output_bytes,
-            file_name=f"{base_name}_compressed.pdf",
-            mime="application/pdf",
+    if stats.get("structure_failed"):
+        st.warning("Structure optimization failed on this PDF, so it was compressed without it.")
+    if stats["structure"]:
+        from utils.pdf_structure import SAVE_STEP_CATEGORIES, STRUCTURE_CATEGORIES
+
+        categories = {**STRUCTURE_CATEGORIES, **SAVE_STEP_CATEGORIES}
+        st.markdown("**Structural savings**")
+        st.table({
+            "Category": list(categories.values()),
+            "Saved": [_format_size(stats["structure"][key]) for key in categories],
+            "Removed by": ["structure optimization"] * len(STRUCTURE_CATEGORIES)
+                          + ["saving (always)"] * len(SAVE_STEP_CATEGORIES),
+        })
+
+    if result["mode"] == "Target file size" and not stats["target_met"]:
+        st.warning(
+            f"Couldn't get below {_format_size(target_size)} even at the lowest "
+            "quality step — the remaining size is likely text, fonts or vector content."
         )
+    elif new_size >= original_size:
+        st.warning(
+            "Compressed file isn't smaller — this PDF likely has little "
+            "recompressible image data (e.g. mostly text/vector content)"
+            + ("." if result["clean_structure"] else "; try enabling structure optimization.")
+        )
+
+    if result["fast_web_view"]:
+        with open(result["output_path"], "rb") as output_file:
+            show_fast_web_view_check(output_file.read(4096))
+
+    # The output is read into memory once, when asked for, and then held in
+    # session memory for the download button; reruns don't read it again.
+    prepared = session_memory().get("compress_download")
+    if prepared is None or prepared[0] != result["output_path"]:
+        st.button(
+            "📦 Prepare download", key="compress_prepare_download",
+            on_click=_prepare_download, args=(result["output_path"],),
+        )
+        return
+    st.download_button(
+        label="⬇️ Download compressed PDF",
+        data=prepared[1],
+        file_name=f"{result['base_name']}_compressed.pdf",
+        mime="application/pdf",
+    )
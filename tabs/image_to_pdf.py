@@ -1,12 +1,18 @@
 # tabs/image_to_pdf.py
 import streamlit as st
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
+from contextlib import ExitStack
 from io import BytesIO
 from PIL import Image
 import tempfile
 import os
 
+from utils.image_probe import preview_image, probe_image
+from utils.instrumentation import span
+from utils.jobs import render_job, report_progress, submit_job
+from utils.metrics import track_operation
+from utils.result_cache import result_cache_key
+from utils.uploads import spool_uploads
+
 def render():
     """Render the Image to PDF Converter tab"""
     st.markdown("Convert your images to A4-sized PDF documents")
@@ -20,15 +26,20 @@ def render():
     )
     
     if uploaded_images:
+        uploads = spool_uploads(uploaded_images, "converter_images")
         st.success(f"✅ {len(uploaded_images)} image(s) uploaded successfully!")
         
-        # Show image previews
+        # Show image previews: sizes from the headers, pixels from a cached
+        # thumbnail, so a rerun doesn't decode the (possibly 40 MP) originals.
         st.subheader("📸 Image Preview")
         cols = st.columns(min(4, len(uploaded_images)))
-        for idx, img_file in enumerate(uploaded_images[:4]):
-            with cols[idx % 4]:
-                img = Image.open(img_file)
-                st.image(img, caption=img_file.name, use_container_width=True)
+        for idx, upload in enumerate(uploads[:4]):
+            with cols[idx % 4], span("preview"):
+                info = probe_image(upload)
+                st.image(preview_image(upload), caption=f"{upload.name} ({info['width']}×{info['height']})",
+                         use_container_width=True)
+                if info["orientation"] != 1:
+                    st.caption("↻ Has an EXIF rotation, which isn't applied: the page shows the image as stored")
         
         if len(uploaded_images) > 4:
             st.info(f"... and {len(uploaded_images) - 4} more image(s)")
@@ -72,40 +83,75 @@ def render():
         
         # Convert button
         if st.button("🔄 Convert to PDF", type="primary", use_container_width=True, key="convert_btn"):
-            with st.spinner("Converting images to PDF..."):
-                try:
-                    # Set page size based on orientation
-                    if orientation == "Portrait":
-                        page_size = A4
-                    else:
-                        page_size = (A4[1], A4[0])
-                    
-                    page_width, page_height = page_size
-                    margin_points = margin * 2.83465  # mm to points
-                    
-                    available_width = page_width - (2 * margin_points)
-                    available_height = page_height - (2 * margin_points)
-                    
-                    if combine_mode == "One PDF with all images":
-                        output = create_combined_pdf(uploaded_images, page_size, fit_mode, 
+            from reportlab.lib.pagesizes import A4
+
+            # Set page size based on orientation
+            if orientation == "Portrait":
+                page_size = A4
+            else:
+                page_size = (A4[1], A4[0])
+            
+            page_width, page_height = page_size
+            margin_points = margin * 2.83465  # mm to points
+            
+            available_width = page_width - (2 * margin_points)
+            available_height = page_height - (2 * margin_points)
+            
+            bytes_in = sum(upload.size for upload in uploads)
+            separate = combine_mode != "One PDF with all images"
+            # Image names only matter when they name the separate output files.
+            cache_key = result_cache_key(
+                "convert",
+                [[upload.sha256, upload.name if separate else None] for upload in uploads],
+                {
+                    "page_size": [round(value, 2) for value in page_size],
+                    "fit_mode": fit_mode,
+                    "margin": round(margin_points, 2),
+                    "separate": separate,
+                },
+            )
+
+            def convert():
+                with track_operation("convert", bytes_in=bytes_in) as op, ExitStack() as stack:
+                    job_images = [stack.enter_context(upload.open()) for upload in uploads]
+                    if not separate:
+                        output = create_combined_pdf(job_images, page_size, fit_mode,
                                                     available_width, available_height, margin_points)
-                        
-                        st.success("✅ PDF created successfully!")
+                        op.bytes_out = output.getbuffer().nbytes
+                        return {"combined": output}
+                    outputs = create_separate_pdfs(job_images, page_size, fit_mode,
+                                                   available_width, available_height, margin_points)
+                    op.bytes_out = sum(packet.getbuffer().nbytes for _, packet in outputs)
+                    return {"separate": outputs}
+
+            submit_job("image_to_pdf", "convert", convert, bytes_in=bytes_in, cache_key=cache_key)
+
+        job = render_job("image_to_pdf", label="Converting images to PDF",
+                         error_message="❌ Error converting images")
+        if job is not None:
+            if "combined" in job.result:
+                st.success("✅ PDF created successfully!")
+                st.download_button(
+                    label="⬇️ Download PDF",
+                    data=job.result["combined"],
+                    file_name="converted_images.pdf",
+                    mime="application/pdf",
+                    type="primary",
+                    use_container_width=True
+                )
+            else:
+                outputs = job.result["separate"]
+                st.success(f"✅ {len(outputs)} PDF(s) created successfully!")
+                cols = st.columns(2)
+                for idx, (file_name, packet) in enumerate(outputs):
+                    with cols[idx % 2]:
                         st.download_button(
-                            label="⬇️ Download PDF",
-                            data=output,
-                            file_name="converted_images.pdf",
+                            label=f"⬇️ {file_name}",
+                            data=packet,
+                            file_name=file_name,
                             mime="application/pdf",
-                            type="primary",
-                            use_container_width=True
+                            key=f"download_{idx}"
                         )
-                    else:
-                        create_separate_pdfs(uploaded_images, page_size, fit_mode,
-                                           available_width, available_height, margin_points)
-                
-                except Exception as e:
-                    st.error(f"❌ Error converting images: {str(e)}")
-                    st.exception(e)
     
     else:
         st.info("👆 Please upload one or more images to convert to PDF")
@@ -113,42 +159,51 @@ def render():
 
 def create_combined_pdf(uploaded_images, page_size, fit_mode, available_width, available_height, margin_points):
     """Create a single PDF with all images"""
+    from reportlab.pdfgen import canvas
+
     packet = BytesIO()
     can = canvas.Canvas(packet, pagesize=page_size)
     
-    for img_file in uploaded_images:
+    for idx, img_file in enumerate(uploaded_images):
+        report_progress(idx, len(uploaded_images), "image")
         img_file.seek(0)
-        img = Image.open(img_file)
-        img = convert_to_rgb(img)
+        with span("decode"):
+            img = Image.open(img_file)
+            img = convert_to_rgb(img)
         
         x_pos, y_pos, new_width, new_height = calculate_image_dimensions(
             img, fit_mode, available_width, available_height, margin_points
         )
         
         # Save and draw image
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_img:
-            img.save(tmp_img.name, 'JPEG', quality=95)
-            tmp_img_path = tmp_img.name
+        with span("encode"):
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_img:
+                img.save(tmp_img.name, 'JPEG', quality=95)
+                tmp_img_path = tmp_img.name
         
-        can.drawImage(tmp_img_path, x_pos, y_pos, width=new_width, height=new_height)
-        can.showPage()
+        with span("draw"):
+            can.drawImage(tmp_img_path, x_pos, y_pos, width=new_width, height=new_height)
+            can.showPage()
         
         os.unlink(tmp_img_path)
     
-    can.save()
+    with span("write"):
+        can.save()
     packet.seek(0)
     return packet
 
 
 def create_separate_pdfs(uploaded_images, page_size, fit_mode, available_width, available_height, margin_points):
-    """Create separate PDF for each image"""
-    st.success(f"✅ {len(uploaded_images)} PDF(s) created successfully!")
-    
-    cols = st.columns(2)
+    """Create separate PDF for each image; returns a list of (file_name, BytesIO)"""
+    from reportlab.pdfgen import canvas
+
+    outputs = []
     for idx, img_file in enumerate(uploaded_images):
+        report_progress(idx, len(uploaded_images), "image")
         img_file.seek(0)
-        img = Image.open(img_file)
-        img = convert_to_rgb(img)
+        with span("decode"):
+            img = Image.open(img_file)
+            img = convert_to_rgb(img)
         
         packet = BytesIO()
         can = canvas.Canvas(packet, pagesize=page_size)
@@ -158,26 +213,21 @@ def create_separate_pdfs(uploaded_images, page_size, fit_mode, available_width,
         )
         
         # Save and draw image
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_img:
-            img.save(tmp_img.name, 'JPEG', quality=95)
-            tmp_img_path = tmp_img.name
+        with span("encode"):
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as tmp_img:
+                img.save(tmp_img.name, 'JPEG', quality=95)
+                tmp_img_path = tmp_img.name
         
-        can.drawImage(tmp_img_path, x_pos, y_pos, width=new_width, height=new_height)
-        can.save()
+        with span("draw"):
+            can.drawImage(tmp_img_path, x_pos, y_pos, width=new_width, height=new_height)
+            can.save()
         packet.seek(0)
         
         os.unlink(tmp_img_path)
         
-        # Add download button
-        with cols[idx % 2]:
-            original_name = os.path.splitext(img_file.name)[0]
-            st.download_button(
-                label=f"⬇️ {img_file.name}",
-                data=packet,
-                file_name=f"{original_name}.pdf",
-                mime="application/pdf",
-                key=f"download_{idx}"
-            )
+        original_name = os.path.splitext(img_file.name)[0]
+        outputs.append((f"{original_name}.pdf", packet))
+    return outputs
 
 
 def convert_to_rgb(img):
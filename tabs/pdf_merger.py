@@ -1,8 +1,13 @@
 # tabs/pdf_merger.py
 import streamlit as st
-from PyPDF2 import PdfReader, PdfWriter
-from io import BytesIO
-import pandas as pd
+from contextlib import ExitStack
+
+from utils.instrumentation import span
+from utils.jobs import render_job, report_progress, submit_job
+from utils.metrics import track_operation
+from utils.pdf_output import fast_web_view_checkbox, show_fast_web_view_check, write_pdf
+from utils.result_cache import result_cache_key
+from utils.uploads import spool_uploads
 
 def render():
     """Render the PDF Merger tab"""
@@ -17,6 +22,10 @@ def render():
     )
     
     if uploaded_pdfs:
+        from PyPDF2 import PdfReader
+
+        uploads = spool_uploads(uploaded_pdfs, "merger_pdfs")
+
         st.success(f"✅ {len(uploaded_pdfs)} PDF file(s) uploaded successfully!")
         
         # Display PDF information
@@ -24,20 +33,19 @@ def render():
         pdf_info = []
         total_pages = 0
         
-        for idx, pdf_file in enumerate(uploaded_pdfs):
-            pdf_file.seek(0)
-            reader = PdfReader(pdf_file)
-            num_pages = len(reader.pages)
+        for idx, upload in enumerate(uploads):
+            with span("parse"), upload.open() as pdf_file:
+                reader = PdfReader(pdf_file)
+                num_pages = len(reader.pages)
             total_pages += num_pages
             pdf_info.append({
                 "Order": idx + 1,
-                "Filename": pdf_file.name,
+                "Filename": upload.name,
                 "Pages": num_pages
             })
         
         # Display as a table
-        df = pd.DataFrame(pdf_info)
-        st.dataframe(df, use_container_width=True, hide_index=True)
+        st.dataframe(pdf_info, use_container_width=True, hide_index=True)
         
         st.info(f"📊 Total pages in merged PDF: **{total_pages}** pages")
         
@@ -63,6 +71,8 @@ def render():
                 key="add_bookmarks",
                 help="Add a bookmark for each merged PDF for easy navigation"
             )
+
+            fast_web_view = fast_web_view_checkbox(key="merge_fast_web_view")
         
         # Option to reorder manually
         if merge_order == "As uploaded":
@@ -72,55 +82,86 @@ def render():
         
         # Merge button
         if st.button("🔗 Merge PDFs", type="primary", use_container_width=True, key="merge_btn"):
-            with st.spinner("Merging PDF files..."):
-                try:
-                    output = merge_pdfs(uploaded_pdfs, merge_order, add_bookmarks)
-                    
-                    # Success message and download button
-                    st.success(f"✅ Successfully merged {len(uploaded_pdfs)} PDF files!")
-                    st.download_button(
-                        label="⬇️ Download Merged PDF",
-                        data=output,
-                        file_name="merged_document.pdf",
-                        mime="application/pdf",
-                        type="primary",
-                        use_container_width=True
-                    )
-                    
-                    # Show merge summary
-                    st.info(f"📄 Merged PDF contains {total_pages} pages from {len(uploaded_pdfs)} documents")
-                
-                except Exception as e:
-                    st.error(f"❌ Error merging PDFs: {str(e)}")
-                    st.exception(e)
+            bytes_in = sum(upload.size for upload in uploads)
+            # Key on the documents in final merge order; names only matter as bookmark titles.
+            cache_key = result_cache_key(
+                "merge",
+                [[upload.sha256, upload.name if add_bookmarks else None]
+                 for upload in merge_sequence(uploads, merge_order)],
+                {"bookmarks": add_bookmarks, "fast_web_view": fast_web_view},
+            )
+
+            def merge():
+                # The writer reads pages from the sources lazily, so they stay open until it's written.
+                with track_operation("merge", bytes_in=bytes_in) as op, span("merge_pdfs"), ExitStack() as stack:
+                    job_pdfs = [stack.enter_context(upload.open()) for upload in uploads]
+                    output = merge_pdfs(job_pdfs, merge_order, add_bookmarks, fast_web_view)
+                    op.bytes_out = output.getbuffer().nbytes
+                return {"output": output}
+
+            submit_job("merger", "merge", merge, bytes_in=bytes_in, cache_key=cache_key, meta={
+                "files": len(uploads),
+                "pages": total_pages,
+                "fast_web_view": fast_web_view,
+            })
+
+        job = render_job("merger", label="Merging PDF files", error_message="❌ Error merging PDFs")
+        if job is not None:
+            output = job.result["output"]
+
+            # Success message and download button
+            st.success(f"✅ Successfully merged {job.meta['files']} PDF files!")
+            if job.meta["fast_web_view"]:
+                show_fast_web_view_check(output.getvalue()[:4096])
+            st.download_button(
+                label="⬇️ Download Merged PDF",
+                data=output,
+                file_name="merged_document.pdf",
+                mime="application/pdf",
+                type="primary",
+                use_container_width=True
+            )
+
+            # Show merge summary
+            st.info(f"📄 Merged PDF contains {job.meta['pages']} pages from {job.meta['files']} documents")
     
     else:
         st.info("👆 Please upload two or more PDF files to merge")
 
 
-def merge_pdfs(uploaded_pdfs, merge_order, add_bookmarks):
+def merge_sequence(uploaded_pdfs, merge_order):
+    """The PDFs in the order they will be merged"""
+    if merge_order == "Sort by filename (A-Z)":
+        return sorted(uploaded_pdfs, key=lambda x: x.name)
+    if merge_order == "Sort by filename (Z-A)":
+        return sorted(uploaded_pdfs, key=lambda x: x.name, reverse=True)
+    return list(uploaded_pdfs)
+
+
+def merge_pdfs(uploaded_pdfs, merge_order, add_bookmarks, linearize=False):
     """Merge multiple PDFs into one"""
+    from PyPDF2 import PdfReader, PdfWriter
+
     # Sort PDFs if needed
-    pdfs_to_merge = uploaded_pdfs.copy()
-    if merge_order == "Sort by filename (A-Z)":
-        pdfs_to_merge = sorted(pdfs_to_merge, key=lambda x: x.name)
-    elif merge_order == "Sort by filename (Z-A)":
-        pdfs_to_merge = sorted(pdfs_to_merge, key=lambda x: x.name, reverse=True)
+    pdfs_to_merge = merge_sequence(uploaded_pdfs, merge_order)
     
     # Create PDF writer
     writer = PdfWriter()
     
     # Merge PDFs
-    for pdf_file in pdfs_to_merge:
+    for idx, pdf_file in enumerate(pdfs_to_merge):
+        report_progress(idx, len(pdfs_to_merge), "file")
         pdf_file.seek(0)
-        reader = PdfReader(pdf_file)
+        with span("parse"):
+            reader = PdfReader(pdf_file)
         
         # Track starting page for bookmark
         start_page = len(writer.pages)
         
         # Add all pages from this PDF
-        for page in reader.pages:
-            writer.add_page(page)
+        with span("add_pages"):
+            for page in reader.pages:
+                writer.add_page(page)
         
         # Add bookmark if option is enabled
         if add_bookmarks:
@@ -130,8 +171,5 @@ def merge_pdfs(uploaded_pdfs, merge_order, add_bookmarks):
             )
     
     # Create output PDF
-    output = BytesIO()
-    writer.write(output)
-    output.seek(0)
-    
-    return output
\ No newline at end of file
+    with span("write"):
+        return write_pdf(writer.write, linearize)
\ No newline at end of file
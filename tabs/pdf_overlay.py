@@ -1,26 +1,58 @@
 # tabs/pdf_overlay.py
 import streamlit as st
-from PyPDF2 import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+from contextlib import ExitStack
 from io import BytesIO
 from PIL import Image, ImageDraw
 import base64
+import datetime
+import hashlib
+import importlib.util
+import string
 import tempfile
 import os
 
-# streamlit-drawable-canvas (0.9.3, latest) calls streamlit.elements.image.image_to_url,
-# an internal helper removed in newer Streamlit versions. Shim it with a plain base64
-# data URL (which the component just assigns as an <img src>) before importing the package.
-import streamlit.elements.image as _st_image
-if not hasattr(_st_image, "image_to_url"):
-    def _image_to_url_shim(image, *_args, **_kwargs):
-        buffer = BytesIO()
-        image.convert("RGB").save(buffer, format="PNG")
-        return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
-    _st_image.image_to_url = _image_to_url_shim
+from utils.instrumentation import span
+from utils.jobs import render_job, report_progress, submit_job
+from utils.metrics import track_operation
+from utils.page_geometry import PageGeometry, apply, concat
+from utils.page_selection import PageSelection, PageSelectionError, compile_pages
+from utils.pdf_incremental import IncrementalUpdate
+from utils.pdf_output import fast_web_view_checkbox, show_fast_web_view_check, write_pdf
+from utils.result_cache import result_cache_key
+from utils.session_memory import session_memory
+from utils.uploads import spool_upload
+
+PYMUPDF_AVAILABLE = importlib.util.find_spec("fitz") is not None
+
+# Text stamps use this standard font (no embedding needed); its cap height and
+# the horizontal padding inside the box are in units of the font size / points.
+TEXT_FONT = "Helvetica"
+_CAP_HEIGHT = 0.718
+_TEXT_PADDING = 4
+# Settings of a text stamp besides its text, as taken by make_text_stamp.
+# Variables a text stamp's text can hold, as {page} etc.
+STAMP_TEXT_VARIABLES = ("page", "pages", "bates", "date")
+TEXT_STAMP_OPTIONS = ("font_size", "color", "align", "fill", "border", "bates_prefix", "bates_start", "bates_digits")
+# The "Apply to pages" options, as page selections (see utils.page_selection).
+PAGE_SELECTION_PRESETS = {"All pages": "all", "First page only": "first", "Last page only": "last"}
+
+
+def _load_st_canvas():
+    """Import st_canvas on first use, installing the image_to_url shim it needs."""
+    # streamlit-drawable-canvas (0.9.3, latest) calls streamlit.elements.image.image_to_url,
+    # an internal helper removed in newer Streamlit versions. Shim it with a plain base64
+    # data URL (which the component just assigns as an <img src>) before importing the package.
+    import streamlit.elements.image as _st_image
+    if not hasattr(_st_image, "image_to_url"):
+        def _image_to_url_shim(image, *_args, **_kwargs):
+            buffer = BytesIO()
+            image.convert("RGB").save(buffer, format="PNG")
+            return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
+        _st_image.image_to_url = _image_to_url_shim
+
+    from streamlit_drawable_canvas import st_canvas
+    return st_canvas
 
-from streamlit_drawable_canvas import st_canvas
 
 def get_output_filename(original_filename):
     """Generate output filename based on original PDF name"""
@@ -29,6 +61,7 @@ def get_output_filename(original_filename):
         return f"{base_name}_signed.pdf"
     return f"{original_filename}_signed.pdf"
 
+
 def render():
     """Render the PDF Image Overlay tab"""
     st.markdown("Upload a PDF and an image to add your signature or stamp to the document")
@@ -45,229 +78,593 @@ def render():
         image_file = st.file_uploader("Choose an image (PNG recommended for transparency)", 
                                      type=['png', 'jpg', 'jpeg'], key="image")
     
-    # Show preview if files are uploaded
-    if pdf_file and image_file:
-        st.success("✅ Files uploaded successfully!")
-        
-        # Display image preview
-        st.subheader("Image Preview")
-        img = Image.open(image_file)
-        st.image(img, width=200, caption="Your uploaded image")
-        
-        # Get PDF info and detect page size
-        pdf_reader = PdfReader(pdf_file)
-        num_pages = len(pdf_reader.pages)
-        
-        # Detect page size from first page
-        first_page = pdf_reader.pages[0]
-        page_width = float(first_page.mediabox.width)
-        page_height = float(first_page.mediabox.height)
-        
-        # Determine page size name
-        page_size_name = get_page_size_name(page_width, page_height)
-        
-        st.info(f"📄 PDF has {num_pages} page(s) | Page Size: **{page_size_name}** ({page_width:.1f} × {page_height:.1f} points)")
+    # Show preview once a PDF is uploaded
+    if pdf_file:
+        pdf_upload = spool_upload(pdf_file, "pdf")
+        image_upload = spool_upload(image_file, "image")
+
+        if image_upload is not None:
+            st.success("✅ Files uploaded successfully!")
+
+            # Display image preview
+            st.subheader("Image Preview")
+            img = Image.open(image_upload.open())
+            st.image(img, width=200, caption="Your uploaded image")
         
+        # Get PDF info and detect page sizes: every page's boxes and rotation, read once
+        geometry = _document_geometry(pdf_upload)
+        num_pages = len(geometry)
+
+        class_pages = geometry.class_pages()
+        if len(class_pages) == 1:
+            st.info(f"📄 PDF has {num_pages} page(s) | Page Size: {_describe_page(geometry, 0)}")
+        else:
+            st.info(f"📄 PDF has {num_pages} page(s) in {len(class_pages)} page geometries:\n"
+                    + "\n".join(f"- {len(pages)} page(s) like page {pages[0] + 1}: {_describe_page(geometry, pages[0])}"
+                                 for pages in class_pages.values()))
+
         st.markdown("---")
 
-        # Position settings
-        st.subheader("⚙️ Position Settings")
+        stamp_set = _stamp_set()
+        stamp_kind = st.radio(
+            "Stamp type:",
+            ["🖼️ Image", "🔤 Text"],
+            horizontal=True,
+            key="overlay_stamp_kind",
+            help="Text stamps add page numbers, Bates numbers or dates that change from page to page"
+        )
+        # False while a text stamp's text is invalid (the error is shown): nothing to design or generate.
+        designable = True
+        current_stamp = None
+        if stamp_kind == "🔤 Text":
+            text_settings = _render_text_settings(num_pages)
+            designable = text_settings is not None
+            if designable:
+                sample_text = _sample_text(text_settings, num_pages)
+                current_stamp = _render_stamp_designer(
+                    pdf_upload,
+                    lambda width, height: render_text_stamp({**text_settings, "placement": (0, 0, width, height)},
+                                                            sample_text, 2),
+                    geometry, stamp_set,
+                    stamp_id=hashlib.sha256(repr(sorted(text_settings.items())).encode()).hexdigest()[:16],
+                    stamp_fields={**text_settings, "upload": None},
+                    allow_background=False,
+                )
+        elif image_upload is not None:
+            current_stamp = _render_stamp_designer(pdf_upload, lambda width, height: img, geometry, stamp_set,
+                                                   stamp_id=image_upload.sha256[:16],
+                                                   stamp_fields={"upload": image_upload})
+        else:
+            st.info("🖼️ Upload an image to design a stamp, or load a saved stamp template below.")
+            current_stamp = _render_stamp_designer(pdf_upload, None, geometry, stamp_set)
+
+        # The stamp set when there is one; otherwise just the stamp being designed.
+        stamps = list(stamp_set) or ([current_stamp] if current_stamp is not None else [])
+        if stamps and designable:
+            _render_generate(pdf_upload, stamps, geometry, from_set=bool(stamp_set))
+
+        job = render_job("overlay", label="Processing PDF", error_message="❌ Error processing PDF")
+        if job is not None:
+            output = job.result["output"]
+
+            # Success message and download button
+            st.success("✅ PDF generated successfully!")
+            if job.meta["incremental"]:
+                st.caption("📎 Saved as an incremental update: the original file is kept unchanged, "
+                           "followed by the stamped pages.")
+            if job.meta["fast_web_view"]:
+                show_fast_web_view_check(output.getvalue()[:4096])
+
+            st.download_button(
+                label="⬇️ Download Signed PDF",
+                data=output,
+                file_name=job.meta["file_name"],
+                mime="application/pdf",
+                type="primary",
+                use_container_width=True
+            )
+    
+    else:
+        st.info("👆 Please upload a PDF file and an image to get started")
+
+
+@st.fragment
+def _render_stamp_designer(pdf_upload, stamp_image, geometry, stamp_set, stamp_id=None, stamp_fields=None,
+                           allow_background=True):
+    """The stamp editor, the stamp set and the preview on other page geometries;
+    returns the stamp being designed (None without ``stamp_image``).
+
+    This is a fragment: dragging the stamp, applying new settings or clicking a
+    preset reruns only these three, which are everything that shows the stamp
+    being designed. "Generate" sees it on the next full rerun, which its own
+    click causes and which runs this function inline for its return value.
+    ``stamp_fields`` completes the editor's settings into a stamp (its image
+    upload, or a text stamp's text settings).
+    """
+    current_stamp = None
+    if stamp_image is not None:
+        current_stamp = _render_stamp_editor(pdf_upload, stamp_image, geometry, stamp_set, stamp_id,
+                                             allow_background)
+        current_stamp.update(stamp_fields)
+
+    st.markdown("---")
+    _render_stamp_set(stamp_set, current_stamp, len(geometry))
+
+    stamps = list(stamp_set) or ([current_stamp] if current_stamp is not None else [])
+    if stamps and len(geometry.class_pages()) > 1:
+        _render_geometry_preview(pdf_upload, stamps, geometry)
+    return current_stamp
+
+
+def _render_stamp_editor(pdf_upload, stamp_image, geometry, stamp_set, stamp_id, allow_background=True):
+    """Settings and draggable preview for the stamp being designed; returns its settings.
+
+    ``stamp_image(width, height)`` gives the stamp's preview image for a size in
+    points; ``stamp_id`` identifies its content, so the canvas is remounted when
+    it changes. The stamp is placed on the first page as displayed (rotated and
+    cropped); other pages scale the placement to their own displayed size.
 
-        col1, col2 = st.columns(2)
+    The page range and the size sliders sit in a form: they take effect
+    together when applied, not on every keystroke or slider move.
+    """
+    num_pages = len(geometry)
+    page_width, page_height = geometry.visible_size(0)
+    page_size_name = get_page_size_name(page_width, page_height)
+
+    # Position settings
+    st.subheader("⚙️ Position Settings")
 
-        with col1:
-            # Add background/overlay option
+    col1, col2 = st.columns(2)
+
+    with col1:
+        # Add background/overlay option
+        if allow_background:
             layer_mode = st.radio(
                 "Layer Mode:",
                 ["Overlay (on top)", "Background (behind)"],
                 key="layer_mode",
                 help="Choose whether to place the image on top of or behind the PDF content"
             )
+        else:
+            layer_mode = "Overlay (on top)"
+
+        page_selection = st.radio(
+            "Apply to pages:",
+            ["All pages", "First page only", "Last page only", "Custom range"],
+            key="page_sel"
+        )
 
-            page_selection = st.radio(
-                "Apply to pages:",
-                ["All pages", "First page only", "Last page only", "Custom range"],
-                key="page_sel"
+        # Determine if using background mode
+        is_background = "Background" in layer_mode
+
+    page_range = None
+    image_width = image_height = None
+    with col2:
+        if is_background:
+            st.info("🖼️ Background mode: Image will fill the entire page")
+        if page_selection == "Custom range" or not is_background:
+            with st.form("overlay_stamp_settings", border=False):
+                if page_selection == "Custom range":
+                    page_range = st.text_input(
+                        "Enter page numbers (e.g., 1,3,5 or 1-3,7,10-)",
+                        value="1",
+                        key="range",
+                        help="Pages and ranges separated by commas: 10- runs to the end, -5 is the first five; "
+                             "first, last, odd, even and all also work"
+                    )
+                if not is_background:
+                    # Adjust default size based on page size
+                    default_width = min(200, int(page_width * 0.3))
+                    default_height = min(75, int(page_height * 0.1))
+                    max_width = int(page_width * 0.8)
+                    max_height = int(page_height * 0.8)
+
+                    image_width = st.slider("Image Width (px)", 50, max_width, default_width, 10, key="width")
+                    image_height = st.slider("Image Height (px)", 25, max_height, default_height, 5, key="height")
+                st.form_submit_button("✔️ Apply", use_container_width=True)
+
+    # Session state anchor: top-left corner of the stamp, in canvas pixels
+    # (canvas origin is top-left, unlike PDF points which are bottom-left).
+    anchor_key = "overlay_anchor_px"
+    size_key = "overlay_anchor_size"
+    nonce_key = "overlay_canvas_nonce"
+    current_size_signature = (round(page_width), round(page_height), image_width, image_height)
+
+    canvas_width = 600
+    canvas_height = int(canvas_width * (page_height / page_width))
+    canvas_scale = canvas_width / page_width  # canvas px per PDF point
+
+    if not is_background:
+        if anchor_key not in st.session_state or st.session_state.get(size_key) != current_size_signature:
+            # Center the stamp by default
+            st.session_state[anchor_key] = (
+                (canvas_width - image_width * canvas_scale) / 2,
+                (canvas_height - image_height * canvas_scale) / 2,
             )
+            st.session_state[size_key] = current_size_signature
+            st.session_state[nonce_key] = st.session_state.get(nonce_key, 0) + 1
 
-            if page_selection == "Custom range":
-                page_range = st.text_input(
-                    "Enter page numbers (e.g., 1,3,5 or 1-3)",
-                    value="1",
-                    key="range"
-                )
+        st.markdown("**🖱️ Drag the stamp directly on the preview below to reposition it**")
 
-            # Determine if using background mode
-            is_background = "Background" in layer_mode
+        preset_cols = st.columns(6)
+        margin_px = 25
+        presets = {
+            "↖ Top-Left": (margin_px, margin_px),
+            "↑ Top-Center": ((canvas_width - image_width * canvas_scale) / 2, margin_px),
+            "↗ Top-Right": (canvas_width - image_width * canvas_scale - margin_px, margin_px),
+            "↙ Bottom-Left": (margin_px, canvas_height - image_height * canvas_scale - margin_px),
+            "↓ Bottom-Center": ((canvas_width - image_width * canvas_scale) / 2, canvas_height - image_height * canvas_scale - margin_px),
+            "↘ Bottom-Right": (canvas_width - image_width * canvas_scale - margin_px, canvas_height - image_height * canvas_scale - margin_px),
+        }
+        for preset_col, (label, pos) in zip(preset_cols, presets.items()):
+            if preset_col.button(label, key=f"preset_{label}", use_container_width=True):
+                st.session_state[anchor_key] = pos
+                st.session_state[nonce_key] = st.session_state.get(nonce_key, 0) + 1
 
-        with col2:
-            if not is_background:
-                # Adjust default size based on page size
-                default_width = min(200, int(page_width * 0.3))
-                default_height = min(75, int(page_height * 0.1))
-                max_width = int(page_width * 0.8)
-                max_height = int(page_height * 0.8)
+        left_px, top_px = st.session_state[anchor_key]
+    else:
+        left_px, top_px = 0, 0
 
-                image_width = st.slider("Image Width (px)", 50, max_width, default_width, 10, key="width")
-                image_height = st.slider("Image Height (px)", 25, max_height, default_height, 5, key="height")
-            else:
-                st.info("🖼️ Background mode: Image will fill the entire page")
-                image_width = None
-                image_height = None
+    st.markdown("---")
 
-        # Session state anchor: top-left corner of the stamp, in canvas pixels
-        # (canvas origin is top-left, unlike PDF points which are bottom-left).
-        anchor_key = "overlay_anchor_px"
-        size_key = "overlay_anchor_size"
-        nonce_key = "overlay_canvas_nonce"
-        current_size_signature = (round(page_width), round(page_height), image_width, image_height)
+    # PREVIEW SECTION (draggable canvas)
+    col_prev1, col_prev2 = st.columns([2, 1])
 
-        canvas_width = 600
-        canvas_height = int(canvas_width * (page_height / page_width))
-        canvas_scale = canvas_width / page_width  # canvas px per PDF point
+    def page_background():
+        # Only needed to mount a canvas or for the background preview: a stamp
+        # move reuses the cached drawing and never touches the page raster.
+        with span("rasterize_preview"):
+            background = _page_background(pdf_upload, 0, canvas_width, canvas_height)
+            return draw_stamps(background, stamp_set, 0, num_pages, geometry, canvas_scale)
 
+    with col_prev1:
         if not is_background:
-            if anchor_key not in st.session_state or st.session_state.get(size_key) != current_size_signature:
-                # Center the stamp by default
-                st.session_state[anchor_key] = (
-                    (canvas_width - image_width * canvas_scale) / 2,
-                    (canvas_height - image_height * canvas_scale) / 2,
-                )
-                st.session_state[size_key] = current_size_signature
-                st.session_state[nonce_key] = st.session_state.get(nonce_key, 0) + 1
+            canvas_key = f"overlay_canvas_{stamp_id}_{st.session_state.get(nonce_key, 0)}"
+            # The component's frontend reloads the canvas via loadFromJSON whenever
+            # the incoming initial_drawing prop is not deep-equal to the drawing it
+            # captured on first mount (its "initialState", which never changes after
+            # that). So we must keep passing the *exact same* dict every rerun for a
+            # given canvas_key -- rebuilding it (even with identical-looking values)
+            # or passing None (which becomes a *different*, near-empty dict) makes it
+            # look like a real external change and forces a reset, which caused drags
+            # to silently snap back and then jump on the next drag. Cache the dict in
+            # session memory once per canvas_key and reuse the same object thereafter.
+            # It embeds both images, so it counts against the session's budget; if
+            # it was evicted, mount a new canvas rather than feed the old one a copy.
+            drawing_cache_key = "overlay_canvas_drawing"
+            drawing_cache_owner_key = "overlay_canvas_drawing_owner"
+            cached_drawing = session_memory().get(drawing_cache_key)
+            if cached_drawing is None and st.session_state.get(drawing_cache_owner_key) == canvas_key:
+                st.session_state[nonce_key] += 1
+                canvas_key = f"overlay_canvas_{stamp_id}_{st.session_state[nonce_key]}"
+            if cached_drawing is None or st.session_state.get(drawing_cache_owner_key) != canvas_key:
+                initial_drawing = build_stamp_drawing(page_background(), stamp_image(image_width, image_height),
+                                                      left_px, top_px, image_width, image_height, canvas_scale)
+                session_memory().put(drawing_cache_key, initial_drawing, _drawing_size(initial_drawing), "drawing")
+                st.session_state[drawing_cache_owner_key] = canvas_key
+            else:
+                initial_drawing = cached_drawing
 
-            st.markdown("**🖱️ Drag the stamp directly on the preview below to reposition it**")
-
-            preset_cols = st.columns(6)
-            margin_px = 25
-            presets = {
-                "↖ Top-Left": (margin_px, margin_px),
-                "↑ Top-Center": ((canvas_width - image_width * canvas_scale) / 2, margin_px),
-                "↗ Top-Right": (canvas_width - image_width * canvas_scale - margin_px, margin_px),
-                "↙ Bottom-Left": (margin_px, canvas_height - image_height * canvas_scale - margin_px),
-                "↓ Bottom-Center": ((canvas_width - image_width * canvas_scale) / 2, canvas_height - image_height * canvas_scale - margin_px),
-                "↘ Bottom-Right": (canvas_width - image_width * canvas_scale - margin_px, canvas_height - image_height * canvas_scale - margin_px),
-            }
-            for preset_col, (label, pos) in zip(preset_cols, presets.items()):
-                if preset_col.button(label, key=f"preset_{label}", use_container_width=True):
-                    st.session_state[anchor_key] = pos
-                    st.session_state[nonce_key] = st.session_state.get(nonce_key, 0) + 1
+            st_canvas = _load_st_canvas()
+            canvas_result = st_canvas(
+                background_color="#ffffff",
+                height=canvas_height,
+                width=canvas_width,
+                drawing_mode="transform",
+                initial_drawing=initial_drawing,
+                display_toolbar=False,
+                update_streamlit=True,
+                key=canvas_key,
+            )
+
+            if canvas_result.json_data is not None:
+                objects = canvas_result.json_data.get("objects", [])
+                if len(objects) > 1:
+                    stamp_obj = objects[1]
+                    new_left, new_top = stamp_obj["left"], stamp_obj["top"]
+                    if (round(new_left), round(new_top)) != (round(left_px), round(top_px)):
+                        st.session_state[anchor_key] = (new_left, new_top)
+                        left_px, top_px = new_left, new_top
 
-            left_px, top_px = st.session_state[anchor_key]
+            # Convert canvas pixels (top-left origin) to PDF points (bottom-left origin)
+            x_pos = left_px / canvas_scale
+            y_pos = page_height - (top_px / canvas_scale) - image_height
         else:
-            left_px, top_px = 0, 0
+            bg_preview = Image.blend(
+                page_background().convert("RGB"),
+                stamp_image(image_width, image_height).resize((canvas_width, canvas_height),
+                                                              Image.Resampling.LANCZOS).convert("RGB"),
+                alpha=0.3
+            )
+            st.image(bg_preview, caption="Position Preview (not to scale)", use_container_width=True)
+            x_pos, y_pos = 0, 0
 
-        st.markdown("---")
+    with col_prev2:
+        st.info(f"""
+        **Preview Info:**
+        - Page Size: {page_size_name}
+        - Dimensions: {page_width:.0f}×{page_height:.0f}pt
+        - Mode: {layer_mode}
+        - Size: {image_width if image_width else 'Full Page'} × {image_height if image_height else 'Full Page'} px
+        - Position: ({x_pos:.0f}, {y_pos:.0f}) pt
+        """)
 
-        # PREVIEW SECTION (draggable canvas)
-        col_prev1, col_prev2 = st.columns([2, 1])
-
-        with col_prev1:
-            page_background = render_page_background(pdf_file, canvas_width, canvas_height)
-
-            if not is_background:
-                canvas_key = f"overlay_canvas_{st.session_state.get(nonce_key, 0)}"
-                # The component's frontend reloads the canvas via loadFromJSON whenever
-                # the incoming initial_drawing prop is not deep-equal to the drawing it
-                # captured on first mount (its "initialState", which never changes after
-                # that). So we must keep passing the *exact same* dict every rerun for a
-                # given canvas_key -- rebuilding it (even with identical-looking values)
-                # or passing None (which becomes a *different*, near-empty dict) makes it
-                # look like a real external change and forces a reset, which caused drags
-                # to silently snap back and then jump on the next drag. Cache the dict in
-                # session_state once per canvas_key and reuse the same object thereafter.
-                drawing_cache_key = "overlay_canvas_drawing"
-                drawing_cache_owner_key = "overlay_canvas_drawing_owner"
-                if st.session_state.get(drawing_cache_owner_key) != canvas_key:
-                    initial_drawing = build_stamp_drawing(page_background, img, left_px, top_px, image_width, image_height, canvas_scale)
-                    st.session_state[drawing_cache_key] = initial_drawing
-                    st.session_state[drawing_cache_owner_key] = canvas_key
-                else:
-                    initial_drawing = st.session_state[drawing_cache_key]
-
-                canvas_result = st_canvas(
-                    background_color="#ffffff",
-                    height=canvas_height,
-                    width=canvas_width,
-                    drawing_mode="transform",
-                    initial_drawing=initial_drawing,
-                    display_toolbar=False,
-                    update_streamlit=True,
-                    key=canvas_key,
-                )
+    return {
+        "background": is_background,
+        "page_selection": page_selection,
+        "page_range": page_range,
+        "placement": None if is_background else (x_pos, y_pos, image_width, image_height),
+    }
 
-                if canvas_result.json_data is not None:
-                    objects = canvas_result.json_data.get("objects", [])
-                    if len(objects) > 1:
-                        stamp_obj = objects[1]
-                        new_left, new_top = stamp_obj["left"], stamp_obj["top"]
-                        if (round(new_left), round(new_top)) != (round(left_px), round(top_px)):
-                            st.session_state[anchor_key] = (new_left, new_top)
-                            left_px, top_px = new_left, new_top
-
-                # Convert canvas pixels (top-left origin) to PDF points (bottom-left origin)
-                x_pos = left_px / canvas_scale
-                y_pos = page_height - (top_px / canvas_scale) - image_height
-            else:
-                bg_preview = Image.blend(
-                    page_background.convert("RGB"),
-                    img.resize((canvas_width, canvas_height), Image.Resampling.LANCZOS).convert("RGB"),
-                    alpha=0.3
-                )
-                st.image(bg_preview, caption="Position Preview (not to scale)", use_container_width=True)
-                x_pos, y_pos = 0, 0
-
-        with col_prev2:
-            st.info(f"""
-            **Preview Info:**
-            - Page Size: {page_size_name}
-            - Dimensions: {page_width:.0f}×{page_height:.0f}pt
-            - Mode: {layer_mode}
-            - Size: {image_width if image_width else 'Full Page'} × {image_height if image_height else 'Full Page'} px
-            - Position: ({x_pos:.0f}, {y_pos:.0f}) pt
-            """)
 
-        st.markdown("---")
-        
-        # Generate button
-        if st.button("🎨 Generate PDF", type="primary", use_container_width=True, key="generate_overlay"):
-            with st.spinner("Processing PDF..."):
-                try:
-                    # Reset file pointers
-                    pdf_file.seek(0)
-                    image_file.seek(0)
-                    
-                    # Parse page selection
-                    if page_selection == "Custom range":
-                        pages_to_process = parse_page_range(page_range, num_pages)
-                    else:
-                        pages_to_process = get_pages_to_process(page_selection, num_pages)
-                    
-                    # Process the PDF
-                    output = process_pdf(pdf_file, image_file, pages_to_process, num_pages,
-                                       is_background, image_width, image_height, x_pos, y_pos)
-                    
-                    # Success message and download button
-                    st.success("✅ PDF generated successfully!")
-                    
-                    # Generate output filename based on original PDF name
-                    output_filename = get_output_filename(pdf_file.name)
-                    
-                    st.download_button(
-                        label="⬇️ Download Signed PDF",
-                        data=output,
-                        file_name=output_filename,
-                        mime="application/pdf",
-                        type="primary",
-                        use_container_width=True
-                    )
-                    
-                except Exception as e:
-                    st.error(f"❌ Error processing PDF: {str(e)}")
-                    st.exception(e)
-    
+def _render_text_settings(num_pages):
+    """Text, font and box settings for a text stamp; returns them, or None
+    (with the error shown) if the text doesn't parse."""
+    st.subheader("🔤 Text Stamp")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        text = st.text_input(
+            "Text",
+            value="Page {page} of {pages}",
+            key="overlay_text",
+            help="Variables: {page} (page number), {pages} (page count), {bates} (Bates number), {date} (today)"
+        )
+        font_size = st.slider("Font Size (pt)", 6, 48, 10, 1, key="overlay_text_size")
+        align = st.radio("Alignment:", ["left", "center", "right"], index=1, horizontal=True,
+                         key="overlay_text_align")
+
+    with col2:
+        color = st.color_picker("Text color", "#000000", key="overlay_text_color")
+        fill_col, border_col = st.columns(2)
+        with fill_col:
+            fill = st.color_picker("Box fill", "#ffffff", key="overlay_text_fill")
+            use_fill = st.checkbox("Fill box", value=False, key="overlay_text_use_fill")
+        with border_col:
+            border = st.color_picker("Box border", "#000000", key="overlay_text_border")
+            use_border = st.checkbox("Draw border", value=False, key="overlay_text_use_border")
+
+    with st.expander("Bates numbering ({bates})"):
+        col_prefix, col_start, col_digits = st.columns(3)
+        bates_prefix = col_prefix.text_input("Prefix", value="", key="overlay_bates_prefix")
+        bates_start = col_start.number_input("First number", min_value=0, value=1, step=1, key="overlay_bates_start")
+        bates_digits = col_digits.number_input("Digits", min_value=1, max_value=12, value=6, step=1,
+                                               key="overlay_bates_digits")
+
+    settings = {
+        "kind": "text",
+        "text": text,
+        "font_size": font_size,
+        "color": color,
+        "align": align,
+        "fill": fill if use_fill else None,
+        "border": border if use_border else None,
+        "bates_prefix": bates_prefix,
+        "bates_start": int(bates_start),
+        "bates_digits": int(bates_digits),
+    }
+    try:
+        parse_stamp_text(text)
+    except StampTextError as error:
+        st.error(f"Invalid text: {error}")
+        return None
+    return settings
+
+
+def _sample_text(stamp, num_pages, page_index=0, sequence=0):
+    """A text stamp's text on a page, the first by default (for previews and validation)."""
+    return format_stamp_text({**stamp, "date": datetime.date.today().isoformat()}, page_index, sequence, num_pages)
+
+
+def _document_geometry(pdf_upload):
+    """The upload's PageGeometry, read once per upload and kept in session memory."""
+    cached = session_memory().get("overlay_geometry")
+    if cached is not None and cached[0] == pdf_upload.sha256:
+        return cached[1]
+    from PyPDF2 import PdfReader
+
+    with span("parse"):
+        geometry = PageGeometry.from_reader(PdfReader(pdf_upload.open()))
+    session_memory().put("overlay_geometry", (pdf_upload.sha256, geometry), geometry.nbytes(), "geometry")
+    return geometry
+
+
+def _stamp_set():
+    """The session's stamp set: stamps added from the editor or loaded from a template."""
+    stamp_set = st.session_state.setdefault("overlay_stamps", [])
+    # The stamps keep their images alive after the uploader moves on; they can't be evicted.
+    images = {id(stamp["upload"]): stamp["upload"] for stamp in stamp_set if stamp["upload"] is not None}.values()
+    session_memory().track(
+        "overlay_stamps",
+        sum(upload.size for upload in images if upload.path is None),
+        "stamp set",
+        disk_size=sum(upload.size for upload in images if upload.path is not None),
+    )
+    return stamp_set
+
+
+def _stamp_set_changed():
+    # Mount a fresh canvas so its preview shows the new set.
+    st.session_state["overlay_canvas_nonce"] = st.session_state.get("overlay_canvas_nonce", 0) + 1
+    st.rerun()
+
+
+def stamp_pages(stamp, num_pages):
+    """The PageSelection a stamp's page selection resolves to in a document of ``num_pages``.
+
+    Raises PageSelectionError if its custom range is invalid.
+    """
+    if stamp["page_selection"] == "Custom range":
+        return parse_page_range(stamp["page_range"], num_pages)
+    return get_pages_to_process(stamp["page_selection"], num_pages)
+
+
+def _describe_stamp(stamp):
+    pages = stamp["page_range"] if stamp["page_selection"] == "Custom range" else stamp["page_selection"].lower()
+    if stamp.get("kind") == "text":
+        x_pos, y_pos, width, height = stamp["placement"]
+        return f"🔤 “{stamp['text']}”: {width:.0f}×{height:.0f} at ({x_pos:.0f}, {y_pos:.0f}) pt, {pages}"
+    if stamp["background"]:
+        return f"🖼️ {stamp['upload'].name}: background, {pages}"
+    x_pos, y_pos, image_width, image_height = stamp["placement"]
+    return (f"🖼️ {stamp['upload'].name}: {image_width:.0f}×{image_height:.0f} at "
+            f"({x_pos:.0f}, {y_pos:.0f}) pt, {pages}")
+
+
+def _render_stamp_set(stamp_set, current_stamp, num_pages):
+    """The stamp set with add/remove controls, and saving/loading it as a template."""
+    from utils.stamp_templates import delete_template, list_templates, load_template, save_template
+
+    st.subheader("🧩 Stamp Set")
+    if current_stamp is not None and st.button("➕ Add this stamp to the set", key="overlay_add_stamp"):
+        try:
+            stamp_pages(current_stamp, num_pages)  # reject an invalid custom range now
+        except PageSelectionError as error:
+            st.error(f"Invalid page range: {error}")
+        else:
+            stamp_set.append(current_stamp)
+            _stamp_set_changed()
+
+    if stamp_set:
+        for i, stamp in enumerate(stamp_set):
+            col_stamp, col_remove = st.columns([6, 1])
+            col_stamp.markdown(f"**{i + 1}.** {_describe_stamp(stamp)}")
+            if col_remove.button("🗑️ Remove", key=f"overlay_remove_stamp_{i}", use_container_width=True):
+                del stamp_set[i]
+                _stamp_set_changed()
+        st.caption("All stamps in the set are applied in one pass, in this order; "
+                   "background stamps go behind the page content.")
     else:
-        st.info("👆 Please upload both a PDF file and an image to get started")
+        st.caption("Add stamps to apply several images, each with its own placement and pages, "
+                   "in one pass, or to save them as a reusable template.")
+
+    col_save, col_load = st.columns(2)
+    with col_save:
+        template_name = st.text_input("Template name", key="overlay_template_name")
+        if st.button("💾 Save set as template", key="overlay_save_template",
+                     disabled=not stamp_set or not template_name.strip()):
+            save_template(template_name, stamp_set)
+            st.success(f"Saved template **{template_name.strip()}**")
+    with col_load:
+        template_choice = st.selectbox("Saved templates", list_templates(), index=None,
+                                       placeholder="Choose a template", key="overlay_template_choice")
+        col_open, col_delete = st.columns(2)
+        if col_open.button("📂 Load", key="overlay_load_template", disabled=template_choice is None,
+                           use_container_width=True):
+            stamp_set[:] = load_template(template_choice)
+            _stamp_set_changed()
+        if col_delete.button("🗑️ Delete", key="overlay_delete_template", disabled=template_choice is None,
+                             use_container_width=True):
+            delete_template(template_choice)
+            st.rerun()
+
+
+def _render_geometry_preview(pdf_upload, stamps, geometry):
+    """Preview of the stamps on a page of another geometry: size, crop or rotation."""
+    if not st.toggle("🔍 Preview on other page sizes and orientations", key="overlay_geometry_preview",
+                     help="Stamps are placed on the first page as displayed and scaled to each page's "
+                          "displayed size, upright on rotated pages"):
+        return
+    representatives = [pages[0] for pages in geometry.class_pages().values()][1:]
+    page_index = st.selectbox("Preview page:", representatives, key="overlay_preview_page",
+                              format_func=lambda i: f"Page {i + 1}: {_describe_page(geometry, i)}")
+    page_width, page_height = geometry.visible_size(page_index)
+    canvas_width = 400
+    canvas_scale = canvas_width / page_width
+    with span("rasterize_preview"):
+        preview = _page_background(pdf_upload, page_index, canvas_width, int(page_height * canvas_scale))
+        preview = draw_stamps(preview, stamps, page_index, len(geometry), geometry, canvas_scale)
+    st.image(preview, caption=f"Page {page_index + 1} with the stamps to generate")
+
+
+def _render_generate(pdf_upload, stamps, geometry, from_set):
+    """Output options and the Generate button, which applies ``stamps`` in one job."""
+    num_pages = len(geometry)
+    incremental = st.checkbox(
+        "📎 Append as incremental update",
+        value=False,
+        key="overlay_incremental",
+        help="Keeps the original file byte-for-byte and appends only the stamped pages after it. "
+             "Much faster for large files and keeps existing digital signatures valid. "
+             "Can't be combined with fast web view.",
+    )
+    fast_web_view = fast_web_view_checkbox(key="overlay_fast_web_view", disabled=incremental) and not incremental
+    backend = st.selectbox(
+        "Stamping engine",
+        [name for name in OVERLAY_BACKENDS if PYMUPDF_AVAILABLE or name != "PyMuPDF"],
+        key="overlay_backend",
+        disabled=incremental,
+        help="PyMuPDF embeds the image once and only touches the selected pages, so it is much "
+             "faster on long documents. PyPDF2 + ReportLab is the original engine, kept as a fallback.",
+    )
+
+    st.markdown("---")
+    
+    # Generate button
+    label = f"🎨 Generate PDF ({len(stamps)} stamps)" if from_set else "🎨 Generate PDF"
+    if st.button(label, type="primary", use_container_width=True, key="generate_overlay"):
+        # Parse page selections
+        try:
+            stamp_selections = [stamp_pages(stamp, num_pages) for stamp in stamps]
+        except PageSelectionError as error:
+            st.error(f"Invalid page range: {error}")
+            return
+
+        # Text stamps' {date} is the day the job is submitted.
+        date = datetime.date.today().isoformat()
+        uploads = [stamp["upload"] for stamp in stamps if stamp["upload"] is not None]
+        images = {id(upload): upload for upload in uploads}.values()
+        bytes_in = pdf_upload.size + sum(upload.size for upload in images)
+        stamp_params = []
+        for stamp, pages in zip(stamps, stamp_selections):
+            params = {
+                "pages": pages.intervals(),
+                "background": stamp["background"],
+                # Placement in PDF points; background mode ignores it.
+                "placement": None if stamp["background"] else
+                [round(value, 2) for value in stamp["placement"]],
+            }
+            if stamp.get("kind") == "text":
+                params.update({key: stamp[key] for key in ("text",) + TEXT_STAMP_OPTIONS}, date=date)
+            stamp_params.append(params)
+        cache_key = result_cache_key("overlay", [pdf_upload.sha256] + [upload.sha256 for upload in uploads], {
+            "stamps": stamp_params,
+            "fast_web_view": fast_web_view,
+            "incremental": incremental,
+            "backend": None if incremental else backend,
+        })
+
+        def generate():
+            with track_operation("overlay", bytes_in=bytes_in) as op, span("process_pdf"), \
+                    pdf_upload.open() as job_pdf, ExitStack() as stack:
+                job_stamps = [_job_stamp(stamp, pages, stack, date)
+                              for stamp, pages in zip(stamps, stamp_selections)]
+                if incremental:
+                    output = stamp_pdf_incremental(job_pdf, job_stamps, geometry=geometry)
+                else:
+                    output = OVERLAY_BACKENDS[backend](job_pdf, job_stamps, num_pages, linearize=fast_web_view,
+                                                       geometry=geometry)
+                op.bytes_out = output.getbuffer().nbytes
+            return {"output": output}
+
+        submit_job("overlay", "overlay", generate, bytes_in=bytes_in, cache_key=cache_key, meta={
+            "file_name": get_output_filename(pdf_upload.name),
+            "fast_web_view": fast_web_view,
+            "incremental": incremental,
+        })
+    elif from_set:
+        st.caption("Generates the stamp set; add the stamp above to the set to include it.")
+
+
+def _job_stamp(stamp, pages, stack, date):
+    """The engine stamp for a stamp-set entry, opening its image on ``stack``."""
+    if stamp.get("kind") == "text":
+        x_pos, y_pos, width, height = stamp["placement"]
+        return make_text_stamp(stamp["text"], pages, x_pos, y_pos, width, height, date=date,
+                               **{key: stamp[key] for key in TEXT_STAMP_OPTIONS})
+    x_pos, y_pos, image_width, image_height = stamp["placement"] or (0, 0, None, None)
+    return make_stamp(stack.enter_context(stamp["upload"].open()), pages,
+                      stamp["background"], image_width, image_height, x_pos, y_pos)
 
 
 def get_page_size_name(width, height):
@@ -291,15 +688,28 @@ def get_page_size_name(width, height):
     return f"Custom ({width:.0f}x{height:.0f}pt)"
 
 
-def render_page_background(pdf_file, canvas_width, canvas_height):
-    """Render the first page of the PDF as a PIL image sized for the canvas."""
+def _describe_page(geometry, page_index):
+    """Size name and displayed dimensions of a page, with its rotation and crop."""
+    width, height = geometry.visible_size(page_index)
+    description = f"{get_page_size_name(width, height)} ({width:.1f} × {height:.1f} points)"
+    if geometry.rotation(page_index):
+        description += f", rotated {geometry.rotation(page_index)}°"
+    if geometry.crop_box(page_index) != geometry.media_box(page_index):
+        description += ", cropped"
+    return description
+
+
+def render_page_background(pdf_upload, canvas_width, canvas_height, page_index=0):
+    """Render a page of the PDF (the first by default), as displayed, as a PIL image sized for the canvas."""
     try:
         import fitz  # PyMuPDF
-        pdf_file.seek(0)
-        pdf_bytes = pdf_file.read()
 
-        pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
-        first_page_obj = pdf_document[0]
+        # Open spooled uploads from disk; small ones straight from their bytes.
+        if pdf_upload.path is not None:
+            pdf_document = fitz.open(pdf_upload.path, filetype="pdf")
+        else:
+            pdf_document = fitz.open(stream=pdf_upload.view(), filetype="pdf")
+        first_page_obj = pdf_document[page_index]
 
         zoom = canvas_width / first_page_obj.rect.width
         mat = fitz.Matrix(zoom, zoom)
@@ -329,12 +739,99 @@ def render_page_background(pdf_file, canvas_width, canvas_height):
     return background
 
 
+def _page_background(pdf_upload, page_index, canvas_width, canvas_height):
+    """render_page_background, kept in session memory per page until the upload or size changes."""
+    name = f"overlay_page_background_{page_index}"
+    key = (pdf_upload.sha256, canvas_width, canvas_height)
+    cached = session_memory().get(name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    background = render_page_background(pdf_upload, canvas_width, canvas_height, page_index)
+    session_memory().put(name, (key, background), canvas_width * canvas_height * 3, "preview")
+    return background
+
+
+def draw_stamps(page_background, stamps, page_index, num_pages, geometry, canvas_scale):
+    """The preview of page ``page_index`` with the stamps that go on it drawn
+    where the engines put them."""
+    page_size = geometry.visible_size(page_index)
+    reference_size = geometry.visible_size(0)
+    stamps_and_pages = []
+    for stamp in stamps:
+        try:
+            pages = stamp_pages(stamp, num_pages)
+        except PageSelectionError as error:
+            st.error(f"Invalid page range: {error}")
+            return page_background
+        if page_index in pages:
+            stamps_and_pages.append((stamp, pages))
+    if not stamps_and_pages:
+        return page_background
+    preview = page_background.convert("RGB")
+    for stamp, pages in stamps_and_pages:
+        x_pos, y_pos, width, height = stamp_box(stamp, page_size, reference_size)
+        if stamp.get("kind") == "text":
+            text = _sample_text(stamp, num_pages, page_index, pages.rank(page_index))
+            img = render_text_stamp({**stamp, "placement": (0, 0, width, height),
+                                     "font_size": _font_size(stamp, width, height)}, text, canvas_scale)
+        else:
+            with stamp["upload"].open() as image_file:
+                img = Image.open(image_file).convert("RGBA")
+            if stamp["background"]:
+                preview = Image.blend(preview, img.convert("RGB").resize(preview.size, Image.Resampling.LANCZOS),
+                                      alpha=0.3)
+                continue
+            img = img.resize((max(1, round(width * canvas_scale)), max(1, round(height * canvas_scale))),
+                             Image.Resampling.LANCZOS)
+        # Displayed page points (bottom-left origin) to canvas pixels (top-left origin)
+        preview.paste(img, (round(x_pos * canvas_scale), round((page_size[1] - y_pos - height) * canvas_scale)), img)
+    return preview
+
+
+def render_text_stamp(stamp, text, scale):
+    """A text stamp's box with ``text`` as an image, ``scale`` pixels per point (for previews)."""
+    from PIL import ImageFont
+
+    _, _, width, height = stamp["placement"]
+    img = Image.new("RGBA", (max(1, round(width * scale)), max(1, round(height * scale))), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    if stamp["fill"]:
+        draw.rectangle([0, 0, img.width - 1, img.height - 1], fill=stamp["fill"])
+    if stamp["border"]:
+        draw.rectangle([0, 0, img.width - 1, img.height - 1], outline=stamp["border"], width=max(1, round(scale)))
+    font = ImageFont.load_default(size=stamp["font_size"] * scale)
+    text_x, text_y = _text_origin(stamp, text, 0, 0, width, height)
+    draw.text((text_x * scale, (height - text_y) * scale), text, fill=stamp["color"], font=font, anchor="ls")
+    return img
+
+
 def _image_to_data_url(image):
     buffer = BytesIO()
     image.convert("RGBA").save(buffer, format="PNG")
     return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("utf-8")
 
 
+def _cached_data_url(image, slot):
+    """_image_to_data_url, reusing the last encoding for ``slot`` while the pixels are unchanged.
+
+    Resizing the stamp or snapping it to a preset mounts a new canvas over the
+    same page and stamp images; PNG-encoding them again would dominate the rerun.
+    """
+    name = f"overlay_data_url_{slot}"
+    digest = (image.mode, image.size, hashlib.sha1(image.tobytes()).digest())
+    cached = session_memory().get(name)
+    if cached is not None and cached[0] == digest:
+        return cached[1]
+    url = _image_to_data_url(image)
+    session_memory().put(name, (digest, url), len(url), "preview")
+    return url
+
+
+def _drawing_size(drawing):
+    """Approximate bytes held by a drawing: dominated by its base64 image sources."""
+    return sum(len(obj.get("src", "")) for obj in drawing["objects"])
+
+
 def build_stamp_drawing(page_background, img, left_px, top_px, image_width, image_height, canvas_scale):
     """Build the Fabric.js initial_drawing JSON for the canvas: the rendered PDF
     page as a locked background object, plus a draggable (not resizable/rotatable)
@@ -355,7 +852,7 @@ def build_stamp_drawing(page_background, img, left_px, top_px, image_width, imag
         "height": page_background.height,
         "scaleX": 1,
         "scaleY": 1,
-        "src": _image_to_data_url(page_background),
+        "src": _cached_data_url(page_background, "page"),
         "crossOrigin": None,
         "hasControls": False,
         "hasRotatingPoint": False,
@@ -381,7 +878,7 @@ def build_stamp_drawing(page_background, img, left_px, top_px, image_width, imag
         "height": img.height,
         "scaleX": target_width_px / img.width,
         "scaleY": target_height_px / img.height,
-        "src": _image_to_data_url(img),
+        "src": _cached_data_url(img, "stamp"),
         "crossOrigin": None,
         "hasControls": False,
         "hasRotatingPoint": False,
@@ -397,105 +894,730 @@ def build_stamp_drawing(page_background, img, left_px, top_px, image_width, imag
 
 
 def get_pages_to_process(page_selection, num_pages):
-    """Get the list of page indices to process"""
-    if page_selection == "All pages":
-        return list(range(num_pages))
-    elif page_selection == "First page only":
-        return [0]
-    elif page_selection == "Last page only":
-        return [num_pages - 1]
-    return []
+    """Get the PageSelection for a preset page-selection option"""
+    return compile_pages(PAGE_SELECTION_PRESETS.get(page_selection, ""), num_pages)
 
 
 def parse_page_range(page_range, num_pages):
-    """Parse custom page range"""
-    pages_to_process = []
+    """Parse custom page range (see utils.page_selection) into a PageSelection.
+
+    Raises PageSelectionError for an invalid range; callers report it.
+    """
+    return compile_pages(page_range, num_pages)
+
+
+def _page_set(pages):
+    # A PageSelection already has O(1) membership; anything else becomes a set.
+    return pages if isinstance(pages, PageSelection) else set(pages)
+
+
+def make_stamp(image_file, pages, is_background, image_width=None, image_height=None, x_pos=0, y_pos=0):
+    """One stamp for the stamping engines: an image file, the page indices it
+    goes on (a PageSelection or any iterable), and its placement in points on
+    the reference (first) page."""
+    return {
+        "kind": "image",
+        "image": image_file,
+        "pages": _page_set(pages),
+        "background": is_background,
+        "placement": (x_pos, y_pos, image_width, image_height),
+    }
+
+
+def make_text_stamp(text, pages, x_pos, y_pos, width, height, font_size=10, color="#000000",
+                    align="center", fill=None, border=None, bates_prefix="", bates_start=1,
+                    bates_digits=6, date=None):
+    """A text stamp: ``text`` with per-page variables drawn in a box placed in
+    points on the reference page, optionally filled and outlined.
+
+    ``text`` may use {page}, {pages}, {bates} (``bates_prefix`` plus a
+    ``bates_digits`` zero-padded number counting up from ``bates_start`` over
+    the stamped pages) and {date} (``date``, default today, ISO format).
+    Colors are "#rrggbb" strings; the font is Helvetica.
+    """
+    return {
+        "kind": "text",
+        "text": text,
+        "pages": _page_set(pages),
+        "background": False,
+        "placement": (x_pos, y_pos, width, height),
+        "font_size": font_size,
+        "color": color,
+        "align": align,
+        "fill": fill,
+        "border": border,
+        "bates_prefix": bates_prefix,
+        "bates_start": bates_start,
+        "bates_digits": bates_digits,
+        "date": date or datetime.date.today().isoformat(),
+    }
+
+
+class StampTextError(ValueError):
+    """Stamp text that isn't plain text with bare variables."""
+
+
+def parse_stamp_text(text):
+    """``text`` as [(literal text, variable name or None)].
+
+    Only the bare variables in STAMP_TEXT_VARIABLES are allowed: no attribute
+    or index access, format specs or conversions, which ``str.format`` would
+    run on user text. Raises StampTextError otherwise.
+    """
     try:
-        if '-' in page_range:
-            start, end = map(int, page_range.split('-'))
-            pages_to_process = list(range(start-1, min(end, num_pages)))
+        parsed = list(string.Formatter().parse(text))
+    except ValueError:
+        raise StampTextError("write braces as {{ and }} unless they hold a variable") from None
+    for _literal, field, spec, conversion in parsed:
+        if field is None:
+            continue
+        if field not in STAMP_TEXT_VARIABLES:
+            raise StampTextError(f"unknown variable {{{field}}}: use "
+                                 + ", ".join(f"{{{name}}}" for name in STAMP_TEXT_VARIABLES))
+        if spec or conversion:
+            raise StampTextError(f"write variables as {{{field}}}, without a format or conversion")
+    return [(literal, field) for literal, field, _spec, _conversion in parsed]
+
+
+def format_stamp_text(stamp, page_index, sequence, num_pages):
+    """A text stamp's text on page ``page_index``, the ``sequence``-th page it goes on."""
+    bates = f"{stamp['bates_prefix']}{stamp['bates_start'] + sequence:0{stamp['bates_digits']}d}"
+    values = {"page": page_index + 1, "pages": num_pages, "bates": bates, "date": stamp["date"]}
+    return "".join(literal + (str(values[field]) if field is not None else "")
+                   for literal, field in parse_stamp_text(stamp["text"]))
+
+
+def _stamp_texts(stamps, num_pages):
+    """Per stamp, {page index: text} for text stamps (None for image stamps)."""
+    return [
+        {
+            i: format_stamp_text(stamp, i, sequence, num_pages)
+            for sequence, i in enumerate(sorted(i for i in stamp["pages"] if 0 <= i < num_pages))
+        } if stamp["kind"] == "text" else None
+        for stamp in stamps
+    ]
+
+
+def _rgb(color):
+    """"#rrggbb" as (r, g, b) in 0..1."""
+    color = color.lstrip("#")
+    return tuple(int(color[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+def _font_size(stamp, width, height):
+    """A text stamp's font size in a ``width`` x ``height`` box: scaled with
+    the box, like its fill and border, but never stretched."""
+    _, _, box_width, box_height = stamp["placement"]
+    return stamp["font_size"] * min(width / box_width, height / box_height)
+
+
+def _text_origin(stamp, text, x_pos, y_pos, width, height):
+    """Start of the baseline for ``text`` aligned in the box, vertically centered."""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    font_size = _font_size(stamp, width, height)
+    text_width = stringWidth(text, TEXT_FONT, font_size)
+    if stamp["align"] == "left":
+        text_x = x_pos + _TEXT_PADDING
+    elif stamp["align"] == "right":
+        text_x = x_pos + width - _TEXT_PADDING - text_width
+    else:
+        text_x = x_pos + (width - text_width) / 2
+    return text_x, y_pos + (height - font_size * _CAP_HEIGHT) / 2
+
+
+def _pdf_string(text):
+    """``text`` as a WinAnsi-encoded PDF literal string, in plain ASCII."""
+    chars = []
+    for byte in text.encode("cp1252", "replace"):
+        if chr(byte) in "\\()":
+            chars.append("\\" + chr(byte))
+        elif 32 <= byte < 127:
+            chars.append(chr(byte))
         else:
-            pages_to_process = [int(p.strip())-1 for p in page_range.split(',') 
-                              if 0 <= int(p.strip())-1 < num_pages]
-    except:
-        st.error("Invalid page range format")
-        st.stop()
-    
-    return pages_to_process
+            chars.append(f"\\{byte:03o}")
+    return "(" + "".join(chars) + ")"
+
+
+def _text_ops(stamp, text, font_name, x_pos, y_pos, width, height):
+    """The per-page content drawing ``text`` in the box at (x_pos, y_pos)."""
+    text_x, text_y = _text_origin(stamp, text, x_pos, y_pos, width, height)
+    red, green, blue = _rgb(stamp["color"])
+    return (f"BT {font_name} {_font_size(stamp, width, height):.2f} Tf {red:.4f} {green:.4f} {blue:.4f} rg "
+            f"{text_x:.4f} {text_y:.4f} Td {_pdf_string(text)} Tj ET\n")
+
+
+def _text_box_ops(stamp):
+    """Content for the static part of a text stamp (fill and border), in the box's
+    own coordinates on the reference page; empty if it has neither."""
+    _, _, width, height = stamp["placement"]
+    ops = ""
+    if stamp["fill"]:
+        ops += "{:.4f} {:.4f} {:.4f} rg 0 0 {:.4f} {:.4f} re f\n".format(*_rgb(stamp["fill"]), width, height)
+    if stamp["border"]:
+        ops += "{:.4f} {:.4f} {:.4f} RG 1 w 0.5 0.5 {:.4f} {:.4f} re S\n".format(
+            *_rgb(stamp["border"]), width - 1, height - 1)
+    return ops
+
+
+def stamp_box(stamp, page_size, reference_size):
+    """(x, y, width, height) of ``stamp`` in the visible space of a page of
+    ``page_size`` (see utils.page_geometry), in points.
+
+    Background stamps fill the page; otherwise the placement chosen on the
+    reference (first) page is scaled proportionally to this page's size.
+    """
+    current_page_width, current_page_height = page_size
+    if stamp["background"]:
+        return 0, 0, current_page_width, current_page_height
+    x_pos, y_pos, image_width, image_height = stamp["placement"]
+    width_ratio = current_page_width / reference_size[0]
+    height_ratio = current_page_height / reference_size[1]
+    return x_pos * width_ratio, y_pos * height_ratio, image_width * width_ratio, image_height * height_ratio
+
+
+def _stamp_placements(stamps, geometry):
+    """A function (stamp index, page index) -> (box in visible space, matrix to
+    user space), computed once per stamp and page geometry class."""
+    reference_size = geometry.visible_size(0)
+    placements = {}
+
+    def placement(k, i):
+        key = (k, geometry.page_class(i))
+        if key not in placements:
+            placements[key] = (
+                stamp_box(stamps[k], geometry.visible_size(i), reference_size),
+                geometry.to_user(i),
+            )
+        return placements[key]
+
+    return placement
+
+
+def _cm(matrix):
+    return " ".join(f"{value:.4f}" for value in matrix) + " cm"
+
+
+def _stamps_by_page(stamps, num_pages):
+    """{page index: [stamp indices]} for every page that gets a stamp, in page order."""
+    by_page = {}
+    for index, stamp in enumerate(stamps):
+        for i in stamp["pages"]:
+            if 0 <= i < num_pages:
+                by_page.setdefault(i, []).append(index)
+    return dict(sorted(by_page.items()))
+
+
+def _unique_images(stamps):
+    """Decode each distinct stamp image once: ([PIL images], [image index per stamp, None for text])."""
+    images, index_of, image_indices = [], {}, []
+    for stamp in stamps:
+        if stamp["kind"] != "image":
+            image_indices.append(None)
+            continue
+        stamp["image"].seek(0)
+        data = stamp["image"].read()
+        if data not in index_of:
+            index_of[data] = len(images)
+            images.append(Image.open(BytesIO(data)))
+        image_indices.append(index_of[data])
+    return images, image_indices
 
 
 def process_pdf(pdf_file, image_file, pages_to_process, num_pages,
-                is_background, image_width, image_height, x_pos, y_pos):
+                is_background, image_width, image_height, x_pos, y_pos, linearize=False):
     """Process the PDF and add image overlay"""
-    # Reload image for processing
-    image_file.seek(0)
-    img = Image.open(image_file)
-
-    # Save image temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_img:
-        img.save(tmp_img.name, 'PNG')
-        tmp_img_path = tmp_img.name
-
-    # Process PDF
-    reader = PdfReader(pdf_file)
-    writer = PdfWriter()
-
-    # Reference page size used when the stamp was positioned in the preview,
-    # so positions scale proportionally on pages with different dimensions.
-    reference_page = reader.pages[0]
-    reference_width = float(reference_page.mediabox.width)
-    reference_height = float(reference_page.mediabox.height)
-
-    for i in range(num_pages):
-        page = reader.pages[i]
+    stamp = make_stamp(image_file, pages_to_process, is_background, image_width, image_height, x_pos, y_pos)
+    return stamp_pdf(pdf_file, [stamp], num_pages, linearize=linearize)
 
-        # Get actual page dimensions
-        current_page_width = float(page.mediabox.width)
-        current_page_height = float(page.mediabox.height)
-        current_page_size = (current_page_width, current_page_height)
-
-        # Only add image to selected pages
-        if i in pages_to_process:
-            if is_background:
-                page_x_pos = 0
-                page_y_pos = 0
-                img_width = current_page_width
-                img_height = current_page_height
-            else:
-                width_ratio = current_page_width / reference_width
-                height_ratio = current_page_height / reference_height
-                page_x_pos = x_pos * width_ratio
-                page_y_pos = y_pos * height_ratio
-                img_width = image_width * width_ratio
-                img_height = image_height * height_ratio
-            
-            # Create image layer
-            packet = BytesIO()
-            can = canvas.Canvas(packet, pagesize=current_page_size)
-            can.drawImage(tmp_img_path, page_x_pos, page_y_pos,
-                        width=img_width, height=img_height,
-                        mask='auto')
-            can.save()
-            packet.seek(0)
-            
-            # Merge based on layer mode
-            image_layer = PdfReader(packet)
-            if is_background:
-                image_page = image_layer.pages[0]
-                image_page.merge_page(page)
-                writer.add_page(image_page)
-            else:
-                page.merge_page(image_layer.pages[0])
+
+def stamp_pdf(pdf_file, stamps, num_pages, linearize=False, geometry=None):
+    """Apply every stamp with PyPDF2 + ReportLab: each stamped page gets a
+    ReportLab layer above and/or below its content, drawing that page's
+    images and text boxes. A layer is built once, as a Form XObject, and
+    every page with the same stamps at the same size shows that same object.
+    Text, which can change from page to page, is not drawn by ReportLab: each
+    page gets its lines as a small content stream of its own, using one
+    shared font.
+
+    ``geometry`` is the document's PageGeometry, if already known.
+    """
+    from PyPDF2 import PdfReader, PdfWriter
+
+    # Save each distinct image temporarily
+    images, image_indices = _unique_images(stamps)
+    image_paths = []
+    try:
+        for img in images:
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_img:
+                img.save(tmp_img.name, 'PNG')
+                image_paths.append(tmp_img.name)
+
+        # Process PDF
+        with span("parse"):
+            reader = PdfReader(pdf_file)
+        writer = PdfWriter()
+        if geometry is None:
+            geometry = PageGeometry.from_reader(reader)
+        placement = _stamp_placements(stamps, geometry)
+
+        by_page = _stamps_by_page(stamps, num_pages)
+        texts = _stamp_texts(stamps, num_pages)
+        built_layers = {}  # (page size, what's drawn where) -> Form XObject
+        stamp_layers = _StampLayers(writer)
+        for i in range(num_pages):
+            report_progress(i, num_pages, "page")
+            page = reader.pages[i]
+
+            # Only add images to selected pages
+            if i not in by_page:
                 writer.add_page(page)
-        else:
-            writer.add_page(page)
-    
-    # Create output PDF
-    output = BytesIO()
-    writer.write(output)
-    output.seek(0)
-    
-    # Clean up temp file
-    os.unlink(tmp_img_path)
-    
-    return output
\ No newline at end of file
+                continue
+
+            # Background layers go under the page's content, overlay layers
+            # and text on top of it.
+            below, above = [], []
+            page_size = (float(page.mediabox.width), float(page.mediabox.height))
+            for is_background in (False, True):
+                drawn = tuple(
+                    (k, *placement(k, i)) for k in by_page[i]
+                    if stamps[k]["background"] == is_background
+                    and (texts[k] is None or _text_box_ops(stamps[k]))
+                )
+                if not drawn:
+                    continue
+                key = (page_size, drawn)
+                if key not in built_layers:
+                    with span("build_layer"):
+                        built_layers[key] = stamp_layers.form(_reportlab_layer(page_size, [
+                            (stamps[k], None if texts[k] is not None else image_paths[image_indices[k]], box, to_user)
+                            for k, box, to_user in drawn
+                        ]), [(box, to_user) for _, box, to_user in drawn])
+                name = _add_resource(page, "/XObject", built_layers[key], "/PdfToolsStamp")
+                (below if is_background else above).append(f"{name} Do\n")
+
+            with span("merge_page"):
+                placed_texts = [
+                    (stamps[k], texts[k][i], *placement(k, i)) for k in by_page[i] if texts[k] is not None
+                ]
+                if placed_texts:
+                    font_name = _add_resource(page, "/Font", stamp_layers.font(), "/PdfToolsFont")
+                    above.extend(f"q {_cm(to_user)}\n" + _text_ops(stamp, text, font_name, *box) + "Q\n"
+                                 for stamp, text, box, to_user in placed_texts)
+                stamp_layers.add(page, "".join(below), "".join(above))
+                writer.add_page(page)
+
+        # Create output PDF
+        with span("write"):
+            return write_pdf(writer.write, linearize)
+    finally:
+        # Clean up temp files (also when the job is cancelled mid-way)
+        for tmp_img_path in image_paths:
+            os.unlink(tmp_img_path)
+
+
+def _reportlab_layer(page_size, placed_stamps):
+    """A one-page PDF of ``page_size`` with the given stamps' images and text
+    boxes drawn on it.
+
+    Each comes with its image path (None for a text stamp), its box in
+    visible space and the page's matrix from visible to user space.
+    """
+    from PyPDF2 import PdfReader
+    from reportlab.pdfgen import canvas
+
+    packet = BytesIO()
+    can = canvas.Canvas(packet, pagesize=page_size)
+    for stamp, image_path, (page_x_pos, page_y_pos, img_width, img_height), to_user in placed_stamps:
+        can.saveState()
+        can.transform(*to_user)
+        if stamp["kind"] == "image":
+            can.drawImage(image_path, page_x_pos, page_y_pos,
+                          width=img_width, height=img_height,
+                          mask='auto')
+            can.restoreState()
+            continue
+        _, _, box_width, box_height = stamp["placement"]
+        can.translate(page_x_pos, page_y_pos)
+        can.scale(img_width / box_width, img_height / box_height)
+        if stamp["fill"]:
+            can.setFillColorRGB(*_rgb(stamp["fill"]))
+            can.rect(0, 0, box_width, box_height, stroke=0, fill=1)
+        if stamp["border"]:
+            can.setStrokeColorRGB(*_rgb(stamp["border"]))
+            can.setLineWidth(1)
+            can.rect(0.5, 0.5, box_width - 1, box_height - 1, stroke=1, fill=0)
+        can.restoreState()
+    can.save()
+    packet.seek(0)
+    return PdfReader(packet).pages[0]
+
+
+class _StampLayers:
+    """Stamps for pages going into ``writer``, added to each page as content
+    streams around its own: ReportLab layers become shared Form XObjects, and
+    text stamps' lines share one font object. Streams that are the same on
+    several pages are written once."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self._font = None
+        self._streams = {}
+
+    def _stream(self, data):
+        from PyPDF2.generic import DecodedStreamObject
+
+        if data not in self._streams:
+            stream = DecodedStreamObject()
+            stream.set_data(data)
+            self._streams[data] = self.writer._add_object(stream)
+        return self._streams[data]
+
+    def font(self):
+        """The shared font for text stamps."""
+        from PyPDF2.generic import DictionaryObject, NameObject
+
+        if self._font is None:
+            self._font = self.writer._add_object(DictionaryObject({
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/" + TEXT_FONT),
+                NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+            }))
+        return self._font
+
+    def form(self, layer, boxes):
+        """A ReportLab ``layer`` page as a Form XObject, clipped to the
+        (box in visible space, matrix to user space) it draws in."""
+        from PyPDF2.generic import ArrayObject, FloatObject, NameObject, StreamObject
+
+        corners = [apply(to_user, x, y) for (x_pos, y_pos, width, height), to_user in boxes
+                   for x in (x_pos, x_pos + width) for y in (y_pos, y_pos + height)]
+        xs, ys = [x for x, _ in corners], [y for _, y in corners]
+        content = StreamObject()
+        content._data = layer.get_contents().get_data()
+        form = content.flate_encode()  # only keeps /Filter: the form's entries go on after
+        form.update({
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Form"),
+            NameObject("/BBox"): ArrayObject([FloatObject(min(xs) - 1), FloatObject(min(ys) - 1),
+                                              FloatObject(max(xs) + 1), FloatObject(max(ys) + 1)]),
+            NameObject("/Resources"): layer["/Resources"].clone(self.writer),
+        })
+        return self.writer._add_object(form)
+
+    def add(self, page, below, above):
+        """Put the content ``below`` under ``page``'s own and ``above`` on top of it."""
+        from PyPDF2.generic import ArrayObject, NameObject
+
+        contents = _content_refs(page)
+        if above:
+            # The page's content is wrapped in q/Q so its graphics state can't leak into the stamps.
+            contents = [self._stream(b"q\n")] + contents + [self._stream(("Q\n" + above).encode())]
+        if below:
+            contents = [self._stream(below.encode())] + contents
+        page[NameObject("/Contents")] = ArrayObject(contents)
+
+
+def stamp_pdf_pymupdf(pdf_file, stamps, num_pages, linearize=False, geometry=None):
+    """Apply every stamp with PyMuPDF: each distinct image is embedded once
+    and every page it goes on shows that same image object, either on top of
+    or behind the page's content. A text stamp's box is one shared Form
+    XObject; each page only gets its line of text. The content of untouched
+    pages is never parsed.
+
+    ``geometry`` is the document's PageGeometry, if already known.
+    """
+    import fitz  # PyMuPDF
+
+    with span("build_layer"):
+        images, image_indices = _unique_images(stamps)
+        pngs = []
+        for img in images:
+            png = BytesIO()
+            img.save(png, "PNG")
+            pngs.append(png.getvalue())
+        boxes = {k: _text_box_pdf(stamp) for k, stamp in enumerate(stamps)
+                 if stamp["kind"] == "text" and _text_box_ops(stamp)}
+
+    with span("parse"):
+        document = _open_with_pymupdf(pdf_file)
+    try:
+        if geometry is None:
+            geometry = PageGeometry.from_fitz(document)
+        placement = _stamp_placements(stamps, geometry)
+
+        image_xrefs = [0] * len(images)
+        by_page = _stamps_by_page(stamps, num_pages)
+        texts = _stamp_texts(stamps, num_pages)
+        for done, (i, page_stamps) in enumerate(by_page.items()):
+            report_progress(done, len(by_page), "page")
+            page = document[i]
+            # Background images are inserted beneath everything inserted before
+            # them, so insert those last-first to keep the set's order.
+            ordered = [k for k in page_stamps if not stamps[k]["background"]]
+            ordered += [k for k in reversed(page_stamps) if stamps[k]["background"]]
+            # PyMuPDF turns inserted content by the page's rotation itself.
+            rotate = geometry.rotation(i)
+            for k in ordered:
+                (page_x_pos, page_y_pos, img_width, img_height), to_user = placement(k, i)
+                # Visible space to PDF user space, then to PyMuPDF's (unrotated) page space.
+                corners = [apply(to_user, page_x_pos, page_y_pos),
+                           apply(to_user, page_x_pos + img_width, page_y_pos + img_height)]
+                rect = fitz.Rect(*(min(values) for values in zip(*corners)), *(max(values) for values in zip(*corners)))
+                rect = rect * page.transformation_matrix
+                overlay = not stamps[k]["background"]
+
+                if texts[k] is not None:
+                    with span("merge_page"):
+                        text = texts[k][i]
+                        origin = _text_origin(stamps[k], text, page_x_pos, page_y_pos, img_width, img_height)
+                        # Inserted beneath: text first, so the box ends up under it.
+                        if k in boxes and overlay:
+                            page.show_pdf_page(rect, boxes[k], 0, keep_proportion=False, rotate=rotate)
+                        # insert_text measures from the CropBox's top-left corner even on
+                        # rotated pages, where transformation_matrix doesn't.
+                        crop_x0, _, _, crop_y1 = geometry.crop_box(i)
+                        user_x, user_y = apply(to_user, *origin)
+                        page.insert_text(fitz.Point(user_x - crop_x0, crop_y1 - user_y), text,
+                                         fontsize=_font_size(stamps[k], img_width, img_height), fontname="helv",
+                                         color=_rgb(stamps[k]["color"]), overlay=overlay, rotate=rotate)
+                        if k in boxes and not overlay:
+                            page.show_pdf_page(rect, boxes[k], 0, keep_proportion=False, overlay=False, rotate=rotate)
+                    continue
+
+                image = image_indices[k]
+                with span("merge_page"):
+                    image_xrefs[image] = page.insert_image(
+                        rect,
+                        stream=None if image_xrefs[image] else pngs[image],
+                        xref=image_xrefs[image],
+                        keep_proportion=False,
+                        overlay=not stamps[k]["background"],
+                        rotate=rotate,
+                    )
+
+        # When linearizing, pikepdf compresses the streams as it writes the output.
+        with span("write"):
+            return write_pdf(lambda stream: document.save(stream, deflate=not linearize), linearize)
+    finally:
+        document.close()
+
+
+def _text_box_pdf(stamp):
+    """A one-page PyMuPDF document holding a text stamp's static box, to be
+    shown on each page as a Form XObject."""
+    import fitz  # PyMuPDF
+
+    _, _, width, height = stamp["placement"]
+    document = fitz.open()
+    page = document.new_page(width=width, height=height)
+    contents = document.get_new_xref()
+    document.update_object(contents, "<<>>")
+    document.update_stream(contents, _text_box_ops(stamp).encode())
+    document.xref_set_key(page.xref, "Contents", f"{contents} 0 R")
+    return document
+
+
+def _open_with_pymupdf(pdf_file):
+    """Open a PDF file object with PyMuPDF without reading it into a new buffer."""
+    import fitz  # PyMuPDF
+
+    # A spooled upload is a buffered reader over its temp file: open the path.
+    path = getattr(getattr(pdf_file, "raw", None), "name", None)
+    if isinstance(path, str):
+        return fitz.open(path, filetype="pdf")
+    if isinstance(pdf_file, BytesIO):
+        return fitz.open(stream=pdf_file, filetype="pdf")
+    pdf_file.seek(0)
+    return fitz.open(stream=pdf_file.read(), filetype="pdf")
+
+
+# Stamping engines taking (pdf_file, stamps, num_pages, linearize, geometry), by the name shown in the UI.
+OVERLAY_BACKENDS = {
+    "PyMuPDF": stamp_pdf_pymupdf,
+    "PyPDF2 + ReportLab": stamp_pdf,
+}
+
+
+def process_pdf_incremental(pdf_file, image_file, pages_to_process,
+                            is_background, image_width, image_height, x_pos, y_pos):
+    """Stamp one image on the selected pages as an incremental update."""
+    stamp = make_stamp(image_file, pages_to_process, is_background, image_width, image_height, x_pos, y_pos)
+    return stamp_pdf_incremental(pdf_file, [stamp])
+
+
+def stamp_pdf_incremental(pdf_file, stamps, geometry=None):
+    """Apply every stamp by appending an incremental update to the PDF.
+
+    The original bytes are copied unchanged and followed by one image XObject
+    per distinct image, one Form XObject per text stamp box, the stamped
+    pages' updated dictionaries and their new content streams, so the write
+    cost grows with the number of stamped pages and existing signatures stay
+    valid for the original revision.
+
+    ``geometry`` is the document's PageGeometry, if already known.
+    """
+    from PyPDF2 import PdfReader
+    from PyPDF2.generic import ArrayObject, DictionaryObject, FloatObject, NameObject
+
+    with span("parse"):
+        pdf_file.seek(0)
+        reader = PdfReader(pdf_file)
+    num_pages = len(reader.pages)
+    if reader.is_encrypted:
+        # An encrypted file can't be appended to; rewrite it as the default mode does.
+        return stamp_pdf(pdf_file, stamps, num_pages, geometry=geometry)
+    update = IncrementalUpdate(reader, pdf_file)
+
+    with span("build_layer"):
+        images, image_indices = _unique_images(stamps)
+        image_refs = [_add_image_xobject(update, img) for img in images]
+        font_ref = None
+        box_refs = {}
+        for k, stamp in enumerate(stamps):
+            if stamp["kind"] != "text":
+                continue
+            if font_ref is None:
+                font_ref = update.add(DictionaryObject({
+                    NameObject("/Type"): NameObject("/Font"),
+                    NameObject("/Subtype"): NameObject("/Type1"),
+                    NameObject("/BaseFont"): NameObject("/" + TEXT_FONT),
+                    NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+                }))
+            box_ops = _text_box_ops(stamp)
+            if box_ops:
+                _, _, width, height = stamp["placement"]
+                box_refs[k] = update.add_stream(box_ops.encode(), {
+                    NameObject("/Type"): NameObject("/XObject"),
+                    NameObject("/Subtype"): NameObject("/Form"),
+                    NameObject("/BBox"): ArrayObject([FloatObject(0), FloatObject(0),
+                                                      FloatObject(width), FloatObject(height)]),
+                }, compress=False)
+
+    if geometry is None:
+        geometry = PageGeometry.from_reader(reader)
+    placement = _stamp_placements(stamps, geometry)
+
+    # The page's own content is wrapped in q/Q so its graphics state can't
+    # leak into an overlay; streams are shared between pages where identical.
+    save_state = None
+    layers = {}
+
+    def layer(ops):
+        if ops not in layers:
+            layers[ops] = update.add_stream(ops.encode(), compress=False)
+        return layers[ops]
+
+    by_page = _stamps_by_page(stamps, num_pages)
+    texts = _stamp_texts(stamps, num_pages)
+    for done, (i, page_stamps) in enumerate(by_page.items()):
+        report_progress(done, len(by_page), "page")
+        page = reader.pages[i]
+
+        with span("merge_page"):
+            names = {}
+
+            def resource_name(key, category, ref, prefix):
+                if key not in names:
+                    names[key] = _add_resource(page, category, ref, prefix)
+                return names[key]
+
+            below, above = [], []
+            for k in page_stamps:
+                (page_x_pos, page_y_pos, img_width, img_height), to_user = placement(k, i)
+                if texts[k] is None:
+                    name = resource_name(("image", image_indices[k]), "/XObject", image_refs[image_indices[k]],
+                                         "/PdfToolsStamp")
+                    matrix = concat((img_width, 0, 0, img_height, page_x_pos, page_y_pos), to_user)
+                    ops = f"q {_cm(matrix)} {name} Do Q\n"
+                else:
+                    ops = f"q {_cm(to_user)}\n"
+                    if k in box_refs:
+                        name = resource_name(("box", k), "/XObject", box_refs[k], "/PdfToolsStamp")
+                        _, _, box_width, box_height = stamps[k]["placement"]
+                        ops += (f"q {img_width / box_width:.4f} 0 0 {img_height / box_height:.4f} "
+                                f"{page_x_pos:.4f} {page_y_pos:.4f} cm {name} Do Q\n")
+                    font_name = resource_name("font", "/Font", font_ref, "/PdfToolsFont")
+                    ops += _text_ops(stamps[k], texts[k][i], font_name, page_x_pos, page_y_pos, img_width, img_height)
+                    ops += "Q\n"
+                (below if stamps[k]["background"] else above).append(ops)
+
+            contents = _content_refs(page)
+            if above:
+                if save_state is None:
+                    save_state = update.add_stream(b"q\n", compress=False)
+                contents = [save_state] + contents + [layer("Q\n" + "".join(above))]
+            if below:
+                contents = [layer("".join(below))] + contents
+            page[NameObject("/Contents")] = ArrayObject(contents)
+            update.update(page.indirect_reference, page)
+
+    with span("write"):
+        output = BytesIO()
+        update.write(output)
+        output.seek(0)
+    return output
+
+
+def _content_refs(page):
+    """The page's content streams as a list of references."""
+    contents = page.raw_get("/Contents") if "/Contents" in page else None
+    if contents is None:
+        return []
+    resolved = contents.get_object()
+    if isinstance(resolved, list):
+        return list(resolved)
+    return [contents]
+
+
+def _add_resource(page, category, ref, prefix):
+    """Register ``ref`` in the page's ``category`` resources (/XObject, /Font)
+    under an unused name starting with ``prefix``; returns the name."""
+    from PyPDF2.generic import DictionaryObject, NameObject
+
+    # Copies, so resource dictionaries shared with other pages stay untouched;
+    # their entries still point at the original objects.
+    resources = page.raw_get("/Resources").get_object() if "/Resources" in page else {}
+    resources = DictionaryObject(resources)
+    entries = resources.raw_get(category).get_object() if category in resources else {}
+    entries = DictionaryObject(entries)
+
+    name, suffix = prefix, 0
+    while name in entries:
+        suffix += 1
+        name = f"{prefix}{suffix}"
+    entries[NameObject(name)] = ref
+    resources[NameObject(category)] = entries
+    page[NameObject("/Resources")] = resources
+    return name
+
+
+def _add_image_xobject(update, img):
+    """Add ``img`` to the update as an image XObject, with an SMask for transparency."""
+    from PyPDF2.generic import NameObject, NumberObject
+
+    # Taken before the alpha split, which converts a grayscale image to RGBA.
+    gray = img.mode in ("1", "L", "LA")
+    alpha = None
+    if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+        img = img.convert("RGBA")
+        alpha = img.getchannel("A")
+        if alpha.getextrema() == (255, 255):
+            alpha = None
+    img = img.convert("L" if gray else "RGB")
+
+    def entries(image, colorspace):
+        return {
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Image"),
+            NameObject("/Width"): NumberObject(image.width),
+            NameObject("/Height"): NumberObject(image.height),
+            NameObject("/ColorSpace"): NameObject(colorspace),
+            NameObject("/BitsPerComponent"): NumberObject(8),
+        }
+
+    image_entries = entries(img, "/DeviceGray" if img.mode == "L" else "/DeviceRGB")
+    if alpha is not None:
+        image_entries[NameObject("/SMask")] = update.add_stream(alpha.tobytes(), entries(alpha, "/DeviceGray"))
+    return update.add_stream(img.tobytes(), image_entries)
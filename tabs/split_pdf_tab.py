@@ -20,10 +20,18 @@ modules like pdf_merger.py), then in app.py:
 """
 
 import io
+import re
 import zipfile
 
 import streamlit as st
-from PyPDF2 import PdfReader, PdfWriter
+
+from utils.instrumentation import span
+from utils.jobs import render_job, report_progress, submit_job
+from utils.metrics import track_operation
+from utils.page_selection import PageSelectionError, compile_pages
+from utils.pdf_output import fast_web_view_checkbox, write_pdf
+from utils.result_cache import result_cache_key
+from utils.uploads import spool_upload
 
 
 def render():
@@ -36,9 +44,14 @@ def render():
         st.info("Upload a PDF to get started.")
         return
 
-    reader = PdfReader(uploaded_pdf)
-    total_pages = len(reader.pages)
-    st.success(f"Loaded **{uploaded_pdf.name}** — {total_pages} page(s).")
+    # Imported on first use so the app starts without loading PyPDF2.
+    from PyPDF2 import PdfReader
+
+    upload = spool_upload(uploaded_pdf, "split_pdf_uploader")
+    with span("parse"), upload.open() as pdf_file:
+        reader = PdfReader(pdf_file)
+        total_pages = len(reader.pages)
+    st.success(f"Loaded **{upload.name}** — {total_pages} page(s).")
 
     split_mode = st.radio(
         "Split mode",
@@ -46,7 +59,7 @@ def render():
         horizontal=True,
     )
 
-    file_groups = []  # list of (label, [page_indices])
+    file_groups = []  # list of (label, page indices: a list, range or PageSelection)
 
     if split_mode == "Every N pages":
         pages_per_split = st.number_input(
@@ -56,46 +69,24 @@ def render():
             value=min(2, total_pages),
             step=1,
         )
-        for start in range(0, total_pages, pages_per_split):
-            end = min(start + pages_per_split, total_pages)
-            label = f"pages_{start + 1}-{end}"
-            file_groups.append((label, list(range(start, end))))
+        file_groups = every_n_groups(total_pages, pages_per_split)
 
     elif split_mode == "Custom page ranges":
-        st.caption('Enter one range per line, e.g. "1-2", "3-4", "5" (1-indexed, inclusive).')
+        st.caption('Enter one file per line, e.g. "1-2", "3-4", "5", "6-8,12", "10-" or "odd" '
+                   '(1-indexed, inclusive).')
         ranges_text = st.text_area(
             "Page ranges",
             value="1-2\n3-4" if total_pages >= 4 else f"1-{total_pages}",
             height=120,
         )
-        parse_error = None
-        for line in ranges_text.splitlines():
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                if "-" in line:
-                    start_str, end_str = line.split("-", 1)
-                    start_p, end_p = int(start_str), int(end_str)
-                else:
-                    start_p = end_p = int(line)
-
-                if start_p < 1 or end_p > total_pages or start_p > end_p:
-                    raise ValueError
-
-                label = f"pages_{start_p}-{end_p}" if start_p != end_p else f"page_{start_p}"
-                file_groups.append((label, list(range(start_p - 1, end_p))))
-            except ValueError:
-                parse_error = f"Invalid range: '{line}'"
-                break
-
-        if parse_error:
-            st.error(parse_error + f" — page numbers must be between 1 and {total_pages}.")
+        try:
+            file_groups = custom_groups(ranges_text.splitlines(), total_pages)
+        except PageSelectionError as error:
+            st.error(f"Invalid range: {error}")
             return
 
     else:  # Every page
-        for i in range(total_pages):
-            file_groups.append((f"page_{i + 1}", [i]))
+        file_groups = every_page_groups(total_pages)
 
     if not file_groups:
         st.warning("No valid page groups to split.")
@@ -104,29 +95,97 @@ def render():
     st.write(f"This will produce **{len(file_groups)}** file(s):")
     st.write(", ".join(label for label, _ in file_groups))
 
+    fast_web_view = fast_web_view_checkbox(key="split_fast_web_view")
+
     if st.button("Split & Prepare ZIP", type="primary"):
-        with st.spinner("Splitting PDF..."):
-            zip_buffer = io.BytesIO()
-            base_name = uploaded_pdf.name.rsplit(".", 1)[0]
+        base_name = upload.name.rsplit(".", 1)[0]
+        # The base name is in the key because it names the files inside the ZIP.
+        cache_key = result_cache_key("split", [upload.sha256], {
+            "groups": [(label, list(pages)) for label, pages in file_groups],
+            "base_name": base_name,
+            "fast_web_view": fast_web_view,
+        })
+
+        def split():
+            with track_operation("split", bytes_in=upload.size) as op, span("split_pdf"), upload.open() as job_pdf:
+                zip_buffer = split_pdf(PdfReader(job_pdf), file_groups, base_name, fast_web_view)
+                op.bytes_out = zip_buffer.getbuffer().nbytes
+            return {"zip": zip_buffer}
+
+        submit_job("split", "split", split, bytes_in=upload.size, cache_key=cache_key,
+                   meta={"files": len(file_groups), "base_name": base_name})
+
+    job = render_job("split", label="Splitting PDF", error_message="Split failed")
+    if job is not None:
+        st.success(f"Done! {job.meta['files']} file(s) ready.")
+        st.download_button(
+            label="⬇️ Download ZIP",
+            data=job.result["zip"],
+            file_name=f"{job.meta['base_name']}_split.zip",
+            mime="application/zip",
+        )
 
-            with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-                for label, page_indices in file_groups:
-                    writer = PdfWriter()
-                    for idx in page_indices:
-                        writer.add_page(reader.pages[idx])
 
-                    pdf_bytes = io.BytesIO()
-                    writer.write(pdf_bytes)
-                    pdf_bytes.seek(0)
+def every_n_groups(total_pages, pages_per_split):
+    """(label, pages) groups of ``pages_per_split`` consecutive pages."""
+    file_groups = []
+    for start in range(0, total_pages, pages_per_split):
+        end = min(start + pages_per_split, total_pages)
+        file_groups.append((f"pages_{start + 1}-{end}", range(start, end)))
+    return file_groups
 
-                    zf.writestr(f"{base_name}_{label}.pdf", pdf_bytes.read())
 
-            zip_buffer.seek(0)
+def custom_groups(lines, total_pages):
+    """A (label, pages) group per non-empty line of page selections.
 
-        st.success(f"Done! {len(file_groups)} file(s) ready.")
-        st.download_button(
-            label="⬇️ Download ZIP",
-            data=zip_buffer,
-            file_name=f"{base_name}_split.zip",
-            mime="application/zip",
-        )
+    Raises PageSelectionError for a malformed line, pages past the end or a
+    line that selects nothing.
+    """
+    file_groups = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        pages = compile_pages(line, total_pages, strict=True)
+        if not pages:
+            raise PageSelectionError(f"'{line}' selects no pages")
+        file_groups.append((_group_label(line, pages), pages))
+    return file_groups
+
+
+def every_page_groups(total_pages):
+    """One (label, [page]) group per page."""
+    return [(f"page_{i + 1}", [i]) for i in range(total_pages)]
+
+
+def _group_label(line, pages):
+    """File label for a custom range: "page_5", "pages_1-3" or e.g. "pages_odd"."""
+    if len(pages) == 1:
+        return f"page_{next(iter(pages)) + 1}"
+    return "pages_" + re.sub(r"[^0-9a-z-]+", "_", line.lower()).strip("_")
+
+
+def split_pdf(reader, file_groups, base_name, linearize=False):
+    """Write each (label, page_indices) group as its own PDF into a ZIP.
+
+    Returns the ZIP as a BytesIO positioned at the start.
+    """
+    from PyPDF2 import PdfWriter
+
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for group_idx, (label, page_indices) in enumerate(file_groups):
+            report_progress(group_idx, len(file_groups), "file")
+            with span("add_pages"):
+                writer = PdfWriter()
+                for idx in page_indices:
+                    writer.add_page(reader.pages[idx])
+
+            with span("write"):
+                pdf_bytes = write_pdf(writer.write, linearize)
+
+            with span("zip"):
+                zf.writestr(f"{base_name}_{label}.pdf", pdf_bytes.read())
+
+    zip_buffer.seek(0)
+    return zip_buffer
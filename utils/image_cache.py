@@ -0,0 +1,193 @@
+# utils/image_cache.py
+"""Disk-backed, content-addressed cache of recompressed image streams.
+
+Batches of documents tend to share the same letterheads, logos and stamp
+scans. The compressor looks each image up here by a hash of its source
+stream plus the encode settings, so an image that was already recompressed
+in an earlier job (in any session) is reused instead of decoded and encoded
+again.
+
+Entries are ``<key>.bin`` files holding an 8-byte (width, height) header
+followed by the encoded bytes. Total size is capped; the least recently
+used entries (by file mtime, bumped on every hit) are evicted first.
+"""
+import hashlib
+import os
+import struct
+import tempfile
+import threading
+
+from utils.metrics import REGISTRY
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "pdf_tools_image_cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+_HEADER = struct.Struct(">II")
+
+# Keys of an image dictionary that change what its stream decodes to.
+_DECODE_KEYS = (
+    "/Width", "/Height", "/BitsPerComponent", "/ColorSpace",
+    "/Filter", "/DecodeParms", "/Decode", "/ImageMask",
+)
+
+
+def _stable_bytes(obj, depth=0):
+    """Serialize a PDF value without object numbers, so equal content hashes equal."""
+    import pikepdf
+
+    if depth > 8:
+        return b"..."
+    if isinstance(obj, pikepdf.Stream):
+        return b"stream:" + hashlib.sha256(
+            obj.read_raw_bytes() + _stable_bytes(obj.stream_dict, depth + 1)
+        ).digest()
+    if isinstance(obj, pikepdf.Array):
+        return b"[" + b" ".join(_stable_bytes(item, depth + 1) for item in obj) + b"]"
+    if isinstance(obj, pikepdf.Dictionary):
+        return b"<<" + b" ".join(
+            key.encode() + b" " + _stable_bytes(obj[key], depth + 1)
+            for key in sorted(obj.keys()) if key != "/Length"
+        ) + b">>"
+    if isinstance(obj, pikepdf.Object):
+        return obj.unparse()
+    return repr(obj).encode()
+
+
+def image_source_hash(xobj, raw_bytes):
+    """Content hash of an image stream and the dictionary keys that affect decoding."""
+    digest = hashlib.sha256(raw_bytes)
+    for key in _DECODE_KEYS:
+        if key in xobj:
+            digest.update(key.encode() + _stable_bytes(xobj[key]))
+    return digest.hexdigest()
+
+
+def image_cache_key(source_hash, quality, max_dim, encoder):
+    """Cache key for one source image re-encoded with the given settings."""
+    return hashlib.sha256(
+        f"{source_hash}|q={quality}|max_dim={max_dim}|enc={encoder}".encode()
+    ).hexdigest()
+
+
+class ImageCache:
+    """Size-capped LRU of encoded image bytes, shared across sessions."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def _entries(self):
+        """(path, size, mtime) for every entry currently on disk."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".bin"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key):
+        """Return (encoded_bytes, (width, height)) or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        width, height = _HEADER.unpack_from(data)
+        return data[_HEADER.size:], (width, height)
+
+    def put(self, key, encoded, size):
+        """Store encoded bytes for ``key`` and evict old entries over the cap."""
+        entry_size = _HEADER.size + len(encoded)
+        if entry_size > self.max_bytes:
+            return
+
+        # Write to a temp name first so readers never see a partial entry.
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(*size))
+            f.write(encoded)
+        existed = os.path.exists(path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if not existed:
+                self._total_bytes += entry_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until under the cap. Caller holds the lock."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._total_bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._total_bytes <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Process-wide cache, configured by PDF_TOOLS_IMAGE_CACHE_DIR / _MB."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ImageCache(
+                directory=os.environ.get("PDF_TOOLS_IMAGE_CACHE_DIR", DEFAULT_CACHE_DIR),
+                max_bytes=int(os.environ.get("PDF_TOOLS_IMAGE_CACHE_MB", DEFAULT_MAX_BYTES // (1024 * 1024)))
+                * 1024 * 1024,
+            )
+            _register_metrics(_cache)
+        return _cache
+
+
+def _register_metrics(cache):
+    for field, metric_type, help_text in (
+        ("hits", "counter", "Recompressed-image cache hits."),
+        ("misses", "counter", "Recompressed-image cache misses."),
+        ("evictions", "counter", "Entries evicted from the image cache."),
+        ("hit_rate", "gauge", "Image cache hits / lookups since start."),
+        ("bytes", "gauge", "Bytes currently stored in the image cache."),
+        ("max_bytes", "gauge", "Configured image cache size limit."),
+    ):
+        name = f"pdf_tools_image_cache_{field}" + ("_total" if metric_type == "counter" else "")
+        REGISTRY.gauge(name, help_text, lambda field=field: cache.metrics()[field], metric_type)
@@ -0,0 +1,71 @@
+# utils/image_probe.py
+"""Image metadata read from file headers, and small previews, cached per upload.
+
+``Image.open`` only parses an image's header. Size, mode, format and
+the EXIF block (which carries the orientation in JPEGs) come from that
+without decoding any pixels, so ``probe_image`` costs a few hundred bytes of I/O
+however big the photo is.
+
+``preview_image`` decodes at display size. JPEGs use libjpeg's draft mode,
+which decodes at 1/2, 1/4 or 1/8 scale directly. The result is kept as
+encoded bytes, which Streamlit serves as-is.
+
+Both are kept in session memory (utils.session_memory) under the upload's
+content hash, so a rerun with the same files decodes nothing. An evicted
+entry is just computed again.
+"""
+from io import BytesIO
+
+from PIL import ExifTags, Image
+
+from utils.session_memory import session_memory
+
+PREVIEW_SIZE = 480  # px, longest side; about a quarter of a wide layout, at 2x
+_ORIENTATION = ExifTags.Base.Orientation
+
+
+def probe_image(upload):
+    """{"width", "height", "mode", "format", "orientation"} of an image upload, from its header.
+
+    ``orientation`` is the EXIF orientation tag: 1 (or missing) means stored upright.
+    """
+    name = f"image_probe:{upload.sha256}"
+    info = session_memory().get(name)
+    if info is None:
+        with upload.open() as image_file:
+            img = Image.open(image_file)
+            # Only EXIF that sits in the header: getexif() would decode a PNG to find a late eXIf chunk.
+            exif = Image.Exif()
+            if "exif" in img.info:
+                exif.load(img.info["exif"])
+            info = {
+                "width": img.width,
+                "height": img.height,
+                "mode": img.mode,
+                "format": img.format,
+                "orientation": exif.get(_ORIENTATION, 1),
+            }
+        session_memory().put(name, info, 200, "preview")
+    return info
+
+
+def preview_image(upload, size=PREVIEW_SIZE):
+    """PNG or JPEG bytes of the upload scaled to fit ``size`` px, pixels as stored."""
+    name = f"image_preview:{upload.sha256}:{size}"
+    preview = session_memory().get(name)
+    if preview is None:
+        with upload.open() as image_file:
+            img = Image.open(image_file)
+            img.draft("RGB", (size, size))
+            img.thumbnail((size, size))
+            transparent = img.mode in ("RGBA", "LA", "P")
+            if img.mode not in ("RGB", "L", "RGBA", "LA", "P"):
+                img = img.convert("RGB")
+            buffer = BytesIO()
+            if transparent:
+                img.save(buffer, format="PNG")
+            else:
+                img.save(buffer, format="JPEG", quality=85)
+            preview = buffer.getvalue()
+        session_memory().put(name, preview, len(preview), "preview")
+    return preview
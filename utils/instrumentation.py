@@ -0,0 +1,152 @@
+# utils/instrumentation.py
+"""Lightweight per-stage timing and memory instrumentation.
+
+Code marks its stages with ``with span("parse"):``. Spans only record
+anything while a Profiler is active for the current run (it is held in a
+ContextVar, so concurrent sessions don't see each other's profilers);
+otherwise ``span`` returns a shared no-op context manager and costs one
+ContextVar lookup.
+
+Each span records wall time, CPU time of the running thread and the
+tracemalloc peak above its starting allocation. Repeated spans with the
+same path (e.g. one ``build_layer`` per page) are aggregated. Memory
+tracing slows allocation-heavy code several times over, so it is a separate
+opt-in; it is also process-wide, so memory figures can include allocations
+made by other sessions running at the same time.
+"""
+import contextvars
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import streamlit as st
+
+_active_profiler = contextvars.ContextVar("active_profiler", default=None)
+_NULL_SPAN = nullcontext()
+
+# tracemalloc is global; count the profilers using it so one session
+# finishing doesn't switch it off under another.
+_tracing_users = 0
+_tracing_lock = threading.Lock()
+
+
+class Profiler:
+    """Collects aggregated spans for one tab run."""
+
+    def __init__(self, name, trace_memory=True):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.stats = {}  # span path -> aggregated stats
+        self._stack = []  # [path, child_abs_peak] for each open span
+
+    def start(self):
+        global _tracing_users
+        if self.trace_memory:
+            with _tracing_lock:
+                if _tracing_users == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                _tracing_users += 1
+
+    def stop(self):
+        global _tracing_users
+        if self.trace_memory:
+            with _tracing_lock:
+                _tracing_users -= 1
+                if _tracing_users == 0:
+                    tracemalloc.stop()
+
+    @contextmanager
+    def span(self, name):
+        path = f"{self._stack[-1][0]}/{name}" if self._stack else name
+        frame = [path, 0]
+        self._stack.append(frame)
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            start_mem = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            peak = 0
+            self._stack.pop()
+            if tracing:
+                # reset_peak() in nested spans wipes this span's running peak,
+                # so children hand their absolute peak up via the stack frame.
+                abs_peak = max(tracemalloc.get_traced_memory()[1], frame[1])
+                peak = max(0, abs_peak - start_mem)
+                if self._stack:
+                    self._stack[-1][1] = max(self._stack[-1][1], abs_peak)
+                tracemalloc.reset_peak()
+
+            entry = self.stats.setdefault(path, {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_bytes": 0})
+            entry["count"] += 1
+            entry["wall_s"] += wall
+            entry["cpu_s"] += cpu
+            entry["peak_bytes"] = max(entry["peak_bytes"], peak)
+
+    def to_dict(self):
+        return {"tab": self.name, "trace_memory": self.trace_memory, "spans": self.stats}
+
+
+def span(name):
+    """Time a stage of work if profiling is active, else do nothing."""
+    profiler = _active_profiler.get()
+    if profiler is None:
+        return _NULL_SPAN
+    return profiler.span(name)
+
+
+@contextmanager
+def profiling(name, enabled=True, trace_memory=True):
+    """Activate a Profiler for the enclosed code; yields it (or None if disabled)."""
+    if not enabled:
+        yield None
+        return
+    profiler = Profiler(name, trace_memory=trace_memory)
+    token = _active_profiler.set(profiler)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active_profiler.reset(token)
+
+
+def show_performance_details(profiler, key):
+    """Render the "Performance details" expander for a finished run."""
+    if profiler is None or not profiler.stats:
+        return
+    with st.expander("🔬 Performance details"):
+        rows = [
+            {
+                "Stage": path,
+                "Calls": entry["count"],
+                "Wall (ms)": round(entry["wall_s"] * 1000, 1),
+                "CPU (ms)": round(entry["cpu_s"] * 1000, 1),
+                "Peak memory (KB)": round(entry["peak_bytes"] / 1024) if profiler.trace_memory else None,
+            }
+            for path, entry in profiler.stats.items()
+        ]
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        st.download_button(
+            "⬇️ Export as JSON",
+            data=json.dumps(profiler.to_dict(), indent=2),
+            file_name=f"{profiler.name}_performance.json",
+            mime="application/json",
+            key=f"{key}_performance_json",
+        )
+
+
+def render_with_profiling(name, render):
+    """Run a tab's render() under a Profiler when the sidebar toggle is on."""
+    enabled = st.session_state.get("performance_details", False)
+    trace_memory = st.session_state.get("performance_details_memory", False)
+    with profiling(name, enabled=enabled, trace_memory=trace_memory) as profiler:
+        render()
+    show_performance_details(profiler, key=name)
@@ -0,0 +1,353 @@
+# utils/jobs.py
+"""Background jobs for the tabs' long-running operations.
+
+A tab submits its operation with ``submit_job(key, name, fn)`` instead of
+running it under ``st.spinner``. The work runs on a worker thread, the Job
+is kept in the session's state under ``key`` so it survives reruns, and
+``render_job(key)`` draws its progress bar and Cancel button (polling in a
+fragment, so only that part of the page reruns) until it finishes.
+
+Operations report progress with ``report_progress(done, total)`` at each
+page/image/file boundary. That call is also the cancellation point: once a
+job is cancelled it raises JobCancelled, which unwinds the operation.
+Outside a job (benchmarks, direct calls) it does nothing.
+
+A job submitted with a ``cache_key`` is looked up in the shared result
+cache first (utils.result_cache); a hit finishes immediately without
+queueing, and a miss stores its result when it completes. Such a result
+is also counted against the session's memory budget (utils.session_memory):
+it may be released once shown and is reloaded from the cache when next
+rendered.
+
+Jobs run on the process-wide pool from utils.worker_pool, shared by all
+sessions; while waiting there they show their queue position, and a job the
+pool refuses to admit is shown as rejected. Worker threads have no Streamlit
+script context, so job functions must not call ``st.*``; they return their
+result and the tab renders it.
+"""
+import contextvars
+import io
+import os
+import threading
+import time
+import uuid
+import weakref
+
+import streamlit as st
+
+from utils.instrumentation import profiling, show_performance_details
+from utils.metrics import OPERATIONS_TOTAL
+from utils.result_cache import get_result_cache
+from utils.session_memory import session_memory
+from utils.worker_pool import QueueFull, get_worker_pool
+
+POLL_INTERVAL_S = 0.5
+
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's operation once the job has been cancelled."""
+
+    metrics_status = "cancelled"
+
+
+class Job:
+    """One operation running (or finished) on a worker thread."""
+
+    def __init__(self, name, fn, bytes_in=0, meta=None, profile=False, trace_memory=False):
+        self.name = name
+        self.bytes_in = bytes_in
+        self.meta = meta or {}  # the tab's own display info; never cached
+        self.status = "queued"  # queued -> running -> done | failed | cancelled; or rejected; done <-> released
+        self.progress = (0, None, "")  # (done, total, message)
+        self.result = None
+        self.error = None
+        self.profiler = None
+        self.from_cache = False
+        self.cache_key = None
+        self.cache_files = {}
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._fn = fn
+        self._profile = profile
+        self._trace_memory = trace_memory
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        self._cleanups = []
+        self._lock = threading.Lock()
+        self._discarded = False
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def add_cleanup(self, fn):
+        """Run ``fn()`` when the job is discarded (temp files, buffers)."""
+        self._cleanups.append(fn)
+
+    def discard(self):
+        """Cancel if still running and release the job's resources.
+
+        A running job is cleaned up by its worker once it unwinds.
+        """
+        self.cancel()
+        with self._lock:
+            self._discarded = True
+            finished = self.done
+        if finished:
+            self._run_cleanups()
+
+    def release(self):
+        """Drop a finished, cached result to free memory; ``restore()`` brings it back."""
+        with self._lock:
+            if self.status != "done" or self.cache_key is None:
+                return
+            self.status = "released"
+            self.result = None
+        for path in self.cache_files.values():
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def restore(self):
+        """Reload a released result from the result cache; False if it's gone."""
+        result = get_result_cache().get(self.cache_key, self.cache_files)
+        if result is None:
+            return False
+        with self._lock:
+            self.result = result
+            self.status = "done"
+        return True
+
+    def result_bytes(self):
+        """(in-memory, on-disk) bytes held by the result."""
+        return _buffer_bytes(self.result), sum(
+            os.path.getsize(path) for path in self.cache_files.values() if os.path.exists(path)
+        )
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+    def _finish_cached(self, result):
+        self.status = "done"
+        self.result = result
+        self.from_cache = True
+        self._fn = None
+        self.finished_at = time.time()
+        self._finished.set()
+
+    def _reject(self, error):
+        self.status = "rejected"
+        self.error = error
+        self._fn = None
+        self.finished_at = time.time()
+        self._finished.set()
+
+    def _run_cleanups(self):
+        self.result = None
+        while self._cleanups:
+            try:
+                self._cleanups.pop()()
+            except Exception:
+                pass
+
+    def _run(self):
+        if self.cancelled:
+            self.status = "cancelled"
+        else:
+            self.status = "running"
+            token = _current_job.set(self)
+            try:
+                with profiling(self.name, self._profile, self._trace_memory) as profiler:
+                    self.profiler = profiler
+                    self.result = self._fn()
+                self.status = "done"
+            except JobCancelled:
+                self.status = "cancelled"
+            except Exception as e:
+                self.error = e
+                self.status = "failed"
+            finally:
+                _current_job.reset(token)
+        self.finished_at = time.time()
+        with self._lock:
+            self._finished.set()
+            discarded = self._discarded
+        if discarded:
+            self._run_cleanups()
+
+
+def _buffer_bytes(value):
+    if isinstance(value, io.BytesIO):
+        return value.getbuffer().nbytes
+    if isinstance(value, dict):
+        return sum(_buffer_bytes(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_buffer_bytes(item) for item in value)
+    return 0
+
+
+def report_progress(done, total=None, message=""):
+    """Record progress for the current job; raises JobCancelled if it was cancelled."""
+    job = _current_job.get()
+    if job is None:
+        return
+    if job.cancelled:
+        raise JobCancelled()
+    job.progress = (done, total, message)
+
+
+class _SessionJobs:
+    """Holds a session's jobs; discards them when the session state goes away."""
+
+    def __init__(self):
+        self.session_id = uuid.uuid4().hex
+        self.jobs = {}
+        weakref.finalize(self, _discard_all, self.jobs)
+
+
+def _discard_all(jobs):
+    for job in list(jobs.values()):
+        job.discard()
+
+
+def _session():
+    holder = st.session_state.get("_jobs")
+    if holder is None:
+        holder = st.session_state["_jobs"] = _SessionJobs()
+    return holder
+
+
+def get_job(key):
+    return _session().jobs.get(key)
+
+
+def discard_job(key):
+    job = _session().jobs.pop(key, None)
+    session_memory().forget(f"job:{key}")
+    if job is not None:
+        job.discard()
+
+
+def submit_job(key, name, fn, bytes_in=0, cleanup=None, cache_key=None, cache_files=None, meta=None):
+    """Run ``fn()`` in the background as this session's job under ``key``.
+
+    ``name`` is the operation (for per-operation limits) and ``bytes_in`` the
+    size of its inputs (for the pool's queued-bytes cap). ``cleanup`` is
+    called once the job is discarded, or right away if it is rejected. Any
+    previous job under the same key is cancelled and discarded. The job is
+    profiled when the sidebar's performance toggle is on.
+
+    With ``cache_key`` the result is memoized in the result cache;
+    ``cache_files`` maps result keys holding file paths to the path a cached
+    copy should be written to (see ResultCache.get). Anything that doesn't
+    change the output (display names, option echoes) goes in ``meta``, which
+    is kept on the job but not cached, so it can't leak between requests
+    that share a key.
+    """
+    discard_job(key)
+    session = _session()
+    job = Job(
+        name,
+        fn,
+        bytes_in=bytes_in,
+        meta=meta,
+        profile=st.session_state.get("performance_details", False),
+        trace_memory=st.session_state.get("performance_details_memory", False),
+    )
+    if cleanup is not None:
+        job.add_cleanup(cleanup)
+    session.jobs[key] = job
+
+    if cache_key is not None:
+        job.cache_key = cache_key
+        job.cache_files = dict(cache_files or {})
+        cache = get_result_cache()
+        cached = cache.get(cache_key, cache_files)
+        if cached is not None:
+            OPERATIONS_TOTAL.inc(operation=name, status="cached")
+            job._finish_cached(cached)
+            return job
+        job._fn = _storing_result(fn, cache, cache_key, list(cache_files or ()))
+
+    try:
+        get_worker_pool().submit(job, session.session_id)
+    except QueueFull as e:
+        job._reject(e)
+        job._run_cleanups()
+    return job
+
+
+def _storing_result(fn, cache, cache_key, files):
+    def run():
+        result = fn()
+        cache.put(cache_key, result, files)
+        return result
+    return run
+
+
+@st.fragment(run_every=POLL_INTERVAL_S)
+def _job_progress(key, label):
+    job = get_job(key)
+    if job is None:
+        return
+    if job.done:
+        st.rerun()  # full rerun so the tab renders the result
+    done, total, message = job.progress
+    if job.status == "queued":
+        position = get_worker_pool().position(job)
+        text = f"{label} — waiting for a worker" + (f" (#{position} in queue)" if position else "") + "..."
+    elif total:
+        text = f"{label} — {message or 'step'} {done}/{total}"
+    else:
+        text = f"{label}..."
+    st.progress(min(1.0, done / total) if total else 0.0, text=text)
+    if job.cancelled:
+        st.caption("Cancelling...")
+    elif st.button("✖ Cancel", key=f"{key}_cancel"):
+        job.cancel()
+
+
+def render_job(key, label="Working", error_message="❌ Operation failed"):
+    """Show the job under ``key``: progress while it runs, then its outcome.
+
+    Returns the Job once it has finished successfully (for the tab to render
+    ``job.result``), otherwise None.
+    """
+    job = get_job(key)
+    if job is None:
+        return None
+    if not job.done:
+        _job_progress(key, label)
+        return None
+    if job.status == "cancelled":
+        st.warning("Cancelled.")
+        return None
+    if job.status == "released" and not job.restore():
+        st.info("ℹ️ This result was released to free memory and has since expired. Run it again to get it back.")
+        return None
+    if job.status == "rejected":
+        st.error(f"⏳ Not started: {job.error}. Please try again in a minute.")
+        return None
+    if job.status == "failed":
+        st.error(f"{error_message}: {job.error}")
+        st.exception(job.error)
+        return None
+    size, disk_size = job.result_bytes()
+    session_memory().track(
+        f"job:{key}", size, "result", disk_size=disk_size,
+        evict=job.release if job.cache_key is not None else None,
+    )
+    if job.from_cache:
+        st.caption("⚡ Same inputs and settings as an earlier run — its result was reused.")
+    show_performance_details(job.profiler, key=f"{key}_job")
+    return job
@@ -0,0 +1,226 @@
+# utils/metrics.py
+"""Process-wide operational metrics in Prometheus text format.
+
+Every tab wraps its main operation in ``track_operation``, which counts
+runs by status, records latency in a histogram and adds up bytes in/out.
+Other components (the image cache, job queues) register gauge callbacks
+that are read at export time.
+
+Export is opt-in through environment variables:
+
+- ``PDF_TOOLS_METRICS_FILE``: rewritten after every operation, for the
+  node_exporter textfile collector or anything else that tails a file.
+- ``PDF_TOOLS_METRICS_PORT``: serves ``GET /metrics`` on localhost from a
+  background thread.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; covers quick page-count reads through multi-minute compressions.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels[name]) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key + (('le', bound),))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class GaugeCallback:
+    """A metric whose value is read from ``callback()`` at export time.
+
+    Used for state owned elsewhere (cache counters, queue depth); pass
+    ``metric_type="counter"`` for values that only ever grow.
+    """
+
+    def __init__(self, name, help_text, callback, metric_type="gauge"):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.metric_type = metric_type
+
+    def collect(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}", f"{self.name} {value}"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Re-registering (e.g. a module reloaded by Streamlit) replaces the old one.
+            self._metrics[metric.name] = metric
+        return metric
+
+    def gauge(self, name, help_text, callback, metric_type="gauge"):
+        return self.register(GaugeCallback(name, help_text, callback, metric_type))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+OPERATIONS_TOTAL = REGISTRY.register(Counter(
+    "pdf_tools_operations_total", "Operations run, by tab operation and outcome.", ("operation", "status"),
+))
+OPERATION_DURATION = REGISTRY.register(Histogram(
+    "pdf_tools_operation_duration_seconds", "Wall time of each operation.", ("operation",),
+))
+BYTES_IN_TOTAL = REGISTRY.register(Counter(
+    "pdf_tools_bytes_in_total", "Input bytes handed to each operation.", ("operation",),
+))
+BYTES_OUT_TOTAL = REGISTRY.register(Counter(
+    "pdf_tools_bytes_out_total", "Output bytes produced by each operation.", ("operation",),
+))
+
+
+class _Operation:
+    """Handle yielded by track_operation; set ``bytes_out`` once known."""
+
+    def __init__(self):
+        self.bytes_out = 0
+
+
+@contextmanager
+def track_operation(operation, bytes_in=0):
+    """Count, time and size one run of a tab's operation.
+
+    Exceptions are recorded as ``status="error"`` (or the exception's
+    ``metrics_status``, e.g. "cancelled") and re-raised for the tab's own
+    error handling.
+    """
+    handle = _Operation()
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield handle
+        status = "success"
+    except Exception as e:
+        status = getattr(e, "metrics_status", "error")
+        raise
+    finally:
+        OPERATION_DURATION.observe(time.perf_counter() - start, operation=operation)
+        OPERATIONS_TOTAL.inc(operation=operation, status=status)
+        BYTES_IN_TOTAL.inc(bytes_in, operation=operation)
+        BYTES_OUT_TOTAL.inc(handle.bytes_out, operation=operation)
+        _write_metrics_file()
+
+
+def _write_metrics_file():
+    path = os.environ.get("PDF_TOOLS_METRICS_FILE")
+    if not path:
+        return
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(REGISTRY.render())
+        os.replace(tmp_path, path)
+    except OSError:
+        pass  # metrics must never break an operation
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server():
+    """Serve /metrics on PDF_TOOLS_METRICS_PORT (once per process), if set."""
+    global _server
+    port = os.environ.get("PDF_TOOLS_METRICS_PORT")
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            host = os.environ.get("PDF_TOOLS_METRICS_HOST", "127.0.0.1")
+            try:
+                _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            except OSError:
+                return None  # port taken, e.g. by another app process; file export still works
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
@@ -0,0 +1,135 @@
+# utils/page_geometry.py
+"""Per-page geometry of a PDF, read in one pass: MediaBox, CropBox, /Rotate.
+
+Positions on a page are given in *visible* page space: points from the
+bottom-left corner of the page as a viewer shows it, which is the CropBox
+turned by /Rotate. ``to_user`` maps that space to the page's PDF user space,
+so something placed in a preview lands where it was put, upright, on
+rotated and cropped pages alike.
+
+Most documents have a handful of distinct page geometries. Each page holds
+the index of its geometry class in a compact array, and pages of the same
+class can share anything derived from it (see ``page_class``):
+
+    geometry = PageGeometry.from_reader(reader)
+    geometry.visible_size(i)   # (width, height) as displayed
+    geometry.to_user(i)        # (a, b, c, d, e, f): visible space -> user space
+"""
+import array
+
+
+def _intersect(media_box, crop_box):
+    # Viewers clip the CropBox to the MediaBox.
+    x0, y0 = max(media_box[0], crop_box[0]), max(media_box[1], crop_box[1])
+    x1, y1 = min(media_box[2], crop_box[2]), min(media_box[3], crop_box[3])
+    return media_box if x1 <= x0 or y1 <= y0 else (x0, y0, x1, y1)
+
+
+class PageGeometry:
+    """MediaBox, CropBox and rotation of every page, grouped into geometry classes."""
+
+    def __init__(self, pages):
+        """``pages``: (media box, crop box, rotation) per page; boxes are (x0, y0, x1, y1)."""
+        self._classes = []  # distinct (media box, visible box, rotation)
+        self._page_classes = array.array("I")
+        index = {}
+        for media_box, crop_box, rotation in pages:
+            media_box = tuple(round(float(value), 3) for value in media_box)
+            crop_box = _intersect(media_box, tuple(round(float(value), 3) for value in crop_box))
+            key = (media_box, crop_box, int(rotation) % 360 // 90 * 90)
+            if key not in index:
+                index[key] = len(self._classes)
+                self._classes.append(key)
+            self._page_classes.append(index[key])
+
+    @classmethod
+    def from_reader(cls, reader):
+        """Geometry of a PyPDF2 PdfReader's pages (inherited attributes included)."""
+        return cls(
+            (page.mediabox, page.cropbox, page.rotation)
+            for page in reader.pages
+        )
+
+    @classmethod
+    def from_fitz(cls, document):
+        """Geometry of a PyMuPDF document's pages."""
+        pages = []
+        for page in document:
+            media_box = page.mediabox
+            # PyMuPDF gives the CropBox with the y axis flipped within the MediaBox.
+            crop_box = page.cropbox
+            top = media_box.y0 + media_box.height
+            pages.append((
+                (media_box.x0, media_box.y0, media_box.x1, media_box.y1),
+                (crop_box.x0, top - crop_box.y1, crop_box.x1, top - crop_box.y0),
+                page.rotation,
+            ))
+        return cls(pages)
+
+    def __len__(self):
+        return len(self._page_classes)
+
+    def nbytes(self):
+        """Approximate memory held (for session memory accounting)."""
+        return self._page_classes.itemsize * len(self._page_classes) + 200 * len(self._classes)
+
+    def page_class(self, i):
+        """Index of page ``i``'s geometry class; equal for pages of identical geometry."""
+        return self._page_classes[i]
+
+    def class_pages(self):
+        """{class index: [page indices]}, classes in order of first appearance."""
+        pages = {}
+        for i, page_class in enumerate(self._page_classes):
+            pages.setdefault(page_class, []).append(i)
+        return pages
+
+    def media_box(self, i):
+        return self._classes[self._page_classes[i]][0]
+
+    def crop_box(self, i):
+        """The visible area in user space (CropBox clipped to the MediaBox)."""
+        return self._classes[self._page_classes[i]][1]
+
+    def rotation(self, i):
+        """Clockwise display rotation in degrees: 0, 90, 180 or 270."""
+        return self._classes[self._page_classes[i]][2]
+
+    def visible_size(self, i):
+        """(width, height) of page ``i`` as displayed."""
+        x0, y0, x1, y1 = self.crop_box(i)
+        if self.rotation(i) in (90, 270):
+            return y1 - y0, x1 - x0
+        return x1 - x0, y1 - y0
+
+    def to_user(self, i):
+        """Matrix (a, b, c, d, e, f) from page ``i``'s visible space to its user space."""
+        x0, y0, x1, y1 = self.crop_box(i)
+        rotation = self.rotation(i)
+        if rotation == 90:
+            return (0, 1, -1, 0, x1, y0)
+        if rotation == 180:
+            return (-1, 0, 0, -1, x1, y1)
+        if rotation == 270:
+            return (0, -1, 1, 0, x0, y1)
+        return (1, 0, 0, 1, x0, y0)
+
+
+def concat(first, second):
+    """The matrix applying ``first``, then ``second`` (PDF's row-vector convention)."""
+    a1, b1, c1, d1, e1, f1 = first
+    a2, b2, c2, d2, e2, f2 = second
+    return (
+        a1 * a2 + b1 * c2,
+        a1 * b2 + b1 * d2,
+        c1 * a2 + d1 * c2,
+        c1 * b2 + d1 * d2,
+        e1 * a2 + f1 * c2 + e2,
+        e1 * b2 + f1 * d2 + f2,
+    )
+
+
+def apply(matrix, x, y):
+    """The point (x, y) transformed by ``matrix``."""
+    a, b, c, d, e, f = matrix
+    return a * x + c * y + e, b * x + d * y + f
@@ -0,0 +1,136 @@
+# utils/page_selection.py
+"""Page-selection language shared by the tabs, compiled to a page bitset.
+
+A selection is a comma-separated list of terms, with 1-based, inclusive
+page numbers:
+
+    7         one page
+    1-3       a range
+    10-       page 10 to the last page
+    -5        the first five pages
+    last      the last page (also usable in ranges: "5-last")
+    first, all, odd, even
+
+    selection = compile_pages("1-3,7,10-", num_pages)
+    5 in selection        # O(1), 0-based page index
+    list(selection)       # 0-based indices, ascending, each once
+
+Pages past the end of the document are dropped (so a template's "1-10"
+still works on a shorter file) unless ``strict`` is set; malformed terms,
+page 0 and reversed ranges raise PageSelectionError.
+"""
+import itertools
+import re
+
+_TERM = re.compile(r"^(\d+|last|first)?\s*(-)?\s*(\d+|last)?$")
+
+# Number of set bits in each byte value.
+_POPCOUNT = bytes(bin(value).count("1") for value in range(256))
+# Set bit positions of each byte value.
+_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+class PageSelectionError(ValueError):
+    """A page selection that can't be parsed or is out of range."""
+
+
+class PageSelection:
+    """A set of 0-based page indices of a ``num_pages`` document, as a bitset."""
+
+    def __init__(self, num_pages, ranges=()):
+        self.num_pages = num_pages
+        self._bits = bytearray((num_pages + 7) // 8)
+        for pages in ranges:
+            self._add(pages)
+        self._count = sum(self._bits.translate(_POPCOUNT))
+
+    def _add(self, pages):
+        """Set the pages of ``pages``, a ``range`` within the document."""
+        bits = self._bits
+        if not pages:
+            return
+        if pages.step != 1:
+            for i in pages:
+                bits[i >> 3] |= 1 << (i & 7)
+            return
+        start, stop = pages.start, pages.stop
+        # Whole bytes at once; bit by bit only at the ragged ends.
+        while start < stop and start & 7:
+            bits[start >> 3] |= 1 << (start & 7)
+            start += 1
+        while stop > start and stop & 7:
+            stop -= 1
+            bits[stop >> 3] |= 1 << (stop & 7)
+        bits[start >> 3:stop >> 3] = b"\xff" * ((stop - start) >> 3)
+
+    def __contains__(self, i):
+        return 0 <= i < self.num_pages and self._bits[i >> 3] >> (i & 7) & 1 == 1
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __iter__(self):
+        for byte_index, byte in enumerate(self._bits):
+            if byte:
+                base = byte_index << 3
+                for bit in _BITS[byte]:
+                    yield base + bit
+
+    def rank(self, i):
+        """How many selected pages come before page ``i`` (its position in the selection)."""
+        i = min(i, self.num_pages)
+        below = sum(self._bits[:i >> 3].translate(_POPCOUNT))
+        if i & 7:
+            below += _POPCOUNT[self._bits[i >> 3] & ((1 << (i & 7)) - 1)]
+        return below
+
+    def intervals(self):
+        """The selection as sorted, disjoint (start, stop) runs of consecutive pages."""
+        runs = []
+        for _, group in itertools.groupby(enumerate(self), lambda item: item[1] - item[0]):
+            group = list(group)
+            runs.append((group[0][1], group[-1][1] + 1))
+        return runs
+
+
+def _page_number(token, num_pages):
+    if token == "last":
+        return num_pages
+    if token == "first":
+        return 1
+    return int(token)
+
+
+def compile_pages(text, num_pages, strict=False):
+    """Compile a selection such as "1-3,7,10-" or "odd" for a ``num_pages`` document."""
+    ranges = []
+    for term in text.lower().split(","):
+        term = term.strip()
+        if not term:
+            continue
+        if term == "all":
+            ranges.append(range(num_pages))
+            continue
+        if term in ("odd", "even"):
+            ranges.append(range(0 if term == "odd" else 1, num_pages, 2))
+            continue
+        match = _TERM.match(term)
+        if match is None or match.group(0) == "-":
+            raise PageSelectionError(f"'{term}' is not a page, a range like 1-3, or one of "
+                                     "all, first, last, odd, even")
+        start, dash, end = match.groups()
+        # "10-" and "10-last" select nothing, rather than fail, on a shorter document.
+        open_ended = dash and end in (None, "last")
+        start = _page_number(start, num_pages) if start else 1
+        end = (_page_number(end, num_pages) if end else num_pages) if dash else start
+        if start < 1 or end < 1:
+            raise PageSelectionError(f"'{term}': pages are numbered from 1")
+        if strict and max(start, end) > num_pages:
+            raise PageSelectionError(f"'{term}': the document has {num_pages} page(s)")
+        if start > end and not open_ended:
+            raise PageSelectionError(f"'{term}': the range runs backwards")
+        ranges.append(range(start - 1, min(end, num_pages)))
+    return PageSelection(num_pages, ranges)
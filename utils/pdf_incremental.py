@@ -0,0 +1,184 @@
+# utils/pdf_incremental.py
+"""Incremental updates: append changed objects to an unmodified PDF.
+
+A PDF can be edited by appending a new revision after its original bytes:
+the objects that changed (under their existing numbers), any new objects,
+a cross-reference section for just those objects and a trailer whose
+``/Prev`` points at the previous one. Nothing before the append point is
+touched, so the cost is proportional to what changed rather than to the
+size of the document, and byte-range digital signatures over earlier
+revisions stay valid.
+
+    update = IncrementalUpdate(reader, source)
+    ref = update.add_stream(data, {"/Type": NameObject("/XObject"), ...})
+    update.update(page.indirect_reference, page)  # page modified in place
+    update.write(output)
+
+Objects are PyPDF2 generic objects; references to existing objects keep
+their numbers. Encrypted documents are not supported (callers should
+rewrite them instead).
+"""
+import re
+import shutil
+import zlib
+from io import BytesIO
+
+_CHUNK = 1024 * 1024
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+
+
+def _generic():
+    # PyPDF2 is imported on first use so the app starts without loading it.
+    from PyPDF2 import generic
+    return generic
+
+
+class IncrementalUpdate:
+    """One revision to append to ``source``, the file ``reader`` was opened on."""
+
+    def __init__(self, reader, source):
+        if reader.is_encrypted:
+            raise ValueError("encrypted PDFs can't be updated incrementally")
+        self.reader = reader
+        self._source = source
+        self._size = _object_count(reader)
+        self._objects = {}  # object number -> (generation, object, stream data or None)
+        self._prev_xref, self._prev_is_stream = self._previous_xref()
+
+    def _previous_xref(self):
+        source = self._source
+        source.seek(0, 2)
+        length = source.tell()
+        source.seek(max(0, length - 2048))
+        matches = _STARTXREF.findall(source.read())
+        if not matches:
+            raise ValueError("no startxref found")
+        offset = int(matches[-1])
+        source.seek(offset)
+        return offset, not source.read(4).startswith(b"xref")
+
+    def add(self, obj):
+        """Add a new object; returns its IndirectObject."""
+        number = self._size
+        self._size += 1
+        self._objects[number] = (0, obj, None)
+        return _generic().IndirectObject(number, 0, self.reader)
+
+    def add_stream(self, data, entries=None, compress=True):
+        """Add a new stream object with ``data`` (Flate-compressed unless ``compress`` is off)."""
+        generic = _generic()
+        dictionary = generic.DictionaryObject(entries or {})
+        if compress:
+            data = zlib.compress(data)
+            dictionary[generic.NameObject("/Filter")] = generic.NameObject("/FlateDecode")
+        ref = self.add(dictionary)
+        self._objects[ref.idnum] = (0, dictionary, data)
+        return ref
+
+    def update(self, ref, obj):
+        """Replace the existing object ``ref`` with ``obj`` in the new revision."""
+        self._objects[ref.idnum] = (ref.generation, obj, None)
+
+    def write(self, output):
+        """Write the original bytes followed by the new revision to ``output``."""
+        generic = _generic()
+        self._source.seek(0)
+        shutil.copyfileobj(self._source, output, _CHUNK)
+        output.write(b"\n")
+
+        offsets = {}
+        for number in sorted(self._objects):
+            generation, obj, data = self._objects[number]
+            offsets[number] = (output.tell(), generation)
+            output.write(f"{number} {generation} obj\n".encode())
+            if data is not None:
+                obj[generic.NameObject("/Length")] = generic.NumberObject(len(data))
+            obj.write_to_stream(output, None)
+            if data is not None:
+                output.write(b"\nstream\n")
+                output.write(data)
+                output.write(b"\nendstream")
+            output.write(b"\nendobj\n")
+
+        trailer = generic.DictionaryObject()
+        for key in ("/Root", "/Info", "/ID"):
+            if key in self.reader.trailer:
+                trailer[generic.NameObject(key)] = self.reader.trailer.raw_get(key)
+        trailer[generic.NameObject("/Prev")] = generic.NumberObject(self._prev_xref)
+
+        # Follow the original's cross-reference style: a classic table can't be
+        # chained onto an xref stream by every reader.
+        if self._prev_is_stream:
+            self._write_xref_stream(output, offsets, trailer)
+        else:
+            self._write_xref_table(output, offsets, trailer)
+
+    def _write_xref_table(self, output, offsets, trailer):
+        generic = _generic()
+        xref_offset = output.tell()
+        output.write(b"xref\n")
+        for start, numbers in _runs(sorted(offsets)):
+            output.write(f"{start} {len(numbers)}\n".encode())
+            for number in numbers:
+                offset, generation = offsets[number]
+                output.write(f"{offset:010d} {generation:05d} n\r\n".encode())
+        trailer[generic.NameObject("/Size")] = generic.NumberObject(self._size)
+        output.write(b"trailer\n")
+        trailer.write_to_stream(output, None)
+        output.write(f"\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+    def _write_xref_stream(self, output, offsets, trailer):
+        generic = _generic()
+        xref_number = self._size
+        self._size += 1
+        xref_offset = output.tell()
+        offsets = dict(offsets)
+        offsets[xref_number] = (xref_offset, 0)
+
+        offset_width = max(4, (xref_offset.bit_length() + 7) // 8)
+        rows = BytesIO()
+        index = generic.ArrayObject()
+        for start, numbers in _runs(sorted(offsets)):
+            index.extend([generic.NumberObject(start), generic.NumberObject(len(numbers))])
+            for number in numbers:
+                offset, generation = offsets[number]
+                rows.write(b"\x01" + offset.to_bytes(offset_width, "big") + generation.to_bytes(2, "big"))
+        data = zlib.compress(rows.getvalue())
+
+        trailer.update({
+            generic.NameObject("/Type"): generic.NameObject("/XRef"),
+            generic.NameObject("/Size"): generic.NumberObject(self._size),
+            generic.NameObject("/Index"): index,
+            generic.NameObject("/W"): generic.ArrayObject(
+                [generic.NumberObject(1), generic.NumberObject(offset_width), generic.NumberObject(2)]
+            ),
+            generic.NameObject("/Filter"): generic.NameObject("/FlateDecode"),
+            generic.NameObject("/Length"): generic.NumberObject(len(data)),
+        })
+        output.write(f"{xref_number} 0 obj\n".encode())
+        trailer.write_to_stream(output, None)
+        output.write(b"\nstream\n")
+        output.write(data)
+        output.write(f"\nendstream\nendobj\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+
+def _object_count(reader):
+    """One past the highest object number in use (the trailer's /Size)."""
+    # PyPDF2 leaves /Size out of the trailer it builds from an xref stream.
+    numbers = [number for table in reader.xref.values() for number in table]
+    numbers.extend(reader.xref_objStm)
+    size = max(numbers, default=0) + 1
+    if "/Size" in reader.trailer:
+        size = max(size, int(reader.trailer["/Size"]))
+    return size
+
+
+def _runs(numbers):
+    """Split sorted object numbers into (start, [consecutive numbers]) subsections."""
+    runs = []
+    for number in numbers:
+        if runs and number == runs[-1][1][-1] + 1:
+            runs[-1][1].append(number)
+        else:
+            runs.append((number, [number]))
+    return runs
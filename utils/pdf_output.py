@@ -0,0 +1,102 @@
+# utils/pdf_output.py
+"""Output options shared by every tab that writes a PDF.
+
+"Fast web view" writes a linearized PDF with object streams: the first
+page's objects come first in the file and a hint table tells a byte-range
+viewer where the rest live, so page 1 can be shown before the whole file
+has downloaded.
+"""
+import importlib.util
+import os
+import re
+import tempfile
+from io import BytesIO
+
+import streamlit as st
+
+PIKEPDF_AVAILABLE = importlib.util.find_spec("pikepdf") is not None
+
+
+_LINEARIZATION_DICT = re.compile(rb"/Linearized\b.*?>>", re.S)
+_FIRST_PAGE_END = re.compile(rb"/E\s+(\d+)")
+_FILE_LENGTH = re.compile(rb"/L\s+(\d+)")
+
+
+def fast_web_view_checkbox(key, disabled=False):
+    """Render the shared "Fast web view" option and return whether it is on."""
+    return st.checkbox(
+        "⚡ Fast web view (linearized)",
+        value=False,
+        key=key,
+        disabled=disabled or not PIKEPDF_AVAILABLE,
+        help="Reorders the PDF so viewers that fetch byte ranges can show the first "
+             "page before the whole file downloads. Requires pikepdf.",
+    )
+
+
+def pdf_save_options(linearize):
+    """Keyword arguments for pikepdf.Pdf.save used by all PDF outputs."""
+    import pikepdf
+
+    return {
+        "compress_streams": True,
+        "object_stream_mode": pikepdf.ObjectStreamMode.generate,
+        "linearize": linearize,
+    }
+
+
+def write_pdf(write, linearize=False):
+    """Run an engine's save, ``write(target)``, and return the PDF as a BytesIO at 0.
+
+    ``target`` is the BytesIO that is returned. Neither PyPDF2 nor PyMuPDF
+    can write a linearized file, so with ``linearize`` the engine saves to
+    a temporary file path instead, and pikepdf reads that and writes the
+    one in-memory output, linearized, in the same pass that compresses its
+    streams.
+    """
+    output = BytesIO()
+    if not linearize:
+        write(output)
+        output.seek(0)
+        return output
+
+    import pikepdf
+
+    with tempfile.TemporaryDirectory(prefix="pdf_tools_linearize_") as tmp_dir:
+        unlinearized = os.path.join(tmp_dir, "unlinearized.pdf")
+        write(unlinearized)
+        with pikepdf.open(unlinearized) as pdf:
+            pdf.save(output, **pdf_save_options(linearize=True))
+    output.seek(0)
+    return output
+
+
+def first_page_byte_range(head):
+    """Return (first_page_end, file_length) from a linearized PDF's header.
+
+    ``head`` is the first kilobyte or so of the file. A viewer only needs bytes
+    ``[0, first_page_end)`` to display page 1. Returns None when the file is
+    not linearized.
+    """
+    match = _LINEARIZATION_DICT.search(head[:4096])
+    if not match:
+        return None
+    end = _FIRST_PAGE_END.search(match.group(0))
+    length = _FILE_LENGTH.search(match.group(0))
+    if not end or not length:
+        return None
+    return int(end.group(1)), int(length.group(1))
+
+
+def show_fast_web_view_check(head):
+    """Report how much of a linearized output a viewer needs for page 1."""
+    byte_range = first_page_byte_range(head)
+    if byte_range is None:
+        st.warning("⚠️ Output is not linearized; viewers will download the whole file first.")
+        return
+    first_page_end, file_length = byte_range
+    share = first_page_end / file_length * 100 if file_length else 0
+    st.caption(
+        f"⚡ Fast web view: page 1 is readable after the first "
+        f"{first_page_end / 1024:.0f} KB ({share:.1f}% of the file)."
+    )
@@ -0,0 +1,215 @@
+# utils/pdf_structure.py
+"""Lossless structural clean-up for pikepdf documents.
+
+Image recompression can't help PDFs that are mostly text and vector
+graphics, but those are often bloated anyway: objects nothing points to any
+more, content streams stored without a filter, the same font program or ICC
+profile embedded once per page, and page thumbnails left behind by the
+producing app. ``optimize_structure`` removes the duplicates and leftovers
+and reports how many bytes each category saved.
+
+Unused objects and unfiltered streams are left to the save: pikepdf drops
+unreachable objects and, with ``compress_streams=True``, deflates
+unfiltered streams whether or not this pass runs. They are only measured
+here and reported under ``SAVE_STEP_CATEGORIES``, apart from what the pass
+itself saved.
+"""
+import hashlib
+import zlib
+
+try:
+    import pikepdf
+    from pikepdf import Name
+except ImportError:
+    pikepdf = None
+
+
+# Removed by optimize_structure.
+STRUCTURE_CATEGORIES = {
+    "duplicate_fonts": "Duplicate fonts",
+    "duplicate_icc_profiles": "Duplicate ICC profiles",
+    "thumbnails_and_metadata": "Thumbnails & metadata",
+}
+
+# Removed by the save step anyway; measured by optimize_structure for the report.
+SAVE_STEP_CATEGORIES = {
+    "unused_objects": "Unused objects",
+    "uncompressed_streams": "Uncompressed streams",
+}
+
+_FONT_FILE_KEYS = ("/FontFile", "/FontFile2", "/FontFile3")
+
+
+def _children(obj):
+    """Direct child values of a dictionary, stream or array.
+
+    Scalars come back from pikepdf as plain Python values and are skipped.
+    """
+    if isinstance(obj, pikepdf.Array):
+        values = list(obj)
+    elif isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+        values = [obj[key] for key in obj.keys()]
+    else:
+        return []
+    return [value for value in values if isinstance(value, pikepdf.Object)]
+
+
+def _reachable_objgens(pdf):
+    """Object numbers of every indirect object reachable from the trailer."""
+    reachable = set()
+    stack = [pdf.trailer]
+    while stack:
+        obj = stack.pop()
+        if obj.is_indirect:
+            if obj.objgen in reachable:
+                continue
+            reachable.add(obj.objgen)
+        stack.extend(_children(obj))
+    return reachable
+
+
+def _object_size(obj):
+    """Approximate serialized size of an object, stream data included."""
+    if isinstance(obj, pikepdf.Stream):
+        return len(obj.read_raw_bytes()) + len(obj.stream_dict.unparse())
+    return len(obj.unparse())
+
+
+def _remap_references(root, remap):
+    """Point every reference in ``remap`` (objgen -> object) under ``root`` at its replacement.
+
+    Walks with an explicit stack, like ``_reachable_objgens``: outline
+    /Next chains and page trees can be deeper than Python's recursion limit.
+    """
+    seen = set()
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if obj.is_indirect:
+            if obj.objgen in seen:
+                continue
+            seen.add(obj.objgen)
+
+        if isinstance(obj, pikepdf.Array):
+            slots = range(len(obj))
+        elif isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+            slots = list(obj.keys())
+        else:
+            continue
+        for slot in slots:
+            child = obj[slot]
+            if not isinstance(child, pikepdf.Object):
+                continue
+            if child.is_indirect and child.objgen in remap:
+                obj[slot] = remap[child.objgen]
+            else:
+                stack.append(child)
+
+
+def _is_icc_colorspace(obj):
+    return (
+        isinstance(obj, pikepdf.Array)
+        and len(obj) == 2
+        and obj[0] == Name("/ICCBased")
+        and obj[1].is_indirect
+    )
+
+
+def _collect_icc_profiles(obj, found):
+    """Collect ICC profile streams from ``[/ICCBased ref]`` arrays under ``obj``.
+
+    Only direct children are descended into; the caller visits every
+    indirect object itself.
+    """
+    for child in _children(obj):
+        if child.is_indirect:
+            continue
+        if _is_icc_colorspace(child):
+            found.append(child[1])
+        else:
+            _collect_icc_profiles(child, found)
+
+
+def _dedupe_streams(streams):
+    """Map duplicate streams (by content hash) to the first copy seen.
+
+    The hash covers the stream data and its dictionary without /Length,
+    which only restates the data's size. Returns (remap, bytes_saved) where
+    remap is objgen -> canonical stream.
+    """
+    unique = {stream.objgen: stream for stream in streams}
+    canonical = {}
+    remap = {}
+    saved = 0
+    for objgen, stream in unique.items():
+        stream_dict = pikepdf.Dictionary(stream.stream_dict)
+        del stream_dict["/Length"]
+        digest = hashlib.sha256(stream.read_raw_bytes() + stream_dict.unparse()).digest()
+        if digest in canonical:
+            remap[objgen] = canonical[digest]
+            saved += _object_size(stream)
+        else:
+            canonical[digest] = stream
+    return remap, saved
+
+
+def optimize_structure(pdf, strip_metadata=False):
+    """Apply lossless structural optimizations to ``pdf`` in place.
+
+    Orphaned objects and unfiltered streams aren't touched here -- the save
+    step handles both -- but they are measured so the report can show them.
+    Returns a dict of bytes saved per ``STRUCTURE_CATEGORIES`` and
+    ``SAVE_STEP_CATEGORIES`` key.
+    """
+    saved = dict.fromkeys({**STRUCTURE_CATEGORIES, **SAVE_STEP_CATEGORIES}, 0)
+
+    reachable = _reachable_objgens(pdf)
+    for obj in pdf.objects:
+        # Indirect scalars (an indirect /Length, say) come back as plain Python values.
+        if not isinstance(obj, pikepdf.Object):
+            continue
+        if obj.is_indirect and obj.objgen not in reachable and obj.objgen != (0, 0):
+            saved["unused_objects"] += _object_size(obj)
+
+    # Thumbnails, per-app private data and (optionally) XMP metadata.
+    for page in pdf.pages:
+        for key in ("/Thumb", "/PieceInfo"):
+            if key in page.obj:
+                value = page.obj[key]
+                saved["thumbnails_and_metadata"] += _object_size(value)
+                del page.obj[key]
+    for key in ("/PieceInfo",) + (("/Metadata",) if strip_metadata else ()):
+        if key in pdf.Root:
+            saved["thumbnails_and_metadata"] += _object_size(pdf.Root[key])
+            del pdf.Root[key]
+
+    # Identical embedded font programs and ICC profiles.
+    font_files = []
+    icc_profiles = []
+    for obj in pdf.objects:
+        if isinstance(obj, pikepdf.Dictionary) and obj.get("/Type") == Name("/FontDescriptor"):
+            font_files.extend(
+                obj[key] for key in _FONT_FILE_KEYS if key in obj and obj[key].is_indirect
+            )
+        if _is_icc_colorspace(obj):
+            icc_profiles.append(obj[1])
+        else:
+            _collect_icc_profiles(obj, icc_profiles)
+
+    font_remap, saved["duplicate_fonts"] = _dedupe_streams(font_files)
+    icc_remap, saved["duplicate_icc_profiles"] = _dedupe_streams(icc_profiles)
+    remap = {**font_remap, **icc_remap}
+    if remap:
+        _remap_references(pdf.trailer, remap)
+
+    # Streams stored with no filter at all, which the save deflates.
+    reachable = _reachable_objgens(pdf)
+    for obj in pdf.objects:
+        if not isinstance(obj, pikepdf.Stream) or obj.objgen not in reachable:
+            continue
+        if "/Filter" in obj or obj.get("/Type") == Name("/Metadata"):
+            continue
+        data = obj.read_raw_bytes()
+        saved["uncompressed_streams"] += max(0, len(data) - len(zlib.compress(data)))
+
+    return saved
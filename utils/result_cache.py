@@ -0,0 +1,215 @@
+# utils/result_cache.py
+"""Disk-backed memo of finished operation results, shared across sessions.
+
+Each tab builds a key from the content hashes of its inputs (the
+SpooledUpload's ``sha256``, see utils.uploads) and its
+normalized parameters (placement in points, page set, quality, split
+groups, ...). Before a job is queued, ``utils.jobs.submit_job`` looks the key
+up here and, on a hit, hands back the stored result at once; on a miss the
+job's result is stored when it finishes. Repeated clicks with the same
+inputs and a page reload no longer redo the work.
+
+A result is a dict of JSON-able values and BytesIO outputs (nested lists
+and dicts are fine). Entries are ``<key>.bin`` files: a (created time,
+JSON length) header, the JSON with every BytesIO replaced by a blob
+reference, then the blobs. Values named in ``files`` are paths whose file
+contents are stored instead, and are written back to a caller-chosen path
+on a hit, so large outputs never have to pass through memory.
+
+The size cap and LRU eviction are the same as the image cache's; entries
+older than the TTL are dropped on lookup.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+
+from utils.image_cache import ImageCache
+from utils.metrics import REGISTRY
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "pdf_tools_result_cache")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_TTL_S = 3600
+
+# Part of every key; bump when an operation's output changes for the same inputs.
+RESULT_FORMAT_VERSION = 3
+
+_HEADER = struct.Struct(">dI")
+_CHUNK = 1024 * 1024
+
+
+def result_cache_key(operation, inputs, params):
+    """Key for ``operation`` on the given input hashes with normalized ``params``."""
+    payload = json.dumps(
+        {"v": RESULT_FORMAT_VERSION, "op": operation, "inputs": inputs, "params": params},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _encode(value, blobs, files=()):
+    if isinstance(value, io.BytesIO):
+        blobs.append(value)
+        return {"__blob__": len(blobs) - 1}
+    if isinstance(value, dict):
+        encoded = {}
+        for key, item in value.items():
+            if key in files:
+                blobs.append(item)  # a path
+                encoded[key] = {"__file__": len(blobs) - 1}
+            else:
+                encoded[key] = _encode(item, blobs)
+        return encoded
+    if isinstance(value, (list, tuple)):
+        return [_encode(item, blobs) for item in value]
+    return value
+
+
+def _decode(value, blobs):
+    if isinstance(value, dict):
+        if "__blob__" in value:
+            return blobs[value["__blob__"]]
+        if "__file__" in value:
+            return blobs[value["__file__"]]
+        return {key: _decode(item, blobs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item, blobs) for item in value]
+    return value
+
+
+class ResultCache(ImageCache):
+    """Size-capped LRU of operation results with a TTL.
+
+    Shares ImageCache's on-disk layout, size accounting and eviction; only
+    the entry format differs.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl_s=DEFAULT_TTL_S):
+        super().__init__(directory, max_bytes)
+        self.ttl_s = ttl_s
+
+    def get(self, key, files=None):
+        """Return the result stored under ``key``, or None on a miss.
+
+        ``files`` maps result keys that were stored as files to the paths to
+        write them back to; the result then holds those paths.
+        """
+        files = files or {}
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                created, meta_len = _HEADER.unpack(f.read(_HEADER.size))
+                if time.time() - created > self.ttl_s:
+                    raise _Expired()
+                meta = json.loads(f.read(meta_len))
+                file_targets = {value["__file__"]: files[key] for key, value in meta["result"].items()
+                                if isinstance(value, dict) and "__file__" in value}
+                blobs = []
+                for index, size in enumerate(meta["blob_sizes"]):
+                    if index in file_targets:
+                        with open(file_targets[index], "wb") as out:
+                            _copy_exact(f, out, size)
+                        blobs.append(file_targets[index])
+                    else:
+                        blobs.append(io.BytesIO(f.read(size)))
+            os.utime(path)  # mark as recently used
+        except (FileNotFoundError, KeyError, ValueError, struct.error, _Expired) as e:
+            if isinstance(e, _Expired):
+                self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return _decode(meta["result"], blobs)
+
+    def put(self, key, result, files=()):
+        """Store ``result``; keys listed in ``files`` hold paths whose contents are stored."""
+        blobs = []
+        encoded = _encode(result, blobs, files)
+        sizes = [os.path.getsize(blob) if isinstance(blob, str) else blob.getbuffer().nbytes for blob in blobs]
+        meta = json.dumps({"result": encoded, "blob_sizes": sizes}).encode()
+        entry_size = _HEADER.size + len(meta) + sum(sizes)
+        if entry_size > self.max_bytes:
+            return
+
+        # Write to a temp name first so readers never see a partial entry.
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(time.time(), len(meta)))
+            f.write(meta)
+            for blob in blobs:
+                if isinstance(blob, str):
+                    with open(blob, "rb") as src:
+                        shutil.copyfileobj(src, f, _CHUNK)
+                else:
+                    f.write(blob.getbuffer())
+        existed = os.path.exists(path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if not existed:
+                self._total_bytes += entry_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._total_bytes -= size
+
+
+class _Expired(Exception):
+    pass
+
+
+def _copy_exact(src, dst, size):
+    while size:
+        chunk = src.read(min(_CHUNK, size))
+        if not chunk:
+            raise ValueError("truncated cache entry")
+        dst.write(chunk)
+        size -= len(chunk)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide cache, configured by PDF_TOOLS_RESULT_CACHE_DIR / _MB / _TTL_S."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                directory=os.environ.get("PDF_TOOLS_RESULT_CACHE_DIR", DEFAULT_CACHE_DIR),
+                max_bytes=int(os.environ.get("PDF_TOOLS_RESULT_CACHE_MB", DEFAULT_MAX_BYTES // (1024 * 1024)))
+                * 1024 * 1024,
+                ttl_s=float(os.environ.get("PDF_TOOLS_RESULT_CACHE_TTL_S", DEFAULT_TTL_S)),
+            )
+            _register_metrics(_cache)
+        return _cache
+
+
+def _register_metrics(cache):
+    for field, metric_type, help_text in (
+        ("hits", "counter", "Result cache hits."),
+        ("misses", "counter", "Result cache misses (including expired entries)."),
+        ("evictions", "counter", "Entries evicted from the result cache."),
+        ("hit_rate", "gauge", "Result cache hits / lookups since start."),
+        ("bytes", "gauge", "Bytes currently stored in the result cache."),
+        ("max_bytes", "gauge", "Configured result cache size limit."),
+    ):
+        name = f"pdf_tools_result_cache_{field}" + ("_total" if metric_type == "counter" else "")
+        REGISTRY.gauge(name, help_text, lambda field=field: cache.metrics()[field], metric_type)
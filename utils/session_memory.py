@@ -0,0 +1,244 @@
+# utils/session_memory.py
+"""Per-session accounting and eviction of the artifacts a session holds.
+
+Each session's uploads, finished job results and overlay canvas drawing
+are recorded here with their size and when they were last used:
+
+- ``track(name, size, kind, evict=...)`` records an artifact owned
+  elsewhere (a job result, spooled uploads) and refreshes its last use.
+  Artifacts without ``evict`` are counted but never released.
+- ``put(name, value, size, kind)`` / ``get(name)`` hold a regenerable value
+  here; ``get`` returns None once it has been evicted.
+
+At the end of every run, regenerable artifacts not used in that run are
+evicted least recently used first while the session holds more than
+``PDF_TOOLS_SESSION_BUDGET_MB`` (default 256) in memory. Sessions with no
+run for ``PDF_TOOLS_SESSION_IDLE_S`` (default 1800) seconds release
+everything regenerable, on disk as well. Job results come back from the
+result cache when next shown (see utils.jobs.render_job).
+
+The sidebar debug view shows the current session only; the table of every
+session is for operators and needs ``PDF_TOOLS_SESSION_DEBUG_ALL=1``.
+
+Streamlit keeps its own copy of every upload for as long as the uploader
+holds it, so uploads are counted but not evicted.
+"""
+import os
+import threading
+import time
+import uuid
+import weakref
+
+import streamlit as st
+
+from utils.metrics import REGISTRY, Counter
+
+DEFAULT_BUDGET_MB = 256
+DEFAULT_IDLE_S = 1800
+_SWEEP_INTERVAL_S = 60
+
+EVICTIONS_TOTAL = REGISTRY.register(Counter(
+    "pdf_tools_session_evictions_total", "Session artifacts released, by reason (budget or idle).", ("reason",),
+))
+
+
+def _budget_bytes():
+    return float(os.environ.get("PDF_TOOLS_SESSION_BUDGET_MB", DEFAULT_BUDGET_MB)) * 1024 * 1024
+
+
+def _idle_s():
+    return float(os.environ.get("PDF_TOOLS_SESSION_IDLE_S", DEFAULT_IDLE_S))
+
+
+def _show_all_sessions():
+    return os.environ.get("PDF_TOOLS_SESSION_DEBUG_ALL", "") == "1"
+
+
+def _released():
+    pass
+
+
+class _Item:
+    __slots__ = ("kind", "size", "disk_size", "last_used", "value", "evict")
+
+    def __init__(self, kind, size, disk_size, value, evict):
+        self.kind = kind
+        self.size = size
+        self.disk_size = disk_size
+        self.last_used = time.time()
+        self.value = value
+        self.evict = evict
+
+
+class SessionMemory:
+    """The artifacts one session holds, with their sizes and last use."""
+
+    def __init__(self):
+        self.session_id = uuid.uuid4().hex
+        self.last_active = time.time()
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def track(self, name, size, kind, evict=None, disk_size=0):
+        """Record (or refresh) an artifact owned elsewhere; ``evict()`` releases it."""
+        with self._lock:
+            self._items[name] = _Item(kind, size, disk_size, None, evict)
+
+    def put(self, name, value, size, kind):
+        """Hold a regenerable ``value`` under ``name``."""
+        with self._lock:
+            self._items[name] = _Item(kind, size, 0, value, _released)
+
+    def get(self, name):
+        """The value stored under ``name`` (marking it used), or None if absent or evicted."""
+        with self._lock:
+            item = self._items.get(name)
+            if item is None:
+                return None
+            item.last_used = time.time()
+            return item.value
+
+    def forget(self, name):
+        with self._lock:
+            self._items.pop(name, None)
+
+    def memory_bytes(self):
+        with self._lock:
+            return sum(item.size for item in self._items.values())
+
+    def disk_bytes(self):
+        with self._lock:
+            return sum(item.disk_size for item in self._items.values())
+
+    def snapshot(self):
+        """One row per artifact, most recently used first (for the debug view)."""
+        now = time.time()
+        with self._lock:
+            items = sorted(self._items.items(), key=lambda entry: entry[1].last_used, reverse=True)
+            return [
+                {
+                    "Artifact": name,
+                    "Kind": item.kind,
+                    "Memory MB": round(item.size / 1024 / 1024, 2),
+                    "Disk MB": round(item.disk_size / 1024 / 1024, 2),
+                    "Idle s": round(now - item.last_used),
+                    "Evictable": item.evict is not None,
+                }
+                for name, item in items
+            ]
+
+    def enforce_budget(self, budget, unused_since, reason="budget"):
+        """Evict artifacts last used before ``unused_since``, oldest first, until within ``budget``."""
+        with self._lock:
+            total = sum(item.size for item in self._items.values())
+            candidates = sorted(
+                (entry for entry in self._items.items()
+                 if entry[1].evict is not None and entry[1].size and entry[1].last_used < unused_since),
+                key=lambda entry: entry[1].last_used,
+            )
+            victims = []
+            for name, item in candidates:
+                if total <= budget:
+                    break
+                del self._items[name]
+                total -= item.size
+                victims.append(item)
+        self._release(victims, reason)
+
+    def release_all(self, reason="idle"):
+        """Evict every regenerable artifact, in memory or on disk."""
+        with self._lock:
+            names = [name for name, item in self._items.items() if item.evict is not None]
+            victims = [self._items.pop(name) for name in names]
+        self._release(victims, reason)
+
+    @staticmethod
+    def _release(victims, reason):
+        for item in victims:
+            item.value = None
+            item.evict()
+            EVICTIONS_TOTAL.inc(reason=reason)
+
+
+_sessions = weakref.WeakValueDictionary()  # session id -> SessionMemory, dropped with the session
+_sessions_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+def session_memory():
+    """The current session's SessionMemory."""
+    memory = st.session_state.get("_session_memory")
+    if memory is None:
+        memory = st.session_state["_session_memory"] = SessionMemory()
+        with _sessions_lock:
+            _sessions[memory.session_id] = memory
+    return memory
+
+
+def begin_session_run():
+    """Mark the session active; returns the run's start time for ``end_session_run``."""
+    memory = session_memory()
+    memory.last_active = time.time()
+    return memory.last_active
+
+
+def end_session_run(run_started):
+    """Bring this session within budget and release idle sessions' artifacts."""
+    global _last_sweep
+    session_memory().enforce_budget(_budget_bytes(), run_started)
+
+    now = time.time()
+    with _sessions_lock:
+        if now - _last_sweep < _SWEEP_INTERVAL_S:
+            return
+        _last_sweep = now
+        idle = [memory for memory in _sessions.values() if now - memory.last_active > _idle_s()]
+    for memory in idle:
+        memory.release_all()
+
+
+def _all_sessions():
+    with _sessions_lock:
+        return list(_sessions.values())
+
+
+def render_session_memory_debug():
+    """Sidebar view of what this session holds, and with
+    ``PDF_TOOLS_SESSION_DEBUG_ALL=1`` what every other session holds."""
+    memory = session_memory()
+    budget = _budget_bytes()
+    st.caption(
+        f"This session: {memory.memory_bytes() / 1024 / 1024:.1f} MB in memory "
+        f"(budget {budget / 1024 / 1024:.0f} MB), {memory.disk_bytes() / 1024 / 1024:.1f} MB on disk"
+    )
+    rows = memory.snapshot()
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    if not _show_all_sessions():
+        return
+
+    now = time.time()
+    sessions = sorted(_all_sessions(), key=lambda other: other.memory_bytes(), reverse=True)
+    st.caption(f"All sessions ({len(sessions)}):")
+    st.dataframe(
+        [
+            {
+                "Session": other.session_id[:8] + (" (this)" if other is memory else ""),
+                "Artifacts": len(other.snapshot()),
+                "Memory MB": round(other.memory_bytes() / 1024 / 1024, 2),
+                "Disk MB": round(other.disk_bytes() / 1024 / 1024, 2),
+                "Idle s": round(now - other.last_active),
+            }
+            for other in sessions
+        ],
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
+REGISTRY.gauge("pdf_tools_sessions", "Sessions with tracked artifacts.", lambda: len(_all_sessions()))
+REGISTRY.gauge(
+    "pdf_tools_session_memory_bytes",
+    "Bytes held in memory by session artifacts, over all sessions.",
+    lambda: sum(memory.memory_bytes() for memory in _all_sessions()),
+)
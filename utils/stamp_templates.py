@@ -0,0 +1,97 @@
+# utils/stamp_templates.py
+"""Named stamp templates: reusable stamp sets for the overlay tab.
+
+A template is a list of stamps, each its settings (layer, page selection,
+placement in points, text for text stamps) plus its image, if any. It is
+saved as ``<name>.json`` under ``PDF_TOOLS_TEMPLATE_DIR`` (default: a
+``pdf_tools_stamp_templates`` directory in the system temp dir), with the
+images alongside it in ``images/``. Images are named by their content hash, so an image shared by
+several stamps or templates is stored once.
+
+    save_template("Approved + seal", stamps)   # [{"upload": SpooledUpload or None, ...settings}]
+    stamps = load_template("Approved + seal")  # same shape, uploads rebuilt from disk
+
+Saving under an existing name replaces that template.
+"""
+import json
+import os
+import re
+import tempfile
+
+from utils.uploads import upload_from_bytes
+
+DEFAULT_TEMPLATE_DIR = os.path.join(tempfile.gettempdir(), "pdf_tools_stamp_templates")
+
+
+def _template_dir():
+    return os.environ.get("PDF_TOOLS_TEMPLATE_DIR", DEFAULT_TEMPLATE_DIR)
+
+
+def _template_path(name):
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", name.strip()).strip("_") or "template"
+    return os.path.join(_template_dir(), slug + ".json")
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def list_templates():
+    """Names of the saved templates, sorted."""
+    try:
+        files = [entry for entry in os.listdir(_template_dir()) if entry.endswith(".json")]
+    except FileNotFoundError:
+        return []
+    names = []
+    for entry in files:
+        try:
+            with open(os.path.join(_template_dir(), entry), encoding="utf-8") as f:
+                names.append(json.load(f)["name"])
+        except (OSError, ValueError, KeyError):
+            continue  # half-written or foreign file
+    return sorted(names, key=str.lower)
+
+
+def save_template(name, stamps):
+    """Save ``stamps`` (dicts with an ``upload`` and JSON-able settings) as template ``name``."""
+    image_dir = os.path.join(_template_dir(), "images")
+    os.makedirs(image_dir, exist_ok=True)
+    entries = []
+    for stamp in stamps:
+        entry = {"settings": {key: value for key, value in stamp.items() if key != "upload"}}
+        upload = stamp["upload"]
+        if upload is not None:
+            image_file = upload.sha256 + os.path.splitext(upload.name)[1].lower()
+            image_path = os.path.join(image_dir, image_file)
+            if not os.path.exists(image_path):
+                with upload.open() as source:
+                    _write_atomic(image_path, source.read())
+            entry.update(image=image_file, image_name=upload.name)
+        entries.append(entry)
+    payload = json.dumps({"name": name.strip(), "stamps": entries}, indent=2)
+    _write_atomic(_template_path(name), payload.encode("utf-8"))
+
+
+def load_template(name):
+    """The stamps of template ``name``, each with an ``upload`` holding its image (None for text stamps)."""
+    with open(_template_path(name), encoding="utf-8") as f:
+        template = json.load(f)
+    stamps = []
+    for entry in template["stamps"]:
+        upload = None
+        if "image" in entry:
+            with open(os.path.join(_template_dir(), "images", entry["image"]), "rb") as f:
+                upload = upload_from_bytes(f.read(), entry["image_name"])
+        stamps.append({"upload": upload, **entry["settings"]})
+    return stamps
+
+
+def delete_template(name):
+    """Remove template ``name`` (its images stay, they may be shared)."""
+    try:
+        os.unlink(_template_path(name))
+    except FileNotFoundError:
+        pass
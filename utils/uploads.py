@@ -0,0 +1,183 @@
+# utils/uploads.py
+"""Shared input abstraction for uploaded files.
+
+Every tab wraps its uploads with ``spool_upload``/``spool_uploads`` once per
+rerun and hands the resulting SpooledUpload to previews, parsers and jobs
+instead of the Streamlit UploadedFile:
+
+- Uploads larger than ``PDF_TOOLS_SPOOL_THRESHOLD_MB`` (default 8) are
+  written to a temp file once, on the first rerun that sees them. Parsers
+  then read from disk: pikepdf memory-maps ``path``, PyMuPDF opens
+  ``path``, and PyPDF2 reads lazily from ``open()``. None of them take a
+  byte copy of the upload.
+- Smaller uploads stay in memory. ``open()`` hands out BytesIO views that
+  share the upload's bytes rather than copying them.
+- ``open()`` always returns an independent file object with its own
+  position, plus the upload's ``name`` and ``size``. That lets a background
+  job and the script's next rerun read the same upload concurrently.
+- The content hash is computed once per upload and reused for result-cache
+  keys.
+
+Spooled uploads are kept in session state under the uploader's key, so a
+rerun reuses them, and are counted in the session's memory accounting
+(utils.session_memory). Their temp file is deleted once nothing references them
+any more: a new file in that uploader, session end, or the last job using
+them finishing.
+"""
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import weakref
+
+import streamlit as st
+
+from utils.session_memory import session_memory
+
+DEFAULT_SPOOL_THRESHOLD_MB = 8
+_CHUNK = 1024 * 1024
+
+
+def _spool_threshold():
+    return float(os.environ.get("PDF_TOOLS_SPOOL_THRESHOLD_MB", DEFAULT_SPOOL_THRESHOLD_MB)) * 1024 * 1024
+
+
+class _NamedReader(io.BufferedReader):
+    """A buffered file reader that reports the upload's name rather than its temp path."""
+
+    def __init__(self, raw, name, size):
+        super().__init__(raw)
+        self._upload_name = name
+        self.size = size
+
+    @property
+    def name(self):
+        return self._upload_name
+
+
+def _remove_file(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class SpooledUpload:
+    """One uploaded file, held in memory or spooled to a temp file."""
+
+    def __init__(self, uploaded_file, threshold=None):
+        self.name = uploaded_file.name
+        self.size = uploaded_file.size
+        self.file_id = getattr(uploaded_file, "file_id", None)
+        self.path = None
+        self._data = None
+        self._sha256 = None
+        threshold = _spool_threshold() if threshold is None else threshold
+        if self.size > threshold:
+            self._spool(uploaded_file)
+        else:
+            # An unmodified BytesIO hands back its underlying bytes without copying.
+            self._data = uploaded_file.getvalue()
+
+    def _spool(self, source):
+        digest = hashlib.sha256()
+        source.seek(0)
+        fd, path = tempfile.mkstemp(prefix="pdf_tools_upload_", suffix=os.path.splitext(self.name)[1])
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: source.read(_CHUNK), b""):
+                digest.update(chunk)
+                out.write(chunk)
+        source.seek(0)
+        self.path = path
+        self._sha256 = digest.hexdigest()
+        weakref.finalize(self, _remove_file, path)
+
+    @classmethod
+    def adopt(cls, path, name, sha256=None):
+        """A spooled upload owning the temp file at ``path`` (e.g. streamed from an HTTP request)."""
+        upload = cls.__new__(cls)
+        upload.name = name
+        upload.size = os.path.getsize(path)
+        upload.file_id = None
+        upload.path = path
+        upload._data = None
+        upload._sha256 = sha256
+        weakref.finalize(upload, _remove_file, path)
+        return upload
+
+    @property
+    def sha256(self):
+        """Hex SHA-256 of the content (computed once)."""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self._data).hexdigest()
+        return self._sha256
+
+    def open(self):
+        """A new binary file object over the content, with its own position."""
+        if self.path is not None:
+            return _NamedReader(io.FileIO(self.path, "rb"), self.name, self.size)
+        stream = io.BytesIO(self._data)  # shares self._data until written to
+        stream.name = self.name
+        stream.size = self.size
+        return stream
+
+    def view(self):
+        """Read-only bytes-like view of the content: the bytes, or a mmap when spooled."""
+        if self.path is None:
+            return self._data
+        with open(self.path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def ensure_path(self):
+        """Path of a file holding the content, spooling it now if it was in memory."""
+        if self.path is None:
+            with io.BytesIO(self._data) as source:
+                self._spool(source)
+            self._data = None
+        return self.path
+
+
+def upload_from_bytes(data, name):
+    """SpooledUpload for content that didn't come through an uploader (e.g. a saved template's image)."""
+    source = io.BytesIO(data)
+    source.name = name
+    source.size = len(data)
+    return SpooledUpload(source)
+
+
+def _session_uploads():
+    return st.session_state.setdefault("_spooled_uploads", {})
+
+
+def spool_uploads(uploaded_files, key):
+    """SpooledUploads for an uploader's files, reused across reruns.
+
+    ``key`` identifies the uploader; files that are no longer in it are
+    released.
+    """
+    if not uploaded_files:
+        _session_uploads().pop(key, None)
+        session_memory().forget(f"uploads:{key}")
+        return []
+    if not isinstance(uploaded_files, (list, tuple)):
+        uploaded_files = [uploaded_files]
+    previous = {upload.file_id: upload for upload in _session_uploads().get(key, [])}
+    uploads = [
+        previous.get(uploaded_file.file_id) or SpooledUpload(uploaded_file)
+        for uploaded_file in uploaded_files
+    ]
+    _session_uploads()[key] = uploads
+    session_memory().track(
+        f"uploads:{key}",
+        sum(upload.size for upload in uploads if upload.path is None),
+        "upload",
+        disk_size=sum(upload.size for upload in uploads if upload.path is not None),
+    )
+    return uploads
+
+
+def spool_upload(uploaded_file, key):
+    """SpooledUpload for a single-file uploader (or None if it's empty)."""
+    uploads = spool_uploads(uploaded_file, key)
+    return uploads[0] if uploads else None
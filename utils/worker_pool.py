@@ -0,0 +1,164 @@
+# utils/worker_pool.py
+"""Process-wide bounded worker pool with admission control.
+
+Every session's background jobs go through one pool, so a burst of users
+can't start more heavy operations than the server has cores for:
+
+- A fixed number of worker threads (``PDF_TOOLS_WORKERS``, default: CPU
+  count) runs jobs.
+- The queue is fair across sessions: sessions take turns (round-robin), so
+  one user submitting many jobs doesn't push everyone else back.
+- Per-operation limits (``PDF_TOOLS_OPERATION_LIMITS``, e.g.
+  ``compress=2,convert=2``) cap how many workers one kind of operation can
+  hold at once; compress defaults to half the workers.
+- Admitted input bytes (queued plus running) are capped by
+  ``PDF_TOOLS_MAX_QUEUED_MB`` (default 1024). A job that would exceed the
+  cap is rejected at submission instead of being queued and OOMing later.
+  A job is always admitted when nothing else is in flight, however large.
+"""
+import os
+import threading
+from collections import OrderedDict, deque
+
+from utils.metrics import REGISTRY, Counter
+
+DEFAULT_MAX_QUEUED_MB = 1024
+
+REJECTIONS_TOTAL = REGISTRY.register(Counter(
+    "pdf_tools_jobs_rejected_total", "Jobs rejected by admission control, by operation.", ("operation",),
+))
+
+
+class QueueFull(Exception):
+    """The pool's queued-bytes cap would be exceeded by this job."""
+
+
+def _parse_limits(spec):
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        limits[name.strip()] = int(value)
+    return limits
+
+
+class WorkerPool:
+    def __init__(self, workers, operation_limits=None, max_queued_bytes=None):
+        self.workers = workers
+        self.operation_limits = dict(operation_limits or {})
+        self.max_queued_bytes = max_queued_bytes
+        self._queues = OrderedDict()  # session id -> deque of jobs, in turn order
+        self._running = {}  # operation -> running job count
+        self._admitted_bytes = 0
+        self._cond = threading.Condition()
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"pdf-tools-worker-{i}", daemon=True).start()
+
+    def submit(self, job, session_id):
+        """Queue ``job`` (needs ``name``, ``bytes_in`` and ``_run()``) for a session.
+
+        Raises QueueFull if admitting it would exceed the queued-bytes cap.
+        """
+        with self._cond:
+            if (
+                self.max_queued_bytes is not None
+                and self._admitted_bytes
+                and self._admitted_bytes + job.bytes_in > self.max_queued_bytes
+            ):
+                REJECTIONS_TOTAL.inc(operation=job.name)
+                raise QueueFull(
+                    f"the server is busy ({self._admitted_bytes / 1024 / 1024:.1f} MB of uploads "
+                    f"queued or processing, limit {self.max_queued_bytes / 1024 / 1024:.0f} MB)"
+                )
+            self._admitted_bytes += job.bytes_in
+            self._queues.setdefault(session_id, deque()).append(job)
+            self._cond.notify()
+
+    def position(self, job):
+        """1-based place of a queued ``job`` in dispatch order, or None if not queued.
+
+        Follows the round-robin order; per-operation limits can let later jobs
+        of another operation start first.
+        """
+        with self._cond:
+            rounds = max((len(queue) for queue in self._queues.values()), default=0)
+            position = 0
+            for depth in range(rounds):
+                for queue in self._queues.values():
+                    if depth < len(queue):
+                        position += 1
+                        if queue[depth] is job:
+                            return position
+        return None
+
+    def queue_depth(self):
+        with self._cond:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def running(self):
+        with self._cond:
+            return sum(self._running.values())
+
+    def admitted_bytes(self):
+        with self._cond:
+            return self._admitted_bytes
+
+    def _under_limit(self, operation):
+        limit = self.operation_limits.get(operation)
+        return limit is None or self._running.get(operation, 0) < limit
+
+    def _next_job(self):
+        """Pop the next runnable job in round-robin order (lock held)."""
+        for session_id, queue in self._queues.items():
+            for job in queue:
+                # Cancelled jobs are dispatched at once so they finish and free their bytes.
+                if job.cancelled or self._under_limit(job.name):
+                    queue.remove(job)
+                    if queue:
+                        self._queues.move_to_end(session_id)  # this session's turn is over
+                    else:
+                        del self._queues[session_id]
+                    return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job()
+                self._running[job.name] = self._running.get(job.name, 0) + 1
+            try:
+                job._run()
+            finally:
+                with self._cond:
+                    self._running[job.name] -= 1
+                    self._admitted_bytes -= job.bytes_in
+                    # A slot for this operation (and some byte budget) is free again.
+                    self._cond.notify_all()
+
+
+def _default_pool():
+    workers = int(os.environ.get("PDF_TOOLS_WORKERS", os.cpu_count() or 2))
+    limits = {"compress": max(1, workers // 2)}
+    limits.update(_parse_limits(os.environ.get("PDF_TOOLS_OPERATION_LIMITS", "")))
+    max_mb = float(os.environ.get("PDF_TOOLS_MAX_QUEUED_MB", DEFAULT_MAX_QUEUED_MB))
+    pool = WorkerPool(workers, limits, int(max_mb * 1024 * 1024))
+    REGISTRY.gauge("pdf_tools_jobs_queued", "Jobs waiting for a worker.", pool.queue_depth)
+    REGISTRY.gauge("pdf_tools_jobs_running", "Jobs running on a worker.", pool.running)
+    REGISTRY.gauge("pdf_tools_jobs_admitted_bytes", "Input bytes of queued and running jobs.", pool.admitted_bytes)
+    REGISTRY.gauge("pdf_tools_workers", "Size of the worker pool.", lambda: pool.workers)
+    return pool
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """The process-wide pool, created (and its threads started) on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _default_pool()
+        return _pool